@@ -0,0 +1,140 @@
+"""
+Benchmark: single-pass report aggregation vs. the previous three-query implementation.
+
+Seeds an in-memory SQLite database with one heavy user and times
+`services.report_service.generate_report_data` against the legacy approach
+(load every Transaction, then two GROUP BY queries).
+
+Usage:
+    python benchmarks/bench_report_aggregation.py [--transactions 50000] [--categories 40] [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# Run the app code in sync mode against a throwaway database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("USE_ASYNC_DB", "False")
+os.environ.setdefault("DEBUG", "False")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert # noqa: E402
+from sqlmodel import SQLModel, Session, create_engine, select, func # noqa: E402
+from sqlmodel.pool import StaticPool # noqa: E402
+
+from models import Transaction, Category, CategoryType, User # noqa: E402
+from dto.report_dto import CategorySummary # noqa: E402
+from services.report_service import generate_report_data # noqa: E402
+
+
+def legacy_generate_report_data(session: Session, user_id: int, start_date: date, end_date: date):
+    """The previous implementation: ORM load of every row plus two breakdown queries."""
+    base_statement = (
+        select(Transaction)
+        .where(Transaction.owner_id == user_id)
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+    )
+    transactions = session.exec(base_statement).all()
+    total_income = sum(t.amount for t in transactions if t.type == CategoryType.INCOME)
+    total_expense = sum(t.amount for t in transactions if t.type == CategoryType.EXPENSE)
+
+    breakdowns = []
+    for category_type in (CategoryType.INCOME, CategoryType.EXPENSE):
+        summary_query = (
+            select(
+                Transaction.category_id,
+                Category.name.label("category_name"),
+                func.sum(Transaction.amount).label("total_amount")
+            )
+            .join(Category)
+            .where(Transaction.owner_id == user_id)
+            .where(Transaction.date >= start_date)
+            .where(Transaction.date <= end_date)
+            .where(Transaction.type == category_type)
+            .group_by(Transaction.category_id, Category.name)
+            .order_by(func.sum(Transaction.amount).desc())
+        )
+        breakdowns.append([CategorySummary(**row) for row in session.exec(summary_query).mappings().all()])
+    return total_income, total_expense, breakdowns[0], breakdowns[1]
+
+
+def seed(session: Session, n_transactions: int, n_categories: int, year: int) -> int:
+    user = User(email="bench@example.com", hashed_password="x")
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+
+    categories = [
+        Category(name=f"Category {i}", type=CategoryType.INCOME if i % 5 == 0 else CategoryType.EXPENSE, owner_id=user.id)
+        for i in range(n_categories)
+    ]
+    session.add_all(categories)
+    session.commit()
+    for category in categories:
+        session.refresh(category)
+
+    rng = random.Random(42)
+    start = date(year, 1, 1)
+    rows = []
+    for _ in range(n_transactions):
+        category = rng.choice(categories)
+        rows.append({
+            "amount": round(rng.uniform(1, 500), 2),
+            "type": category.type,
+            "date": start + timedelta(days=rng.randrange(365)),
+            "description": "bench",
+            "category_id": category.id,
+            "owner_id": user.id,
+        })
+    session.execute(insert(Transaction), rows)
+    session.commit()
+    return user.id
+
+
+def best_of(repeat: int, func_, *args) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func_(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=50_000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    year = 2024
+    with Session(engine) as session:
+        user_id = seed(session, args.transactions, args.categories, year)
+        start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+
+        legacy_time, legacy = best_of(args.repeat, legacy_generate_report_data, session, user_id, start_date, end_date)
+        session.expunge_all() # Don't let the legacy run's identity map skew the comparison
+        new_time, current = best_of(
+            args.repeat, lambda *a: asyncio.run(generate_report_data(*a)), session, user_id, start_date, end_date
+        )
+
+    # Sanity check: both implementations agree
+    assert abs(legacy[0] - current[0]) < 1e-6 and abs(legacy[1] - current[1]) < 1e-6
+    assert {c.category_id for c in legacy[3]} == {c.category_id for c in current[3]}
+
+    print(f"Yearly report over {args.transactions} transactions / {args.categories} categories (best of {args.repeat}):")
+    print(f"  legacy (ORM load + 2 GROUP BY): {legacy_time * 1000:9.2f} ms")
+    print(f"  single-pass aggregate:          {new_time * 1000:9.2f} ms")
+    print(f"  speedup:                        {legacy_time / new_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
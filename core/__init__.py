@@ -12,24 +12,28 @@ from middlewares.auth import AuthMiddleware # Import the auth middleware
 from core.config import settings # Import settings
 # from core.db import init_db # No longer needed if handled by Alembic
 from core.limiter import limiter, RateLimitExceeded, _rate_limit_exceeded_handler
-# Import scheduler functions
-from core.scheduler import start_scheduler, shutdown_scheduler
-# from core.cache import setup_cache
+# Scheduler functions are imported inside lifespan so serverless cold starts
+# don't pay for importing APScheduler.
 
 # --- Lifespan Context Manager ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
     print("Application startup...")
-    # Initialize cache
-    # await setup_cache()
-    # Start the scheduler
-    await start_scheduler()
+    # Start the scheduler (not in serverless mode: the process is frozen between
+    # invocations, so cron jobs must be triggered externally instead)
+    if not settings.SERVERLESS:
+        from core.scheduler import start_scheduler
+        await start_scheduler()
     yield
     # Shutdown logic
     print("Application shutdown...")
     # Shutdown the scheduler
-    await shutdown_scheduler()
+    if not settings.SERVERLESS:
+        from core.scheduler import shutdown_scheduler
+        await shutdown_scheduler()
+    from services.job_run_service import shutdown_job_workers
+    shutdown_job_workers()
 
 def create_app() -> FastAPI:
     app = FastAPI(
@@ -81,6 +85,21 @@ def create_app() -> FastAPI:
     def read_root():
         return {"message": "Welcome to the Personal Finance API"}
 
+    # Health check (no authentication), including which process leads the scheduled jobs and
+    # this process' report cache counters (entries, hits per tier, misses, hit ratio)
+    @app.get("/health", tags=["Root"])
+    async def health():
+        from core.cache import report_cache
+        cache_stats = report_cache.stats()
+        if settings.SERVERLESS or not settings.SCHEDULER_LEADER_ELECTION:
+            return {"status": "ok", "scheduler": None, "report_cache": cache_stats}
+        from core.leader import scheduler_leader
+        try:
+            scheduler_status = await scheduler_leader.status()
+        except Exception as e:
+            return {"status": "degraded", "scheduler": {"error": str(e)}, "report_cache": cache_stats}
+        return {"status": "ok", "scheduler": scheduler_status, "report_cache": cache_stats}
+
     # Add limiter state to the app
     app.state.limiter = limiter
     # Add the default rate limit exceeded handler
@@ -1,20 +1,113 @@
-# # from fastapi_cache2 import FastAPICache
-# # from fastapi_cache2.backends.redis import RedisBackend
-# from redis import asyncio as aioredis
-# from core.config import settings
-# import os
-
-# async def setup_cache():
-#     redis_url = os.getenv("REDIS_URL", "redis://localhost")
-#     redis = aioredis.from_url(redis_url, encoding="utf8", decode_responses=True)
-#     # FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-
-# def cache_key_builder(
-#     func,
-#     namespace: str = "",
-#     *args,
-#     **kwargs,
-# ):
-#     # prefix = FastAPICache.get_prefix()
-#     cache_key = f"{prefix}:{namespace}:{func.__module__}:{func.__name__}:"
-#     return cache_key 
\ No newline at end of file
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Type, TypeVar
+
+from sqlmodel import SQLModel
+
+from core.config import settings
+
+ModelT = TypeVar("ModelT", bound=SQLModel)
+
+# --- Report Result Cache ---
+# Two tiers:
+#   1. In-process LRU (always on unless REPORT_CACHE_SIZE=0).
+#   2. Optional shared tier in Redis (REDIS_URL), so workers/nodes share results.
+# Keys embed the user's data_version, so entries never need explicit invalidation:
+# a write bumps the version and old entries simply stop being looked up (the LRU
+# evicts them, Redis expires them after REPORT_CACHE_TTL_SECONDS).
+
+class ReportCache:
+    def __init__(self, max_entries: int, redis_url: Optional[str] = None, ttl_seconds: int = 3600):
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, SQLModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis: Any = None
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user_id: int, kind: str, *parts: Any, version: int) -> str:
+        return ":".join(["report", str(user_id), kind, *(str(part) for part in parts), f"v{version}"])
+
+    def _get_redis(self) -> Any:
+        """Lazily connects to the shared tier. Returns None if it's not configured or unavailable."""
+        if self._redis is None and self.redis_url:
+            try:
+                from redis import asyncio as aioredis
+            except ImportError:
+                print("Warning: REDIS_URL is set but the 'redis' package is not installed. Shared report cache disabled.")
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def get(self, key: str, model: Type[ModelT]) -> Optional[ModelT]:
+        if self.max_entries > 0:
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                    return cached # type: ignore [return-value]
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                payload = await redis.get(key)
+            except Exception as e:
+                print(f"Shared report cache read failed: {e}")
+                payload = None
+            if payload is not None:
+                value = model.model_validate_json(payload)
+                self._store_local(key, value)
+                self.shared_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: SQLModel) -> None:
+        self._store_local(key, value)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, value.model_dump_json(), ex=self.ttl_seconds)
+            except Exception as e:
+                print(f"Shared report cache write failed: {e}")
+
+    def _store_local(self, key: str, value: SQLModel) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops the in-process tier and resets the metrics."""
+        with self._lock:
+            self._entries.clear()
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "shared_tier": bool(self.redis_url),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+
+report_cache = ReportCache(
+    max_entries=settings.REPORT_CACHE_SIZE,
+    redis_url=settings.REDIS_URL,
+    ttl_seconds=settings.REPORT_CACHE_TTL_SECONDS,
+)
@@ -25,6 +25,70 @@ class Settings(BaseSettings):
     # Default value will be set based on DATABASE_URL in the validator below.
     USE_ASYNC_DB: bool | None = Field(default=None) # Allow None initially
 
+    # --- Serverless Mode ---
+    # When True (set SERVERLESS=1, or automatically on Vercel which sets VERCEL=1):
+    # engines are created lazily with NullPool, the APScheduler is not started and
+    # startup logging is skipped to keep cold starts short.
+    SERVERLESS: bool = Field(default_factory=lambda: os.getenv("VERCEL") == "1")
+
+    # --- Reports ---
+    # Serve whole months in reports from the monthly_category_rollup table instead of
+    # rescanning raw transactions. Run `python manage.py rebuild-rollups` after enabling
+    # this on a database that already has transactions.
+    REPORTS_USE_ROLLUP: bool = True
+    # Report result cache: in-process LRU entries (0 disables it) and optional shared Redis tier
+    REPORT_CACHE_SIZE: int = 1024
+    REPORT_CACHE_TTL_SECONDS: int = 3600
+    REDIS_URL: str | None = Field(default=None)
+    # Per-user NumPy transaction snapshots kept in memory for /reports/analytics (0 disables caching)
+    ANALYTICS_SNAPSHOT_CACHE_SIZE: int = 256
+    # Serve monthly/yearly/custom reports from the analytics snapshot instead of SQL aggregates
+    REPORTS_USE_ANALYTICS_SNAPSHOT: bool = False
+    # Max independent report queries run in parallel per request (async mode, non-SQLite).
+    # Each one holds a pooled connection, so keep it below the engine's pool size.
+    REPORT_QUERY_CONCURRENCY: int = 4
+    # Nightly report snapshots (last month + current year) for users with transactions added
+    # in the last REPORT_SNAPSHOT_ACTIVE_DAYS days, processed in chunks with bounded concurrency
+    REPORT_SNAPSHOT_ACTIVE_DAYS: int = 30
+    REPORT_SNAPSHOT_CHUNK_SIZE: int = 200
+    REPORT_SNAPSHOT_CONCURRENCY: int = 4
+    # Spending anomaly notifications: an expense this many standard deviations above its
+    # category's mean is flagged, once the category has ANOMALY_MIN_SAMPLES transactions
+    ANOMALY_Z_THRESHOLD: float = 3.0
+    ANOMALY_MIN_SAMPLES: int = 5
+    # Anonymized cross-user insights (opted-in users only): owners per worker chunk, worker
+    # processes (0 = run in-process), minimum distinct users per published group, and the
+    # monthly-expense band bounds that define cohorts
+    INSIGHTS_CHUNK_OWNERS: int = 500
+    INSIGHTS_WORKERS: int = 4
+    INSIGHTS_MIN_COHORT_SIZE: int = 10
+    INSIGHTS_COHORT_BOUNDS: list[float] = [500, 1000, 2500, 5000]
+    # Recurring generation: due rules are split into chunks of this many owners (by owner_id
+    # range), each generated and committed in its own transaction; up to RECURRING_WORKERS chunks
+    # run at once in async mode, and a failed chunk is retried RECURRING_CHUNK_RETRIES times
+    RECURRING_CHUNK_OWNERS: int = 1000
+    RECURRING_WORKERS: int = 4
+    RECURRING_CHUNK_RETRIES: int = 2
+    RECURRING_CHUNK_RETRY_DELAY_SECONDS: float = 1.0
+    # Scheduler leader election: with several workers/nodes only the elected process runs the
+    # scheduled jobs. The leader renews its lease every SCHEDULER_HEARTBEAT_SECONDS; others take
+    # over once it hasn't for SCHEDULER_LEASE_TTL_SECONDS (PostgreSQL uses an advisory lock instead)
+    SCHEDULER_LEADER_ELECTION: bool = True
+    SCHEDULER_LEASE_TTL_SECONDS: int = 30
+    SCHEDULER_HEARTBEAT_SECONDS: int = 10
+    # Scheduler job store: "sqlalchemy" (persisted in the database, so runs missed while the app
+    # was down are caught up after a restart) or "memory". A missed run is still executed if it is
+    # at most SCHEDULER_MISFIRE_GRACE_SECONDS late; with SCHEDULER_COALESCE several missed runs
+    # of a job are caught up with a single run
+    SCHEDULER_JOB_STORE: str = "sqlalchemy"
+    SCHEDULER_MISFIRE_GRACE_SECONDS: int = 6 * 3600
+    SCHEDULER_COALESCE: bool = True
+    # Manually triggered jobs (e.g. POST /recurring-transactions/generate-due) run in this many
+    # worker processes (0 = as a task on the web worker's event loop). A run that holds its
+    # deduplication key for longer than JOB_STALE_AFTER_SECONDS is considered dead
+    JOB_WORKERS: int = 1
+    JOB_STALE_AFTER_SECONDS: int = 3600
+
     # --- JWT Settings ---
     SECRET_KEY: str = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7") # Placeholder key
     ALGORITHM: str = "HS256"
@@ -50,7 +114,8 @@ class Settings(BaseSettings):
         if self.USE_ASYNC_DB is None: # Only set default if not provided via env var
             is_async_url = self.DATABASE_URL.startswith(("sqlite+aiosqlite", "postgresql+asyncpg", "mysql+aiomysql"))
             self.USE_ASYNC_DB = is_async_url
-            print(f"DEBUG: USE_ASYNC_DB defaulted to {self.USE_ASYNC_DB} based on DATABASE_URL")
+            if not self.SERVERLESS:
+                print(f"DEBUG: USE_ASYNC_DB defaulted to {self.USE_ASYNC_DB} based on DATABASE_URL")
         # Ensure USE_ASYNC_DB is bool after validation/defaulting
         if not isinstance(self.USE_ASYNC_DB, bool):
              # Attempt conversion for env vars like "True", "1", "False", "0"
@@ -77,9 +142,10 @@ def get_sync_database_url(db_url: str) -> str:
 
 SYNC_DATABASE_URL = get_sync_database_url(settings.DATABASE_URL)
 
-# Print effective settings for debugging during startup
-print(f"--- Configuration ---")
-print(f"DATABASE_URL: {settings.DATABASE_URL}")
-print(f"USE_ASYNC_DB: {settings.USE_ASYNC_DB}")
-print(f"SYNC_DATABASE_URL (for Alembic/Sync Mode): {SYNC_DATABASE_URL}")
-print(f"---------------------")
+# Print effective settings for debugging during startup (skipped on serverless cold starts)
+if not settings.SERVERLESS:
+    print(f"--- Configuration ---")
+    print(f"DATABASE_URL: {settings.DATABASE_URL}")
+    print(f"USE_ASYNC_DB: {settings.USE_ASYNC_DB}")
+    print(f"SYNC_DATABASE_URL (for Alembic/Sync Mode): {SYNC_DATABASE_URL}")
+    print(f"---------------------")
@@ -1,36 +1,75 @@
+import asyncio
 from sqlmodel import SQLModel, Session, create_engine
 # Import async session from sqlmodel, async engine from sqlalchemy
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
 from contextlib import contextmanager, asynccontextmanager
-from typing import Generator, AsyncGenerator, Union, Any
+from typing import Generator, AsyncGenerator, Union, Any, List, Optional, Sequence
 
 # Import settings and the derived SYNC_DATABASE_URL
 from core.config import settings, SYNC_DATABASE_URL
 import models # noqa
 
 # --- Engine Creation ---
-# Create sync engine (always needed for Alembic, used by app if USE_ASYNC_DB=False)
-sync_engine = create_engine(SYNC_DATABASE_URL, echo=settings.DEBUG if not settings.USE_ASYNC_DB else False)
+# Engines are created lazily on first use instead of at import time.
+# This keeps cold starts cheap in serverless deployments (e.g. Vercel), where
+# many invocations never touch the database at all.
+_sync_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
 
-# Create async engine only if USE_ASYNC_DB is True
-async_engine: AsyncEngine | None = None
-if settings.USE_ASYNC_DB:
-    async_engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
-    print("Initialized ASYNC database engine.")
-else:
-    print("Initialized SYNC database engine.")
+def _engine_options() -> dict[str, Any]:
+    """Extra create_engine() options for the current deployment mode."""
+    if settings.SERVERLESS:
+        # A lambda may be frozen between invocations, so pooled connections go stale.
+        # Open one connection per checkout and leave pooling to an external pooler
+        # (e.g. PgBouncer / RDS Proxy) if one sits in front of the database.
+        return {"poolclass": NullPool}
+    return {}
+
+def get_sync_engine() -> Engine:
+    """Returns the sync engine, creating it on first use.
+    Always available: Alembic uses it, and the app uses it when USE_ASYNC_DB=False."""
+    global _sync_engine
+    if _sync_engine is None:
+        _sync_engine = create_engine(
+            SYNC_DATABASE_URL,
+            echo=settings.DEBUG if not settings.USE_ASYNC_DB else False,
+            **_engine_options()
+        )
+        if not settings.USE_ASYNC_DB:
+            print("Initialized SYNC database engine.")
+    return _sync_engine
+
+def get_async_engine() -> AsyncEngine | None:
+    """Returns the async engine, creating it on first use. None if USE_ASYNC_DB is False."""
+    global _async_engine
+    if _async_engine is None and settings.USE_ASYNC_DB:
+        _async_engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG, **_engine_options())
+        print("Initialized ASYNC database engine.")
+    return _async_engine
+
+def __getattr__(name: str) -> Any:
+    # Keep `from core.db import sync_engine, async_engine` working without
+    # building the engines at import time.
+    if name == "sync_engine":
+        return get_sync_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # --- Session Dependencies ---
 # Sync Session Dependency
 def get_sync_session() -> Generator[Session, None, None]:
     # print("DEBUG: Getting SYNC session") # Debug print
-    with Session(sync_engine) as session:
+    with Session(get_sync_engine()) as session:
         yield session
 
 # Async Session Dependency
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async_engine = get_async_engine()
     if not async_engine:
          raise RuntimeError("Async engine not initialized. Check USE_ASYNC_DB setting and DATABASE_URL.")
     # print("DEBUG: Getting ASYNC session") # Debug print
@@ -42,7 +81,7 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
 # Sync Session Scope
 @contextmanager
 def sync_session_scope() -> Generator[Session, None, None]:
-    session = Session(sync_engine)
+    session = Session(get_sync_engine())
     # print("DEBUG: Entering SYNC session scope") # Debug print
     try:
         yield session
@@ -58,6 +97,7 @@ def sync_session_scope() -> Generator[Session, None, None]:
 # Async Session Scope
 @asynccontextmanager
 async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    async_engine = get_async_engine()
     if not async_engine:
          raise RuntimeError("Async engine not initialized. Check USE_ASYNC_DB setting and DATABASE_URL.")
     session = AsyncSession(async_engine, expire_on_commit=False)
@@ -82,6 +122,47 @@ async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
 async def get_db_session() -> Any: # Return type Any due to conditional yield
     """Dependency that returns either an AsyncSession or sync Session based on settings."""
     if settings.USE_ASYNC_DB:
-        return AsyncSession(async_engine, expire_on_commit=False)
+        return AsyncSession(get_async_engine(), expire_on_commit=False)
     else:
-        return Session(sync_engine)
+        return Session(get_sync_engine())
+
+
+# --- Concurrent Read Queries ---
+# SQLite serializes access to the database file (and in-memory DBs are tied to one connection),
+# so parallel connections gain nothing there.
+_SERIAL_DIALECTS = {"sqlite"}
+
+async def exec_concurrently(session: Any, statements: Sequence[Any], limit: Optional[int] = None) -> List[List[Any]]:
+    """
+    Runs independent read-only SELECTs and returns their rows, in statement order.
+    In async mode each statement runs on its own session (and pooled connection), at most
+    `limit` (default REPORT_QUERY_CONCURRENCY) at a time. Falls back to running them one after
+    another on `session` in sync mode, for SQLite, or when there is nothing to overlap.
+    Note: the extra sessions only see data committed before the call, not pending changes in `session`.
+    """
+    limit = limit or settings.REPORT_QUERY_CONCURRENCY
+    bind = session.bind if settings.USE_ASYNC_DB else None
+    if bind is None or len(statements) < 2 or limit < 2 or bind.dialect.name in _SERIAL_DIALECTS:
+        results = []
+        for statement in statements:
+            if settings.USE_ASYNC_DB:
+                results.append((await session.exec(statement)).all())
+            else:
+                results.append(session.exec(statement).all())
+        return results
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(statement: Any) -> List[Any]:
+        async with semaphore:
+            async with AsyncSession(bind, expire_on_commit=False) as query_session:
+                return (await query_session.exec(statement)).all()
+
+    # TaskGroup cancels the remaining queries if one fails (re-raising its error), and all of
+    # them if the awaiting request is cancelled; sessions are closed either way.
+    try:
+        async with asyncio.TaskGroup() as task_group:
+            tasks = [task_group.create_task(run(statement)) for statement in statements]
+    except ExceptionGroup as errors:
+        raise errors.exceptions[0] # Surface the DB error itself, as the sequential path would
+    return [task.result() for task in tasks]
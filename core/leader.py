@@ -0,0 +1,213 @@
+import asyncio
+import os
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import case, insert, or_, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from core.config import settings
+from models import SchedulerLease
+
+# --- Scheduler Leader Election ---
+# Every uvicorn worker starts its own scheduler, so without coordination each scheduled job
+# would run once per process. Processes elect one leader and only the leader runs jobs:
+#   * PostgreSQL: a session-level advisory lock held on a dedicated connection. It is released
+#     by the server as soon as the leader's connection dies, so failover is immediate.
+#   * Other databases: a scheduler_lease row the leader renews on every heartbeat. Once it
+#     expires (leader crashed or hung) the next process to heartbeat takes it over.
+# Election runs on the sync engine (always available, like Alembic) in a worker thread, so it
+# works the same with USE_ASYNC_DB on or off.
+
+_lease_table = SchedulerLease.__table__
+
+
+class LeaderElection:
+    def __init__(
+        self,
+        name: str,
+        engine: Optional[Engine] = None,
+        ttl_seconds: Optional[int] = None,
+        heartbeat_seconds: Optional[int] = None,
+    ):
+        self.name = name
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl_seconds = ttl_seconds or settings.SCHEDULER_LEASE_TTL_SECONDS
+        self.heartbeat_seconds = heartbeat_seconds or settings.SCHEDULER_HEARTBEAT_SECONDS
+        self._engine = engine
+        # Advisory lock keys are 64-bit integers
+        self._lock_key = zlib.crc32(f"emon:{name}".encode())
+        self._lock_connection: Optional[Connection] = None
+        self._is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        # Called with the new state whenever this process gains or loses leadership
+        self.on_change: Optional[Callable[[bool], None]] = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            # Imported here: resolving the engine creates it
+            from core.db import get_sync_engine
+            self._engine = get_sync_engine()
+        return self._engine
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def _uses_advisory_lock(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    # --- Election (blocking; run via asyncio.to_thread) ---
+
+    def heartbeat(self) -> bool:
+        """Acquires or renews leadership. Returns whether this process is the leader now."""
+        try:
+            if self._uses_advisory_lock():
+                self._is_leader = self._hold_advisory_lock()
+                if self._is_leader:
+                    self._renew_lease(take_over=True) # Informational: who holds the lock
+            else:
+                self._is_leader = self._renew_lease(take_over=False)
+        except Exception as e:
+            print(f"Leader election heartbeat failed for '{self.name}': {e}")
+            self._drop_lock_connection()
+            self._is_leader = False
+        return self._is_leader
+
+    def _hold_advisory_lock(self) -> bool:
+        if self._lock_connection is not None:
+            # Still holding the lock as long as its connection is alive
+            self._lock_connection.execute(text("SELECT 1"))
+            self._lock_connection.commit()
+            return True
+        # Tracked before locking, so a failure from here on drops (invalidates) the connection
+        self._lock_connection = self.engine.connect()
+        acquired = self._lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self._lock_key}).scalar()
+        self._lock_connection.commit() # The lock is session-level; don't sit idle in a transaction
+        if not acquired:
+            self._lock_connection.close() # Holds no lock: fine to reuse
+            self._lock_connection = None
+            return False
+        return True
+
+    def _renew_lease(self, take_over: bool) -> bool:
+        """Extends the lease if this process holds it or it has expired (or unconditionally with take_over)."""
+        now = datetime.utcnow()
+        renew = (
+            update(_lease_table)
+            .where(_lease_table.c.name == self.name)
+            .values(
+                holder=self.holder_id,
+                acquired_at=case((_lease_table.c.holder == self.holder_id, _lease_table.c.acquired_at), else_=now),
+                expires_at=now + timedelta(seconds=self.ttl_seconds),
+            )
+        )
+        if not take_over:
+            renew = renew.where(or_(_lease_table.c.holder == self.holder_id, _lease_table.c.expires_at < now))
+        with self.engine.begin() as connection:
+            if connection.execute(renew).rowcount:
+                return True
+            if connection.execute(select(_lease_table.c.name).where(_lease_table.c.name == self.name)).first():
+                return False # Held by another live process
+        # No lease yet: the first process to insert it wins
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(_lease_table).values(
+                    name=self.name, holder=self.holder_id, acquired_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl_seconds),
+                ))
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self) -> None:
+        """Gives up leadership so another process can take over without waiting for the lease to expire."""
+        if not self._is_leader:
+            return
+        self._is_leader = False
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    update(_lease_table)
+                    .where(_lease_table.c.name == self.name, _lease_table.c.holder == self.holder_id)
+                    .values(expires_at=datetime.utcnow())
+                )
+            if self._lock_connection is not None:
+                self._lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self._lock_key})
+                self._lock_connection.commit()
+        except Exception as e:
+            print(f"Releasing leadership of '{self.name}' failed: {e}")
+        finally:
+            self._drop_lock_connection()
+
+    def _drop_lock_connection(self) -> None:
+        if self._lock_connection is not None:
+            try:
+                # Closing a pooled connection would only return it to the pool, session (and
+                # advisory lock) intact. Invalidating closes the DBAPI connection, which ends the
+                # database session and so releases the lock.
+                self._lock_connection.invalidate()
+                self._lock_connection.close()
+            except Exception:
+                pass
+            self._lock_connection = None
+
+    def current_leader(self) -> Optional[dict[str, Any]]:
+        """The recorded leader, or None if there is none (or its lease has expired)."""
+        with self.engine.connect() as connection:
+            lease = connection.execute(select(_lease_table).where(_lease_table.c.name == self.name)).first()
+        if lease is None or lease.expires_at < datetime.utcnow():
+            return None
+        return {"holder": lease.holder, "acquired_at": lease.acquired_at, "expires_at": lease.expires_at}
+
+    # --- Background heartbeat ---
+
+    async def confirm(self) -> bool:
+        """Renews leadership right now (e.g. just before running a job) and returns whether this process leads."""
+        was_leader = self._is_leader
+        is_leader = await asyncio.to_thread(self.heartbeat)
+        if is_leader != was_leader:
+            print(f"Leader election '{self.name}': {self.holder_id} {'became the leader' if is_leader else 'lost leadership'}.")
+            if self.on_change is not None:
+                self.on_change(is_leader)
+        return is_leader
+
+    async def start(self) -> None:
+        """Starts heartbeating in the background; followers keep trying, so a dead leader is replaced."""
+        if self._task is None:
+            if not await self.confirm():
+                print(f"Leader election '{self.name}': {self.holder_id} is a follower.")
+            self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self.confirm()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.release)
+
+    async def status(self) -> dict[str, Any]:
+        """Election state for the health endpoint."""
+        leader = await asyncio.to_thread(self.current_leader)
+        return {
+            "election": self.name,
+            "this_process": self.holder_id,
+            "is_leader": self._is_leader,
+            "leader": leader,
+        }
+
+
+scheduler_leader = LeaderElection("scheduler")
@@ -1,62 +1,144 @@
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.base import BaseJobStore
 from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.triggers.cron import CronTrigger
 from datetime import date
+from typing import Any, Awaitable, Callable
 
 # Import the service function to be scheduled
 # Ensure the service function itself is async if using AsyncIOScheduler directly
-from services.recurring_transaction_service import generate_due_transactions
+from services.recurring_transaction_service import generate_due_for_new_local_days, GENERATION_JOB_ID
+from services.report_snapshot_service import precompute_report_snapshots
+from services.job_run_service import record_job_run
+from core.config import settings
+from core.leader import scheduler_leader
 
-# Configure job stores and executors
-jobstores = {
-    'default': MemoryJobStore()
-}
+RECURRING_JOB_ID = GENERATION_JOB_ID
+REPORT_SNAPSHOT_JOB_ID = 'precompute_report_snapshots'
+
+# Configure executors; job stores are set up in start_scheduler(), so importing this module
+# doesn't create a database engine
 executors = {
     'default': AsyncIOExecutor()
 }
 job_defaults = {
-    'coalesce': False, # Run missed jobs if scheduler was down (be careful with this)
+    # Several runs missed while no scheduler was up are caught up with one run (generation
+    # expands every occurrence up to the run date anyway)
+    'coalesce': settings.SCHEDULER_COALESCE,
+    # A run missed by at most this long is still executed after a restart; older ones are skipped
+    'misfire_grace_time': settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
     'max_instances': 1 # Only allow one instance of the job to run at a time
 }
 
 # Initialize the scheduler
 scheduler = AsyncIOScheduler(
-    jobstores=jobstores,
     executors=executors,
     job_defaults=job_defaults,
     timezone='UTC' # Or your preferred timezone
 )
 
+def _job_store() -> BaseJobStore:
+    """
+    The default job store. "sqlalchemy" keeps jobs (and their next run time) in the database
+    behind core/db.py's sync engine, so a run due while every process was down is still known
+    after a restart and caught up within the misfire grace time.
+    """
+    if settings.SCHEDULER_JOB_STORE == "sqlalchemy":
+        from core.db import get_sync_engine
+        return SQLAlchemyJobStore(engine=get_sync_engine(), tablename="apscheduler_jobs")
+    return MemoryJobStore()
+
+async def _run_as_leader(job_id: str, job: Callable[..., Awaitable[Any]]) -> Any:
+    """
+    Runs a job in the elected leader process only, recording the run in job_run. Followers'
+    schedulers are paused, but leadership is re-confirmed here in case it changed hands.
+    """
+    if settings.SCHEDULER_LEADER_ELECTION and not await scheduler_leader.confirm():
+        print(f"Skipping job '{job_id}': this process is not the scheduler leader.")
+        return None
+    return await record_job_run(job_id, job, host=scheduler_leader.holder_id)
+
+# Jobs are stored by reference ("module:function"), so they must be plain module-level functions
+
+async def run_recurring_transaction_job() -> Any:
+    return await _run_as_leader(RECURRING_JOB_ID, generate_due_for_new_local_days)
+
+async def run_report_snapshot_job() -> Any:
+    return await _run_as_leader(REPORT_SNAPSHOT_JOB_ID, precompute_report_snapshots)
+
+def _ensure_job(func: Callable[..., Awaitable[Any]], job_id: str, name: str, trigger: CronTrigger) -> bool:
+    """
+    Adds a job unless the job store already has it with the same function and trigger. A stored
+    job keeps its pending next run time, so a run missed while the app was down is caught up.
+    Returns True if the job was (re)scheduled.
+    """
+    existing = scheduler.get_job(job_id)
+    if existing is not None and existing.func == func and str(existing.trigger) == str(trigger):
+        return False
+    scheduler.add_job(func, trigger=trigger, id=job_id, name=name, replace_existing=True)
+    return True
+
 def schedule_recurring_transaction_job():
     """Adds the recurring transaction generation job to the scheduler."""
-    job_id = 'generate_recurring_transactions'
-    # Check if job already exists to prevent duplicates during hot reload
-    if not scheduler.get_job(job_id):
-        scheduler.add_job(
-            generate_due_transactions, # Pass the async function directly
-            trigger='cron', # Use cron trigger for daily execution
-            hour=1,        # Run at 1 AM UTC (adjust as needed)
-            minute=0,
-            id=job_id,
-            name='Generate Due Recurring Transactions',
-            replace_existing=True # Replace if job with same ID exists (useful for updates)
-        )
-        print(f"Scheduled job '{job_id}' to run daily at 01:00 UTC.")
+    # Hourly: each run handles the time zones where a new local day has just started
+    trigger = CronTrigger(minute=0, timezone='UTC')
+    if _ensure_job(run_recurring_transaction_job, RECURRING_JOB_ID, 'Generate Due Recurring Transactions', trigger):
+        print(f"Scheduled job '{RECURRING_JOB_ID}' to run hourly.")
+    else:
+        print(f"Job '{RECURRING_JOB_ID}' already scheduled.")
+
+def schedule_report_snapshot_job():
+    """Adds the nightly report snapshot job to the scheduler."""
+    # After the recurring transaction run for UTC midnight, so UTC users' generated rows are included
+    trigger = CronTrigger(hour=2, minute=0, timezone='UTC')
+    if _ensure_job(run_report_snapshot_job, REPORT_SNAPSHOT_JOB_ID, 'Precompute Report Snapshots', trigger):
+        print(f"Scheduled job '{REPORT_SNAPSHOT_JOB_ID}' to run daily at 02:00 UTC.")
     else:
-        print(f"Job '{job_id}' already scheduled.")
+        print(f"Job '{REPORT_SNAPSHOT_JOB_ID}' already scheduled.")
+
+def _on_leadership_change(is_leader: bool) -> None:
+    """Only the leader's scheduler processes the (shared) job store."""
+    if not scheduler.running:
+        return
+    if is_leader:
+        scheduler.resume() # Picks up runs that are due or missed
+    else:
+        scheduler.pause()
 
 async def start_scheduler():
     """Starts the scheduler if it's not already running."""
     if not scheduler.running:
-        scheduler.start()
-        print("Scheduler started.")
-        # Add the job after starting
+        # (Re)configure for the running event loop: a scheduler started before (e.g. by another
+        # app instance in tests) stays bound to its first, possibly closed, loop otherwise
+        scheduler.configure(
+            jobstores={'default': _job_store()},
+            executors={'default': AsyncIOExecutor()},
+            job_defaults=job_defaults,
+            timezone='UTC',
+            event_loop=asyncio.get_running_loop(),
+        )
+        leading = True
+        if settings.SCHEDULER_LEADER_ELECTION:
+            scheduler_leader.on_change = _on_leadership_change
+            await scheduler_leader.start()
+            leading = scheduler_leader.is_leader
+        # Followers start paused: they must not advance the shared jobs' next run times
+        scheduler.start(paused=not leading)
+        print("Scheduler started." if leading else "Scheduler started (paused until this process becomes the leader).")
+        # Add the jobs after starting, so existing jobs are found in the job store
         schedule_recurring_transaction_job()
+        schedule_report_snapshot_job()
 
 async def shutdown_scheduler():
     """Shuts down the scheduler gracefully."""
     if scheduler.running:
         # Wait for running jobs to complete? (timeout optional)
         scheduler.shutdown(wait=False) # Set wait=True if needed
+        await asyncio.sleep(0) # AsyncIOScheduler shuts down on the next event loop iteration
         print("Scheduler shut down.")
+    if settings.SCHEDULER_LEADER_ELECTION:
+        scheduler_leader.on_change = None
+        await scheduler_leader.stop() # Hand over leadership right away
@@ -4,14 +4,15 @@
 from dto.category_dto import CategoryBase, CategoryRead, CategoryReadWithTransactions
 from dto.transaction_dto import TransactionBase, TransactionRead, TransactionReadWithCategory
 from dto.report_dto import MonthlyReport, CategorySummary
-from dto.user_dto import UserCreate, UserRead, UserPasswordUpdate # Add UserPasswordUpdate
+from dto.user_dto import UserCreate, UserRead, UserPasswordUpdate, UserInsightsConsentUpdate, UserTimezoneUpdate # Add UserPasswordUpdate
 from dto.token_dto import Token, TokenPayload
-from dto.budget_dto import BudgetBase, BudgetCreate, BudgetRead
+from dto.budget_dto import BudgetBase, BudgetCreate, BudgetRead, BudgetProgress
 from dto.recurring_transaction_dto import RecurringTransactionBase, RecurringTransactionCreate, RecurringTransactionRead
 from dto.ai_consultation_dto import AIConsultationRequest, AIConsultationResponse, AIModelProvider
 from dto.notification_dto import NotificationRead, NotificationUpdate # Add Notification DTOs
+from dto.job_run_dto import JobRunRead
 # Add new report DTOs
-from dto.report_dto import MonthlyReport, YearlyReport, DateRangeReport, CategorySummary
+from dto.report_dto import MonthlyReport, YearlyReport, DateRangeReport, CategorySummary, TimeBucket, TimeSeriesPoint, TimeSeriesReport, ComparisonPeriod, CategoryComparison, ComparisonReport, CategoryShare, AnalyticsReport, ForecastMonth, ForecastReport, ReportRange, BatchReportRequest, BatchReportItem, BalancePoint, BalanceReport, LedgerEntry, LedgerReport, QuantileValue, HistogramBin, CategoryStatistics, StatisticsReport
 
 # Call model_rebuild here after all DTOs that might use forward references
 # have been imported. This resolves the circular dependencies.
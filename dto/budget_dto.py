@@ -20,6 +20,13 @@ class BudgetRead(BudgetBase):
     id: int
     owner_id: int # Include owner_id for clarity/debugging if needed
 
+# Schema for budget-vs-actual progress (spent counts expense transactions only)
+class BudgetProgress(BudgetRead):
+    category_name: Optional[str] = None # None for the overall monthly budget
+    spent: float = 0.0
+    remaining: float = 0.0 # Negative when over budget
+    percent_used: float = 0.0
+
 # Optional: Schema to read budget with category details
 # Need to handle circular imports if CategoryRead imports BudgetRead
 # from .category_dto import CategoryRead # Avoid direct import here
@@ -12,10 +12,12 @@ from models.category_model import CategoryType # Assuming CategoryType stays in
 class CategoryBase(SQLModel):
     name: str
     type: CategoryType = CategoryType.EXPENSE
+    parent_id: Optional[int] = None # Parent category (same type); None for a top-level category
 
 # Schema for reading data (API output)
 class CategoryRead(CategoryBase):
     id: int
+    depth: int = 0
 
 # Schema for reading Category with its Transactions (API output)
 class CategoryReadWithTransactions(CategoryRead):
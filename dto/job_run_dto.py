@@ -0,0 +1,25 @@
+from sqlmodel import SQLModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+from models.job_run_model import JobRun, JobRunStatus
+
+# Model for reading a background job run (e.g. a manually triggered generation)
+class JobRunRead(SQLModel):
+    id: int
+    job_id: str
+    trigger: str
+    status: JobRunStatus
+    parameters: Dict[str, Any] = {}
+    requested_by: Optional[int] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None # Until now while the run is in progress
+    rows_created: Optional[int] = None
+    chunks_done: Optional[int] = None
+    chunk_count: Optional[int] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_job_run(cls, job_run: JobRun) -> "JobRunRead":
+        end = job_run.finished_at or datetime.utcnow()
+        return cls.model_validate(job_run, update={"duration_seconds": (end - job_run.started_at).total_seconds()})
@@ -21,6 +21,7 @@ class RecurringTransactionRead(RecurringTransactionBase):
     id: int
     owner_id: int
     last_created_date: Optional[date] = None # Include tracking date
+    next_due_date: Optional[date] = None
 
 # Optional: Schema with Category details
 # Need to handle potential circular imports if CategoryRead uses this
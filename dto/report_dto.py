@@ -1,6 +1,9 @@
 from sqlmodel import SQLModel
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import date  as dt_date # Import date
+from enum import Enum
+
+from models.category_model import CategoryType
 
 # Optional: DTO for breakdown by category
 class CategorySummary(SQLModel):
@@ -36,3 +39,174 @@ class DateRangeReport(SQLModel):
     net_balance: float = 0.0
     income_by_category: List[CategorySummary] = []
     expense_by_category: List[CategorySummary] = []
+
+# Bucket size for time-series reports
+class TimeBucket(str, Enum):
+    DAY = "day"
+    WEEK = "week" # ISO weeks, starting on Monday
+    MONTH = "month"
+    QUARTER = "quarter"
+
+# One bucket of a time-series report (dates clipped to the requested range)
+class TimeSeriesPoint(SQLModel):
+    period_start: dt_date
+    period_end: dt_date
+    total_income: float = 0.0
+    total_expense: float = 0.0
+    net_balance: float = 0.0
+    # Only filled in when the per-category breakdown is requested
+    income_by_category: Optional[List[CategorySummary]] = None
+    expense_by_category: Optional[List[CategorySummary]] = None
+
+# DTO for bucketed time-series report response
+class TimeSeriesReport(SQLModel):
+    start_date: dt_date
+    end_date: dt_date
+    bucket: TimeBucket
+    points: List[TimeSeriesPoint] = []
+
+# Totals for one period of a comparison report
+class ComparisonPeriod(SQLModel):
+    label: str # The period as requested, e.g. "2024-03"
+    start_date: dt_date
+    end_date: dt_date
+    total_income: float = 0.0
+    total_expense: float = 0.0
+    net_balance: float = 0.0
+
+# One category across all compared periods (lists are aligned with ComparisonReport.periods)
+class CategoryComparison(SQLModel):
+    category_id: int
+    category_name: str
+    type: CategoryType
+    amounts: List[float] = []
+    # Change against the previous period, one entry per period after the first
+    deltas: List[float] = []
+    # None when the previous period had no amount for this category
+    percent_changes: List[Optional[float]] = []
+
+# DTO for period-over-period comparison response
+class ComparisonReport(SQLModel):
+    periods: List[ComparisonPeriod] = []
+    categories: List[CategoryComparison] = []
+    # Categories with an amount in the last period but none in the first, and vice versa
+    appeared_categories: List[CategorySummary] = []
+    disappeared_categories: List[CategorySummary] = []
+
+# A category's slice of the income or expense total
+class CategoryShare(SQLModel):
+    category_id: int
+    category_name: str
+    total_amount: float
+    share: float # 0..1 of the period's total for that type
+
+# DTO for the analytics report response (computed from the in-memory snapshot)
+class AnalyticsReport(SQLModel):
+    start_date: dt_date
+    end_date: dt_date
+    total_income: float = 0.0
+    total_expense: float = 0.0
+    expense_shares: List[CategoryShare] = []
+    income_shares: List[CategoryShare] = []
+    # Expense sums per weekday, Monday first
+    weekday_expense: List[float] = []
+    rolling_window_days: int
+    # Trailing average of daily expense, one value per day from start_date to end_date
+    rolling_expense_average: List[float] = []
+
+# One projected calendar month of a forecast report
+class ForecastMonth(SQLModel):
+    year: int
+    month: int
+    period_start: dt_date # The day after as_of for the first (partial) month
+    period_end: dt_date
+    # From expanding active recurring rules
+    recurring_income: float = 0.0
+    recurring_expense: float = 0.0
+    # From historical per-category averages (categories without recurring rules)
+    estimated_income: float = 0.0
+    estimated_expense: float = 0.0
+    total_income: float = 0.0
+    total_expense: float = 0.0
+    net_change: float = 0.0
+    projected_balance: float = 0.0 # Balance at period_end
+
+# DTO for cash-flow forecast response
+class ForecastReport(SQLModel):
+    as_of: dt_date
+    starting_balance: float = 0.0 # All income minus all expenses up to as_of
+    history_months: int
+    months: List[ForecastMonth] = []
+
+# One requested range of a batch report
+class ReportRange(SQLModel):
+    start_date: dt_date
+    end_date: dt_date
+    label: Optional[str] = None # Echoed back, e.g. "ytd" or "last_30_days"
+
+# Request body for batched multi-range reports
+class BatchReportRequest(SQLModel):
+    ranges: List[ReportRange]
+
+# One result of a batch report, in the order of the requested ranges
+class BatchReportItem(DateRangeReport):
+    label: Optional[str] = None
+
+# Balance at the end of a day with transactions
+class BalancePoint(SQLModel):
+    date: dt_date
+    income: float = 0.0
+    expense: float = 0.0
+    balance: float = 0.0
+
+# DTO for daily running balance response
+class BalanceReport(SQLModel):
+    start_date: dt_date
+    end_date: dt_date
+    opening_balance: float = 0.0 # Balance before start_date
+    closing_balance: float = 0.0 # Balance at the end of end_date
+    points: List[BalancePoint] = []
+
+# One transaction with the balance right after it
+class LedgerEntry(SQLModel):
+    transaction_id: int
+    date: dt_date
+    type: CategoryType
+    amount: float
+    category_id: int
+    description: Optional[str] = None
+    balance: float = 0.0
+
+# DTO for per-transaction ledger response (one page, ordered by date then id)
+class LedgerReport(SQLModel):
+    start_date: dt_date
+    end_date: dt_date
+    opening_balance: float = 0.0 # Balance before start_date
+    entries: List[LedgerEntry] = []
+
+# Approximate quantile of a category's transaction amounts
+class QuantileValue(SQLModel):
+    q: float
+    value: float
+
+# Amount range of a distribution histogram
+class HistogramBin(SQLModel):
+    lower: float
+    upper: float
+    count: int
+
+# Amount distribution for one category
+class CategoryStatistics(SQLModel):
+    category_id: int
+    category_name: str
+    type: CategoryType
+    count: int
+    quantiles: List[QuantileValue] = []
+    histogram: List[HistogramBin] = []
+
+# DTO for per-category amount statistics response
+class StatisticsReport(SQLModel):
+    year: int
+    month: Optional[int] = None # None for the whole year
+    relative_accuracy: float # Max relative error of every quantile value
+    categories: List[CategoryStatistics] = []
@@ -22,6 +22,8 @@ class TransactionRead(TransactionBase):
     type: CategoryType # Include type derived from category
     created_at: datetime
     updated_at: Optional[datetime]
+    recurring_rule_id: Optional[int] = None # Set if generated from a recurring rule
+    occurrence_date: Optional[date] = None
 
 # Schema for reading Transaction with its Category details (API output)
 class TransactionReadWithCategory(TransactionRead):
@@ -1,5 +1,6 @@
 from sqlmodel import SQLModel
-from pydantic import EmailStr # Use EmailStr for validation
+from pydantic import EmailStr, field_validator # Use EmailStr for validation
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # --- User DTOs ---
 
@@ -13,6 +14,8 @@ class UserRead(SQLModel):
     id: int
     email: EmailStr
     is_active: bool
+    share_anonymized_insights: bool = False
+    timezone: str = "UTC"
 
 # Properties stored in DB (never return hashed_password)
 # Not typically used as a DTO, but useful for internal representation
@@ -26,3 +29,20 @@ class UserInDB(SQLModel):
 class UserPasswordUpdate(SQLModel):
     current_password: str
     new_password: str
+
+# Schema for opting in/out of anonymized spending insights
+class UserInsightsConsentUpdate(SQLModel):
+    share_anonymized_insights: bool
+
+# Schema for setting the user's time zone
+class UserTimezoneUpdate(SQLModel):
+    timezone: str # IANA name, e.g. "Asia/Jakarta"
+
+    @field_validator("timezone")
+    @classmethod
+    def check_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone '{value}'. Use an IANA name such as 'Europe/Berlin'.")
+        return value
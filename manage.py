@@ -1,3 +1,6 @@
+import asyncio
+import sys
+
 import uvicorn
 from core import create_app
 from core.config import settings
@@ -5,7 +8,68 @@ from core.config import settings
 # Create the FastAPI app instance using the factory function
 app = create_app()
 
+# --- Maintenance Commands ---
+# Run as `python manage.py <command>`; without a command the dev server is started.
+
+def rebuild_rollups_command() -> None:
+    """Regenerates the monthly_category_rollup, category_amount_sketch and category_spending_stats tables from raw transactions."""
+    from services.report_rollup_service import rebuild_monthly_rollups
+    written = asyncio.run(rebuild_monthly_rollups())
+    print(f"Rebuilt monthly_category_rollup: {written} rows (amount sketches and spending stats rebuilt as well).")
+
+def snapshot_reports_command() -> None:
+    """Runs the report snapshot job once (e.g. from an external cron in serverless mode)."""
+    from services.report_snapshot_service import precompute_report_snapshots
+    written = asyncio.run(precompute_report_snapshots())
+    print(f"Report snapshots written for {written} users.")
+
+def build_insights_command() -> None:
+    """
+    Recomputes anonymized spending insights. Optional YYYY-MM arguments give the first and
+    last month; by default the previous calendar month is computed.
+    """
+    from datetime import date
+    from dateutil.relativedelta import relativedelta
+    from services.insights_service import run_insights_pipeline
+    months = [date.fromisoformat(f"{arg}-01") for arg in sys.argv[2:4]]
+    if not months:
+        months = [date.today().replace(day=1) - relativedelta(months=1)]
+    start_date, last_month = months[0], months[-1]
+    end_date = last_month + relativedelta(months=1, days=-1)
+    run_insights_pipeline(start_date, end_date)
+
+def job_runs_command() -> None:
+    """Lists the most recent scheduled job runs; an optional argument filters by job id."""
+    from core.db import sync_session_scope, async_session_scope
+    from services.job_run_service import get_job_runs
+    job_id = sys.argv[2] if len(sys.argv) > 2 else None
+
+    async def load():
+        if settings.USE_ASYNC_DB:
+            async with async_session_scope() as session:
+                return await get_job_runs(session, job_id)
+        with sync_session_scope() as session:
+            return await get_job_runs(session, job_id)
+
+    for run in asyncio.run(load()):
+        duration = f"{(run.finished_at - run.started_at).total_seconds():.1f}s" if run.finished_at else "-"
+        print(f"{run.started_at:%Y-%m-%d %H:%M:%S}  {run.job_id:<35} {run.status.value:<9} {duration:>8}  rows={run.rows_created}  {run.error or ''}")
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups_command,
+    "snapshot-reports": snapshot_reports_command,
+    "build-insights": build_insights_command,
+    "job-runs": job_runs_command,
+}
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        command = COMMANDS.get(sys.argv[1])
+        if command is None:
+            sys.exit(f"Unknown command '{sys.argv[1]}'. Available: {', '.join(COMMANDS)}")
+        command()
+        sys.exit(0)
+
     # This block allows running the app directly using `python main.py`
     # Uvicorn is the ASGI server that runs FastAPI
     print(f"Starting Uvicorn server on http://0.0.0.0:8000 (Debug: {settings.DEBUG})")
@@ -31,6 +31,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
             "/openapi.json",
             "/auth/token", # Login endpoint
             "/auth/register", # Registration endpoint
+            "/health", # Health check (load balancers, orchestrators)
             "/" # Root path
         ]
 
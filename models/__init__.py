@@ -6,3 +6,12 @@ from models.user_model import User
 from models.budget_model import Budget
 from models.recurring_transaction_model import RecurringTransaction, RecurrenceFrequency
 from models.notification_model import Notification, NotificationType # Add Notification model and enum
+from models.monthly_category_rollup_model import MonthlyCategoryRollup
+from models.category_amount_sketch_model import CategoryAmountSketch
+from models.report_snapshot_model import ReportSnapshot
+from models.spending_insight_model import SpendingInsight
+from models.category_spending_stats_model import CategorySpendingStats
+from models.category_closure_model import CategoryClosure
+from models.scheduler_lease_model import SchedulerLease
+from models.job_run_model import JobRun, JobRunStatus
+from models.job_checkpoint_model import JobCheckpoint
@@ -0,0 +1,22 @@
+from typing import Dict
+
+from sqlalchemy import Column, JSON
+from sqlmodel import Field, SQLModel
+
+
+# --- Category Amount Sketch Model ---
+
+# Mergeable quantile sketch of transaction amounts per user, month and category.
+# Bins are logarithmic (see services/amount_sketch_service.py), stored sparsely as
+# {bin index: count}, so a row stays small no matter how many transactions it covers.
+# Maintained together with monthly_category_rollup on every transaction write.
+class CategoryAmountSketch(SQLModel, table=True):
+    __tablename__ = "category_amount_sketch"
+
+    owner_id: int = Field(foreign_key="user.id", primary_key=True)
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True) # 1-12
+    category_id: int = Field(foreign_key="category.id", primary_key=True)
+
+    count: int = Field(default=0) # Number of amounts in the sketch
+    bins: Dict[str, int] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
@@ -0,0 +1,19 @@
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+# --- Category Closure Model ---
+
+# Closure table of the category tree: one row per (ancestor, descendant) pair, including each
+# category with itself (distance 0). Reports join through it to roll a subtree up to any level
+# in one query (see services/category_tree_service.py), never walking the tree node by node.
+class CategoryClosure(SQLModel, table=True):
+    __tablename__ = "category_closure"
+    # Subtree lookups for one user's categories
+    __table_args__ = (Index("ix_category_closure_owner_ancestor", "owner_id", "ancestor_id"),)
+
+    ancestor_id: int = Field(foreign_key="category.id", primary_key=True)
+    descendant_id: int = Field(foreign_key="category.id", primary_key=True, index=True)
+    owner_id: int = Field(foreign_key="user.id")
+    distance: int = Field(default=0) # Levels between ancestor and descendant
+    ancestor_depth: int = Field(default=0) # Copy of the ancestor's Category.depth, for level roll-ups
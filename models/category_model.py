@@ -23,6 +23,9 @@ class Category(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True) # Name doesn't need to be globally unique, but unique per user
     type: CategoryType = Field(default=CategoryType.EXPENSE)
+    # Optional parent for hierarchical categories (see models/category_closure_model.py)
+    parent_id: Optional[int] = Field(default=None, foreign_key="category.id", index=True)
+    depth: int = Field(default=0) # 0 for top-level categories
 
     # Foreign Key to User table
     owner_id: int = Field(foreign_key="user.id", index=True)
@@ -0,0 +1,17 @@
+from sqlmodel import Field, SQLModel
+
+
+# --- Category Spending Stats Model ---
+
+# Running statistics of transaction amounts per user and category (Welford's algorithm:
+# count, mean and M2, the sum of squared deviations from the mean). Updated in O(1) on every
+# transaction write so anomaly checks never scan history (see services/anomaly_service.py).
+class CategorySpendingStats(SQLModel, table=True):
+    __tablename__ = "category_spending_stats"
+
+    owner_id: int = Field(foreign_key="user.id", primary_key=True)
+    category_id: int = Field(foreign_key="category.id", primary_key=True)
+
+    count: int = Field(default=0)
+    mean: float = Field(default=0.0)
+    m2: float = Field(default=0.0) # Variance = m2 / (count - 1)
@@ -0,0 +1,16 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+# --- Job Checkpoint Model ---
+
+# How far a job that works through time has got (see services/job_run_service.py), e.g. the
+# instant up to which recurring generation has handled local midnights. A run that starts late,
+# or after runs were skipped or coalesced, continues from here instead of from "now minus one
+# period", so nothing in between is missed.
+class JobCheckpoint(SQLModel, table=True):
+    __tablename__ = "job_checkpoint"
+
+    job_id: str = Field(primary_key=True)
+    position: datetime # UTC
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
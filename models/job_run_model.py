@@ -0,0 +1,38 @@
+from sqlalchemy import Column, JSON
+from sqlmodel import SQLModel, Field
+from typing import Any, Dict, Optional
+from datetime import datetime
+import enum
+
+
+class JobRunStatus(str, enum.Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+# --- Job Run Model ---
+
+# History of background job runs (see services/job_run_service.py): one row per run of a
+# scheduled or manually triggered job, for auditing, checking that missed runs were caught up
+# and reporting progress to whoever triggered a run.
+class JobRun(SQLModel, table=True):
+    __tablename__ = "job_run"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: str = Field(index=True) # Scheduler job id, e.g. "generate_recurring_transactions"
+    trigger: str = Field(default="scheduled") # What started the run
+    status: JobRunStatus = Field(default=JobRunStatus.RUNNING, index=True)
+    started_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    finished_at: Optional[datetime] = Field(default=None)
+    rows_created: Optional[int] = Field(default=None) # The job's return value, if it counts rows
+    error: Optional[str] = Field(default=None)
+    host: Optional[str] = Field(default=None) # Process that ran the job
+    parameters: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    requested_by: Optional[int] = Field(default=None, foreign_key="user.id") # For manual runs
+    # Progress of jobs that work in chunks
+    chunks_done: Optional[int] = Field(default=None)
+    chunk_count: Optional[int] = Field(default=None)
+    # Set while the run is in progress and cleared when it ends: a second run with the same key
+    # can't be started meanwhile (enforced by the unique constraint, across processes)
+    dedup_key: Optional[str] = Field(default=None, unique=True)
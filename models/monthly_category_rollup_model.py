@@ -0,0 +1,22 @@
+from sqlmodel import Field, SQLModel
+
+from .category_model import CategoryType # Use relative import
+
+
+# --- Monthly Category Rollup Model ---
+
+# Pre-aggregated transaction sums per user, month, category and type.
+# Maintained incrementally by the transaction write paths and the recurring
+# generation job (see services/report_rollup_service.py) so that reports over
+# whole months don't have to rescan raw transactions.
+class MonthlyCategoryRollup(SQLModel, table=True):
+    __tablename__ = "monthly_category_rollup"
+
+    owner_id: int = Field(foreign_key="user.id", primary_key=True)
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True) # 1-12
+    category_id: int = Field(foreign_key="category.id", primary_key=True)
+    type: CategoryType = Field(primary_key=True)
+
+    total_amount: float = Field(default=0.0) # SUM(transaction.amount)
+    transaction_count: int = Field(default=0) # COUNT(transaction.id)
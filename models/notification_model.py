@@ -11,6 +11,7 @@ class NotificationType(str, enum.Enum):
     BUDGET_EXCEEDED = "budget_exceeded"
     RECURRING_TX_GENERATED = "recurring_tx_generated"
     BILL_REMINDER = "bill_reminder"
+    SPENDING_ANOMALY = "spending_anomaly"
     INFO = "info" # General information
 
 class Notification(SQLModel, table=True):
@@ -1,4 +1,5 @@
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from datetime import date
 from enum import Enum
@@ -16,6 +17,9 @@ class RecurrenceFrequency(str, Enum):
     YEARLY = "yearly"
 
 class RecurringTransaction(SQLModel, table=True):
+    # The generation job's lookup: active rules whose next occurrence is due
+    __table_args__ = (Index("ix_recurringtransaction_active_next_due", "is_active", "next_due_date"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     description: str # Description for the recurring rule
     amount: float = Field(gt=0) # Amount for each occurrence
@@ -23,6 +27,8 @@ class RecurringTransaction(SQLModel, table=True):
     end_date: Optional[date] = Field(default=None, index=True) # Optional date the recurrence ends
     frequency: RecurrenceFrequency = Field(index=True) # How often it recurs
     last_created_date: Optional[date] = Field(default=None, index=True) # Tracks the date the last transaction was created
+    # Date of the next occurrence to generate; None once the rule has ended (or before it was first computed)
+    next_due_date: Optional[date] = Field(default=None)
 
     # Foreign Key to User table
     owner_id: int = Field(foreign_key="user.id", index=True)
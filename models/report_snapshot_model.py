@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import Column, JSON
+from sqlmodel import Field, SQLModel
+
+
+# --- Report Snapshot Model ---
+
+# Report responses precomputed by the nightly snapshot job (see services/report_snapshot_service.py).
+# A snapshot is only served while the owner's data_version still equals the one it was computed at.
+class ReportSnapshot(SQLModel, table=True):
+    __tablename__ = "report_snapshot"
+
+    owner_id: int = Field(foreign_key="user.id", primary_key=True)
+    kind: str = Field(primary_key=True) # Report endpoint, e.g. "monthly" or "yearly"
+    period: str = Field(primary_key=True) # e.g. "2024-03" or "2024"
+
+    data_version: int
+    payload: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    computed_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
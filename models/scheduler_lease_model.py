@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+
+# --- Scheduler Lease Model ---
+
+# Leader election for scheduled jobs (see core/leader.py). One row per election: the process
+# holding it runs the jobs and renews expires_at on every heartbeat; once it stops doing so,
+# another process takes the row over. On PostgreSQL an advisory lock decides instead and the
+# row only records who the leader is.
+class SchedulerLease(SQLModel, table=True):
+    __tablename__ = "scheduler_lease"
+
+    name: str = Field(primary_key=True) # Election name, e.g. "scheduler"
+    holder: str # "<hostname>:<pid>:<random suffix>" of the leader process
+    acquired_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    expires_at: datetime = Field(nullable=False)
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+from .category_model import CategoryType # Use relative import
+
+
+# --- Spending Insight Model ---
+
+# Cross-user, anonymized aggregates written by the insights pipeline
+# (services/insights_service.py). Contains no user ids: only groups with at least
+# INSIGHTS_MIN_COHORT_SIZE distinct opted-in users are stored.
+class SpendingInsight(SQLModel, table=True):
+    __tablename__ = "spending_insight"
+
+    category_name: str = Field(primary_key=True) # Normalized (trimmed, lower-case)
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True) # 1-12
+    cohort: str = Field(primary_key=True) # Monthly expense band of the users, e.g. "500-1000"
+    type: CategoryType = Field(primary_key=True)
+
+    user_count: int
+    transaction_count: int
+    total_amount: float
+    average_per_user: float
+    computed_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
@@ -1,6 +1,7 @@
 from datetime import date as dt_date, datetime
 from typing import Optional
 
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, Relationship, SQLModel
 
 # Import related models
@@ -18,6 +19,14 @@ if TYPE_CHECKING:
 # Note: We are keeping only the core DB model here.
 # Schemas (Base, Read, etc.) will be moved to DTOs.
 class Transaction(SQLModel, table=True):
+    # Serves per-user date range scans and the (date, id) ordering of running balance windows
+    __table_args__ = (
+        Index("ix_transaction_owner_date_id", "owner_id", "date", "id"),
+        # One transaction per occurrence of a recurring rule, however many generation runs overlap.
+        # Manual transactions have NULLs here, which never conflict.
+        UniqueConstraint("recurring_rule_id", "occurrence_date", name="uq_transaction_recurring_occurrence"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     amount: float = Field(gt=0) # Transaction amount (always positive)
     type: CategoryType = Field(index=True) # Transaction type, derived from category
@@ -38,5 +47,10 @@ class Transaction(SQLModel, table=True):
     # Relationship: Belongs to one User
     owner: "User" = Relationship(back_populates="transactions")
 
+    # Set for transactions generated from a recurring rule: the rule and the occurrence they
+    # were generated for (kept even if the transaction's own date is edited later)
+    recurring_rule_id: Optional[int] = Field(default=None, foreign_key="recurringtransaction.id", ondelete="SET NULL")
+    occurrence_date: Optional[dt_date] = Field(default=None)
+
 
 # Schemas (Base, Read, etc.) are now defined in dto/transaction_dto.py
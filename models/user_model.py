@@ -16,6 +16,12 @@ class User(SQLModel, table=True):
     email: str = Field(unique=True, index=True)
     hashed_password: str = Field()
     is_active: bool = Field(default=True)
+    # Bumped on every transaction/category write; report caches key on it (see services/data_version_service.py)
+    data_version: int = Field(default=0)
+    # Opt-in for inclusion in anonymized, aggregated spending insights (docs/revenue.md)
+    share_anonymized_insights: bool = Field(default=False)
+    # IANA time zone; recurring transactions are generated when the user's local day starts
+    timezone: str = Field(default="UTC", index=True)
 
     # Relationships: A user can have many categories and transactions
     categories: List["Category"] = Relationship(back_populates="owner")
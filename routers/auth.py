@@ -19,7 +19,7 @@ from core.security import (
 )
 from models import User
 # Import necessary DTOs including the new password update one
-from dto import UserCreate, UserRead, Token, UserPasswordUpdate
+from dto import UserCreate, UserRead, Token, UserPasswordUpdate, UserInsightsConsentUpdate, UserTimezoneUpdate
 # get_current_active_user is already imported via middlewares.auth above
 
 router = APIRouter()
@@ -206,3 +206,47 @@ async def update_user_password(
         session.commit() # type: ignore [union-attr]
 
     # No response body needed for 204
+
+# Endpoint to opt in/out of anonymized spending insights
+@router.put("/users/me/insights-consent", response_model=UserRead)
+async def update_insights_consent(
+    *,
+    session: DbSession = Depends(get_db_session),
+    consent: UserInsightsConsentUpdate,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Opt in to (or out of) having your transactions included in anonymized, aggregated
+    spending insights. Opting out takes effect from the next insights run.
+    """
+    current_user.share_anonymized_insights = consent.share_anonymized_insights
+    session.add(current_user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+        await session.refresh(current_user) # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+        session.refresh(current_user) # type: ignore [union-attr]
+    return current_user
+
+# Endpoint to set the user's time zone
+@router.put("/users/me/timezone", response_model=UserRead)
+async def update_timezone(
+    *,
+    session: DbSession = Depends(get_db_session),
+    timezone_in: UserTimezoneUpdate,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Sets the time zone (IANA name) recurring transactions are generated in: each day's
+    occurrences are created right after midnight local time, dated with the local date.
+    """
+    current_user.timezone = timezone_in.timezone
+    session.add(current_user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+        await session.refresh(current_user) # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+        session.refresh(current_user) # type: ignore [union-attr]
+    return current_user
@@ -1,13 +1,16 @@
 from typing import List, Optional, Union, Any # Added Union, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlmodel import Session, select, SQLModel # Import SQLModel
+import calendar
+from datetime import date
+from sqlmodel import Session, select, func, SQLModel # Import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
+from sqlalchemy import case
 
 # Import unified session dependency and settings
 from core.db import get_db_session
 from core.config import settings
-from models import Budget, User, Category # Import models
-from dto import BudgetCreate, BudgetRead # Import DTOs
+from models import Budget, User, Category, CategoryType, Transaction, MonthlyCategoryRollup, CategoryClosure # Import models
+from dto import BudgetCreate, BudgetRead, BudgetProgress # Import DTOs
 from middlewares.auth import get_current_active_user # Import dependency
 
 router = APIRouter()
@@ -106,6 +109,89 @@ async def read_budgets( # Changed to async def
         budgets = session.exec(statement).all() # type: ignore [union-attr]
     return budgets
 
+def _monthly_expense_by_category(user_id: int, year: int, month: int):
+    """Subquery of (category_id, spent) for one month: from the monthly rollup, or raw transactions if it's disabled."""
+    if settings.REPORTS_USE_ROLLUP:
+        return (
+            select(MonthlyCategoryRollup.category_id, func.sum(MonthlyCategoryRollup.total_amount).label("spent"))
+            .where(MonthlyCategoryRollup.owner_id == user_id)
+            .where(MonthlyCategoryRollup.year == year)
+            .where(MonthlyCategoryRollup.month == month)
+            .where(MonthlyCategoryRollup.type == CategoryType.EXPENSE)
+            .group_by(MonthlyCategoryRollup.category_id)
+            .subquery()
+        )
+    return (
+        select(Transaction.category_id, func.sum(Transaction.amount).label("spent"))
+        .where(Transaction.owner_id == user_id)
+        .where(Transaction.date >= date(year, month, 1))
+        .where(Transaction.date <= date(year, month, calendar.monthrange(year, month)[1]))
+        .where(Transaction.type == CategoryType.EXPENSE)
+        .group_by(Transaction.category_id)
+        .subquery()
+    )
+
+# Declared before /{budget_id} so "progress" isn't parsed as an id
+@router.get("/progress", response_model=List[BudgetProgress])
+async def read_budget_progress(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    year: int = Query(..., description="Year", ge=1900),
+    month: int = Query(..., description="Month (1-12)", ge=1, le=12),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Budget vs. actual for one month: every budget with its spent amount, remaining amount and
+    percent used. Category budgets compare against the expenses of that category and its
+    subcategories, the overall budget (no category) against all expenses. Computed with a single
+    joined aggregate query.
+    """
+    spent_by_category = _monthly_expense_by_category(current_user.id, year, month)
+    # Spend of each category's descendants, through the category closure table (distance > 0:
+    # the category's own spend comes from the direct join, even without a closure row)
+    descendants_spent = (
+        select(CategoryClosure.ancestor_id.label("category_id"), func.sum(spent_by_category.c.spent).label("spent"))
+        .join(spent_by_category, spent_by_category.c.category_id == CategoryClosure.descendant_id)
+        .where(CategoryClosure.owner_id == current_user.id)
+        .where(CategoryClosure.distance > 0)
+        .group_by(CategoryClosure.ancestor_id)
+        .subquery()
+    )
+    # correlate(None): sum over the whole subquery, not just the joined row
+    total_spent = select(func.sum(spent_by_category.c.spent)).correlate(None).scalar_subquery()
+    spent = func.coalesce(
+        case(
+            (Budget.category_id.is_(None), total_spent),
+            else_=func.coalesce(spent_by_category.c.spent, 0.0) + func.coalesce(descendants_spent.c.spent, 0.0),
+        ),
+        0.0,
+    )
+    statement = (
+        select(Budget, Category.name, spent)
+        .outerjoin(Category, Category.id == Budget.category_id)
+        .outerjoin(spent_by_category, spent_by_category.c.category_id == Budget.category_id)
+        .outerjoin(descendants_spent, descendants_spent.c.category_id == Budget.category_id)
+        .where(Budget.owner_id == current_user.id)
+        .where(Budget.year == year)
+        .where(Budget.month == month)
+        .order_by(Budget.category_id)
+    )
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+
+    return [
+        BudgetProgress(
+            **budget.model_dump(),
+            category_name=category_name,
+            spent=budget_spent,
+            remaining=budget.amount - budget_spent,
+            percent_used=budget_spent / budget.amount * 100,
+        )
+        for budget, category_name, budget_spent in rows
+    ]
+
 @router.get("/{budget_id}", response_model=BudgetRead)
 async def read_budget_by_id( # Changed to async def
     *,
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select, SQLModel # Import SQLModel for type hint
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
-from typing import List, Union, Any # For type hints
+from typing import List, Optional, Union, Any # For type hints
 
 # Import the unified session dependency and settings
 from core.db import get_db_session
@@ -9,12 +9,34 @@ from core.config import settings
 from models import Category, User # Import User model
 from dto import CategoryBase, CategoryRead # Import DTOs
 from middlewares.auth import get_current_active_user # Import dependency
+from services.data_version_service import bump_data_version
+from services.category_tree_service import attach_category, move_category, detach_category, has_children
+from services.anomaly_service import delete_category_stats
 
 router = APIRouter()
 
 # Type hint for the session dependency result
 DbSession = Union[Session, AsyncSession]
 
+async def _get_parent_category(
+    session: DbSession, parent_id: Optional[int], category_type: Any, current_user: User
+) -> Optional[Category]:
+    """Loads and validates a requested parent category (owned by the user, same type)."""
+    if parent_id is None:
+        return None
+    if settings.USE_ASYNC_DB:
+        parent = await session.get(Category, parent_id) # type: ignore [union-attr]
+    else:
+        parent = session.get(Category, parent_id) # type: ignore [union-attr]
+    if not parent or parent.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Parent category with id {parent_id} not found.")
+    if parent.type != category_type:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A subcategory must have the same type as its parent category."
+        )
+    return parent
+
 @router.post("/", response_model=CategoryRead, status_code=status.HTTP_201_CREATED)
 async def create_category( # Changed to async def
     *,
@@ -40,9 +62,18 @@ async def create_category( # Changed to async def
             detail=f"Category with name '{category_in.name}' already exists for this user."
         )
 
+    parent = await _get_parent_category(session, category_in.parent_id, category_in.type, current_user)
+
     # Create model instance, adding the owner_id
     db_category = Category.model_validate(category_in, update={"owner_id": current_user.id})
     session.add(db_category)
+    # Flush for the id, then add the category's closure rows
+    if settings.USE_ASYNC_DB:
+        await session.flush() # type: ignore [union-attr]
+    else:
+        session.flush() # type: ignore [union-attr]
+    await attach_category(session, db_category, parent)
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
 
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
@@ -129,12 +160,27 @@ async def update_category( # Changed to async def
                 detail=f"Category with name '{category_in.name}' already exists for this user."
             )
 
-    # Update model fields
+    # Update model fields (the parent goes through the category tree instead)
     category_data = category_in.model_dump(exclude_unset=True)
+    new_parent_id = category_data.pop("parent_id", db_category.parent_id)
+    if category_data.get("type", db_category.type) != db_category.type and await has_children(session, db_category):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The type of a category with subcategories cannot be changed."
+        )
     for key, value in category_data.items():
         setattr(db_category, key, value)
 
+    # Validated even if unchanged: a type change must still match the parent
+    new_parent = await _get_parent_category(session, new_parent_id, db_category.type, current_user)
+    if new_parent_id != db_category.parent_id:
+        try:
+            await move_category(session, db_category, new_parent)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
     session.add(db_category)
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
 
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
@@ -164,6 +210,16 @@ async def delete_category( # Changed to async def
     # Optional: Check if category is used by any transactions owned by this user before deleting
     # ... (add async/sync logic here if check is enabled) ...
 
+    # Subcategories have to be moved or deleted first
+    if await has_children(session, category):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Category has subcategories. Move or delete them first."
+        )
+    await detach_category(session, category)
+    await delete_category_stats(session, category.id) # Rows reference the category
+
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
     if settings.USE_ASYNC_DB:
         await session.delete(category) # type: ignore [union-attr]
         await session.commit() # type: ignore [union-attr]
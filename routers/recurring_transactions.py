@@ -1,7 +1,7 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List, Optional, Union, Any # Added Union, Any
-from fastapi import APIRouter, Depends, HTTPException, Query, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select, SQLModel # Import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
 from datetime import date # Import date
@@ -10,10 +10,12 @@ from datetime import date # Import date
 from core.db import get_db_session
 from core.config import settings
 from models import RecurringTransaction, User, Category # Import models
-from dto import RecurringTransactionCreate, RecurringTransactionRead # Import DTOs
+from dto import RecurringTransactionCreate, RecurringTransactionRead, JobRunRead # Import DTOs
 from middlewares.auth import get_current_active_user # Import dependency
 # Import the service function
-from services.recurring_transaction_service import generate_due_transactions # Keep sync for now
+from services.recurring_transaction_service import next_due_date_for, submit_generation_job, GENERATION_JOB_ID
+from services.job_run_service import get_job_run
+from services.data_version_service import bump_data_version
 
 router = APIRouter()
 
@@ -54,7 +56,9 @@ async def create_recurring_transaction( # Changed to async def
         recurring_tx_in,
         update={"owner_id": current_user.id}
     )
+    db_recurring_tx.next_due_date = next_due_date_for(db_recurring_tx) # Indexed for the generation job
     session.add(db_recurring_tx)
+    await bump_data_version(session, current_user.id) # Rules feed the cached forecast report
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
         await session.refresh(db_recurring_tx) # type: ignore [union-attr]
@@ -152,8 +156,13 @@ async def update_recurring_transaction( # Changed to async def
 
     # Reset last_created_date if start_date changes? Or handle in generation logic.
     # For now, we don't reset it here.
+    # Schedule, frequency or end date may have changed; an update that ends the rule deactivates it
+    db_recurring_tx.next_due_date = next_due_date_for(db_recurring_tx)
+    if db_recurring_tx.next_due_date is None:
+        db_recurring_tx.is_active = False
 
     session.add(db_recurring_tx)
+    await bump_data_version(session, current_user.id) # Rules feed the cached forecast report
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
         await session.refresh(db_recurring_tx) # type: ignore [union-attr]
@@ -181,6 +190,7 @@ async def delete_recurring_transaction( # Changed to async def
     if not recurring_tx or recurring_tx.owner_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurring transaction rule not found")
 
+    await bump_data_version(session, current_user.id) # Rules feed the cached forecast report
     if settings.USE_ASYNC_DB:
         await session.delete(recurring_tx) # type: ignore [union-attr]
         await session.commit() # type: ignore [union-attr]
@@ -191,16 +201,17 @@ async def delete_recurring_transaction( # Changed to async def
 
 # --- Manual Trigger Endpoint ---
 
-@router.post("/generate-due", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/generate-due", response_model=JobRunRead, status_code=status.HTTP_202_ACCEPTED)
 async def trigger_generate_due_transactions(
-    background_tasks: BackgroundTasks,
     run_date_str: Optional[str] = Query(None, description="Optional date (YYYY-MM-DD) to run generation for, defaults to today"),
     current_user: User = Depends(get_current_active_user) # Ensure only logged-in users can trigger
     # TODO: Add admin role check here in a real application
 ):
     """
     Manually triggers the generation of due recurring transactions.
-    Runs as a background task. Specify run_date to simulate running on a past/future date.
+    Runs as a background job off the request path; poll GET /recurring-transactions/jobs/{id}
+    for its progress and result. While a run for the same date is in progress, that run is
+    returned instead of starting another. Specify run_date to simulate running on a past/future date.
     """
     run_date = date.today()
     if run_date_str:
@@ -210,7 +221,24 @@ async def trigger_generate_due_transactions(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use YYYY-MM-DD.")
 
     print(f"Received request to generate recurring transactions for date: {run_date}")
-    # Run the generation logic in the background
-    background_tasks.add_task(generate_due_transactions, run_date=run_date)
+    job_run, created = await submit_generation_job(run_date, requested_by=current_user.id)
+    if not created:
+        print(f"Generation for {run_date} already in progress as job {job_run.id}.")
+    return JobRunRead.from_job_run(job_run)
 
-    return {"message": "Recurring transaction generation task accepted."}
+@router.get("/jobs/{job_run_id}", response_model=JobRunRead)
+async def read_generation_job(
+    *,
+    session: DbSession = Depends(get_db_session),
+    job_run_id: int,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    State of a recurring generation run: running/succeeded/failed, progress in chunks,
+    transactions created so far and duration. Only the user who triggered the run can read it;
+    scheduled runs and other users' runs are not found.
+    """
+    job_run = await get_job_run(session, job_run_id)
+    if not job_run or job_run.job_id != GENERATION_JOB_ID or job_run.requested_by != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JobRunRead.from_job_run(job_run)
@@ -7,94 +7,44 @@ from datetime import date # Import date
 from typing import List # Import List
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 import calendar
-from datetime import date
-from typing import List, Optional, Union, Any # Added Union, Any
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from typing import Annotated, List, Optional, Union, Any # Added Union, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select, func, SQLModel # Import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
-from sqlalchemy.sql.expression import literal_column
+from sqlalchemy import and_, case, extract, literal, or_
 
 # Import unified session dependency and settings
-from core.db import get_db_session
+from core.db import get_db_session, exec_concurrently
 from core.config import settings
-from models import Transaction, Category, CategoryType, User # Import User
+from models import Transaction, Category, CategoryType, User, MonthlyCategoryRollup, RecurringTransaction, CategoryAmountSketch # Import User
 # Import all report DTOs
-from dto.report_dto import MonthlyReport, YearlyReport, DateRangeReport, CategorySummary
+from dto.report_dto import MonthlyReport, YearlyReport, DateRangeReport, CategorySummary, TimeBucket, TimeSeriesPoint, TimeSeriesReport, ComparisonPeriod, CategoryComparison, ComparisonReport, CategoryShare, AnalyticsReport, ForecastMonth, ForecastReport, ReportRange, BatchReportRequest, BatchReportItem, BalancePoint, BalanceReport, LedgerEntry, LedgerReport, QuantileValue, HistogramBin, CategoryStatistics, StatisticsReport
 from middlewares.auth import get_current_active_user # Import dependency
+from core.cache import report_cache
+from services.data_version_service import get_data_version
+from services.amount_sketch_service import AmountSketch, RELATIVE_ACCURACY
+from services.report_snapshot_service import get_report_snapshot, monthly_period, yearly_period
+from services.report_service import (
+    build_monthly_report, build_yearly_report, fetch_category_rows, generate_report_data, merge_category_rows, summarize_category_rows,
+)
 
 router = APIRouter()
 
+# Upper bound on points returned by /timeseries (e.g. ~2.7 years of daily buckets)
+MAX_TIMESERIES_BUCKETS = 1000
+# Upper bound on periods accepted by /compare
+MAX_COMPARE_PERIODS = 12
+# Upper bound on ranges accepted by /batch
+MAX_BATCH_RANGES = 20
+
 # Type hint for the session dependency result
 DbSession = Union[Session, AsyncSession]
 
-# --- Helper Function for Report Generation ---
-
-async def _generate_report_data( # Changed to async def
-    session: DbSession, user_id: int, start_date: date, end_date: date
-) -> tuple[float, float, List[CategorySummary], List[CategorySummary]]:
-    """Helper to calculate totals and breakdowns for a given period and user."""
-
-    # Base statement filtered by user and date range
-    base_statement = (
-        select(Transaction)
-        .where(Transaction.owner_id == user_id)
-        .where(Transaction.date >= start_date)
-        .where(Transaction.date <= end_date)
-    )
-    if settings.USE_ASYNC_DB:
-        results = await session.exec(base_statement) # type: ignore [union-attr]
-        transactions = results.all()
-    else:
-        transactions = session.exec(base_statement).all() # type: ignore [union-attr]
-
-
-    total_income = sum(t.amount for t in transactions if t.type == CategoryType.INCOME)
-    total_expense = sum(t.amount for t in transactions if t.type == CategoryType.EXPENSE)
-
-    # Income breakdown query
-    income_summary_query = (
-        select(
-            Transaction.category_id,
-            Category.name.label("category_name"), # Explicit label
-            func.sum(Transaction.amount).label("total_amount")
-        )
-        .join(Category) # Join Transaction with Category
-        .where(Transaction.owner_id == user_id) # Filter by owner
-        .where(Transaction.date >= start_date)
-        .where(Transaction.date <= end_date)
-        .where(Transaction.type == CategoryType.INCOME)
-        .group_by(Transaction.category_id, Category.name) # Group by ID and name
-        .order_by(func.sum(Transaction.amount).desc())
-    )
-    if settings.USE_ASYNC_DB:
-        income_results = (await session.exec(income_summary_query)).mappings().all() # type: ignore [union-attr]
-    else:
-        income_results = session.exec(income_summary_query).mappings().all() # type: ignore [union-attr]
-    income_by_category = [CategorySummary(**row) for row in income_results]
-
-    # Expense breakdown query
-    expense_summary_query = (
-        select(
-            Transaction.category_id,
-            Category.name.label("category_name"), # Explicit label
-            func.sum(Transaction.amount).label("total_amount")
-        )
-        .join(Category)
-        .where(Transaction.owner_id == user_id) # Filter by owner
-        .where(Transaction.date >= start_date)
-        .where(Transaction.date <= end_date)
-        .where(Transaction.type == CategoryType.EXPENSE)
-        .group_by(Transaction.category_id, Category.name)
-        .order_by(func.sum(Transaction.amount).desc())
-    )
-    if settings.USE_ASYNC_DB:
-        expense_results = (await session.exec(expense_summary_query)).mappings().all() # type: ignore [union-attr]
-    else:
-        expense_results = session.exec(expense_summary_query).mappings().all() # type: ignore [union-attr]
-    expense_by_category = [CategorySummary(**row) for row in expense_results]
-
-    return total_income, total_expense, income_by_category, expense_by_category
-
+def _level_key(level: Optional[int]) -> List[str]:
+    """Extra cache key part for rolled-up reports (leaf-level keys stay unchanged)."""
+    return [] if level is None else [f"level{level}"]
 
 # --- Report Endpoints ---
 
@@ -104,6 +54,7 @@ async def get_monthly_report( # Changed to async def
     session: DbSession = Depends(get_db_session), # Use unified dependency
     year: int = Query(..., description="Year of the report (e.g., 2024)", ge=1900),
     month: int = Query(..., description="Month of the report (1-12)", ge=1, le=12),
+    level: Annotated[Optional[int], Query(ge=0, description="Roll subcategories up to this category tree depth (0 = top-level)")] = None,
     current_user: User = Depends(get_current_active_user)
 ):
     """Generates a financial report for a specific month and year."""
@@ -114,26 +65,30 @@ async def get_monthly_report( # Changed to async def
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid year or month")
 
-    # Call the async helper function
-    total_income, total_expense, income_by_category, expense_by_category = await _generate_report_data(
-        session, current_user.id, start_date, end_date
-    )
+    # Serve from the cache if nothing changed since the report was last computed
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(current_user.id, "monthly", start_date, end_date, *_level_key(level), version=data_version)
+    cached_report = await report_cache.get(cache_key, MonthlyReport)
+    if cached_report is not None:
+        return cached_report
 
-    return MonthlyReport(
-        year=year,
-        month=month,
-        total_income=total_income,
-        total_expense=total_expense,
-        net_balance=total_income - total_expense,
-        income_by_category=income_by_category,
-        expense_by_category=expense_by_category
-    )
+    # Precomputed by the nightly snapshot job (leaf categories only), if the data hasn't changed since
+    report = None
+    if level is None:
+        report = await get_report_snapshot(
+            session, current_user.id, "monthly", monthly_period(year, month), data_version, MonthlyReport
+        )
+    if report is None:
+        report = await build_monthly_report(session, current_user.id, year, month, level)
+    await report_cache.set(cache_key, report)
+    return report
 
 @router.get("/yearly", response_model=YearlyReport)
 async def get_yearly_report( # Changed to async def
     *,
     session: DbSession = Depends(get_db_session), # Use unified dependency
     year: int = Query(..., description="Year of the report (e.g., 2024)", ge=1900),
+    level: Annotated[Optional[int], Query(ge=0, description="Roll subcategories up to this category tree depth (0 = top-level)")] = None,
     current_user: User = Depends(get_current_active_user)
 ):
     """Generates a financial report for a specific year."""
@@ -144,46 +99,762 @@ async def get_yearly_report( # Changed to async def
          # This should ideally not happen with year validation, but good practice
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid year")
 
+    # Serve from the cache if nothing changed since the report was last computed
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(current_user.id, "yearly", start_date, end_date, *_level_key(level), version=data_version)
+    cached_report = await report_cache.get(cache_key, YearlyReport)
+    if cached_report is not None:
+        return cached_report
+
+    # Precomputed by the nightly snapshot job (leaf categories only), if the data hasn't changed since
+    report = None
+    if level is None:
+        report = await get_report_snapshot(
+            session, current_user.id, "yearly", yearly_period(year), data_version, YearlyReport
+        )
+    if report is None:
+        report = await build_yearly_report(session, current_user.id, year, level)
+    await report_cache.set(cache_key, report)
+    return report
+
+@router.get("/custom", response_model=DateRangeReport)
+async def get_custom_range_report( # Changed to async def
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    level: Annotated[Optional[int], Query(ge=0, description="Roll subcategories up to this category tree depth (0 = top-level)")] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Generates a financial report for a custom date range."""
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date cannot be after end date."
+        )
+
+    # Serve from the cache if nothing changed since the report was last computed
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(current_user.id, "custom", start_date, end_date, *_level_key(level), version=data_version)
+    cached_report = await report_cache.get(cache_key, DateRangeReport)
+    if cached_report is not None:
+        return cached_report
+
     # Call the async helper function
-    total_income, total_expense, income_by_category, expense_by_category = await _generate_report_data(
-        session, current_user.id, start_date, end_date
+    total_income, total_expense, income_by_category, expense_by_category = await generate_report_data(
+        session, current_user.id, start_date, end_date, level
     )
 
-    return YearlyReport(
-        year=year,
+    report = DateRangeReport(
+        start_date=start_date,
+        end_date=end_date,
         total_income=total_income,
         total_expense=total_expense,
         net_balance=total_income - total_expense,
         income_by_category=income_by_category,
         expense_by_category=expense_by_category
     )
+    await report_cache.set(cache_key, report)
+    return report
 
-@router.get("/custom", response_model=DateRangeReport)
-async def get_custom_range_report( # Changed to async def
+
+@router.post("/batch", response_model=List[BatchReportItem])
+async def get_batch_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    batch_in: BatchReportRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Generates reports for several date ranges at once (e.g. this month, last month, year-to-date),
+    in the order requested. Ranges not already cached are computed together in a single scan
+    with one conditional aggregate per range. Results share the cache with /custom.
+    """
+    if not 1 <= len(batch_in.ranges) <= MAX_BATCH_RANGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provide between 1 and {MAX_BATCH_RANGES} ranges."
+        )
+    for report_range in batch_in.ranges:
+        if report_range.start_date > report_range.end_date:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Start date cannot be after end date ({report_range.start_date} > {report_range.end_date})."
+            )
+
+    data_version = await get_data_version(session, current_user.id)
+    reports: dict[tuple[date, date], DateRangeReport] = {}
+    missing: List[tuple[date, date]] = []
+    for report_range in batch_in.ranges:
+        key = (report_range.start_date, report_range.end_date)
+        if key in reports or key in missing:
+            continue
+        cached_report = await report_cache.get(
+            report_cache.make_key(current_user.id, "custom", *key, version=data_version), DateRangeReport
+        )
+        if cached_report is not None:
+            reports[key] = cached_report
+        else:
+            missing.append(key)
+
+    if missing:
+        statement = _ranges_totals_statement(current_user.id, missing)
+        if settings.USE_ASYNC_DB:
+            rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+        else:
+            rows = session.exec(statement).all() # type: ignore [union-attr]
+        for range_index, (start_date, end_date) in enumerate(missing):
+            total_income, total_expense, income_by_category, expense_by_category = summarize_category_rows(
+                _range_category_rows(rows, range_index)
+            )
+            report = DateRangeReport(
+                start_date=start_date,
+                end_date=end_date,
+                total_income=total_income,
+                total_expense=total_expense,
+                net_balance=total_income - total_expense,
+                income_by_category=income_by_category,
+                expense_by_category=expense_by_category
+            )
+            await report_cache.set(report_cache.make_key(current_user.id, "custom", start_date, end_date, version=data_version), report)
+            reports[(start_date, end_date)] = report
+
+    return [
+        BatchReportItem(**reports[(report_range.start_date, report_range.end_date)].model_dump(), label=report_range.label)
+        for report_range in batch_in.ranges
+    ]
+
+# --- Time-Series Report ---
+
+def _bucket_start(day: date, bucket: TimeBucket) -> date:
+    """First day of the bucket containing `day`."""
+    if bucket == TimeBucket.DAY:
+        return day
+    if bucket == TimeBucket.WEEK:
+        return day - timedelta(days=day.weekday())
+    if bucket == TimeBucket.MONTH:
+        return day.replace(day=1)
+    return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1) # Quarter
+
+def _next_bucket_start(bucket_start: date, bucket: TimeBucket) -> date:
+    if bucket == TimeBucket.DAY:
+        return bucket_start + timedelta(days=1)
+    if bucket == TimeBucket.WEEK:
+        return bucket_start + timedelta(weeks=1)
+    months = 1 if bucket == TimeBucket.MONTH else 3
+    month_index = bucket_start.year * 12 + bucket_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def _timeseries_statement(user_id: int, start_date: date, end_date: date, bucket: TimeBucket, by_category: bool):
+    """
+    One grouped query for the whole range. Day/week buckets group by date, month/quarter buckets
+    by (year, month); both are portable across dialects and folded into buckets in Python.
+    """
+    if bucket in (TimeBucket.DAY, TimeBucket.WEEK):
+        period_columns = [Transaction.date, literal(1)] # Pad to the same row shape as (year, month)
+        group_columns = [Transaction.date]
+    else:
+        period_columns = [extract("year", Transaction.date), extract("month", Transaction.date)]
+        group_columns = list(period_columns)
+
+    income_amount = func.sum(case((Transaction.type == CategoryType.INCOME, Transaction.amount), else_=0.0))
+    expense_amount = func.sum(case((Transaction.type == CategoryType.EXPENSE, Transaction.amount), else_=0.0))
+    if by_category:
+        category_columns = [Transaction.category_id, Category.name]
+    else:
+        category_columns = [literal(None), literal(None)]
+
+    statement = (
+        select(*period_columns, *category_columns, income_amount, expense_amount)
+        .where(Transaction.owner_id == user_id)
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+    )
+    if by_category:
+        statement = statement.outerjoin(Category, Category.id == Transaction.category_id)
+        group_columns += [Transaction.category_id, Category.name]
+    return statement.group_by(*group_columns)
+
+def _build_timeseries_points(
+    rows: List[tuple], start_date: date, end_date: date, bucket: TimeBucket, by_category: bool
+) -> List[TimeSeriesPoint]:
+    """Folds grouped rows into gap-filled buckets covering [start_date, end_date]."""
+    # Gap filling: every bucket in the range exists, even without transactions
+    buckets: dict[date, list] = {}
+    bucket_start = _bucket_start(start_date, bucket)
+    while bucket_start <= end_date:
+        buckets[bucket_start] = []
+        bucket_start = _next_bucket_start(bucket_start, bucket)
+
+    for period_a, period_b, category_id, category_name, income_amount, expense_amount in rows:
+        day = period_a if bucket in (TimeBucket.DAY, TimeBucket.WEEK) else date(int(period_a), int(period_b), 1)
+        buckets[_bucket_start(day, bucket)].append((category_id, category_name, income_amount, expense_amount))
+
+    points = []
+    for bucket_start, bucket_rows in buckets.items():
+        total_income, total_expense, income_by_category, expense_by_category = summarize_category_rows(
+            merge_category_rows(bucket_rows)
+        )
+        points.append(TimeSeriesPoint(
+            period_start=max(bucket_start, start_date),
+            period_end=min(_next_bucket_start(bucket_start, bucket) - timedelta(days=1), end_date),
+            total_income=total_income,
+            total_expense=total_expense,
+            net_balance=total_income - total_expense,
+            income_by_category=income_by_category if by_category else None,
+            expense_by_category=expense_by_category if by_category else None,
+        ))
+    return points
+
+@router.get("/timeseries", response_model=TimeSeriesReport)
+async def get_timeseries_report(
     *,
     session: DbSession = Depends(get_db_session), # Use unified dependency
     start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    bucket: TimeBucket = Query(TimeBucket.MONTH, description="Bucket size: day, week, month or quarter"),
+    by_category: bool = Query(False, description="Include per-category breakdowns in every bucket"),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Generates a financial report for a custom date range."""
+    """
+    Generates income/expense totals bucketed by day/week/month/quarter over a date range,
+    computed with a single grouped query. Empty buckets are included with zero totals.
+    """
     if start_date > end_date:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Start date cannot be after end date."
         )
+    bucket_count = 0
+    bucket_start = _bucket_start(start_date, bucket)
+    while bucket_start <= end_date:
+        bucket_count += 1
+        if bucket_count > MAX_TIMESERIES_BUCKETS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Range too large for '{bucket.value}' buckets (max {MAX_TIMESERIES_BUCKETS}). Use a larger bucket."
+            )
+        bucket_start = _next_bucket_start(bucket_start, bucket)
 
-    # Call the async helper function
-    total_income, total_expense, income_by_category, expense_by_category = await _generate_report_data(
-        session, current_user.id, start_date, end_date
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(
+        current_user.id, "timeseries", start_date, end_date, bucket.value, int(by_category), version=data_version
     )
+    cached_report = await report_cache.get(cache_key, TimeSeriesReport)
+    if cached_report is not None:
+        return cached_report
+
+    statement = _timeseries_statement(current_user.id, start_date, end_date, bucket, by_category)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
 
-    return DateRangeReport(
+    report = TimeSeriesReport(
+        start_date=start_date,
+        end_date=end_date,
+        bucket=bucket,
+        points=_build_timeseries_points(rows, start_date, end_date, bucket, by_category)
+    )
+    await report_cache.set(cache_key, report)
+    return report
+
+
+# --- Period Comparison Report ---
+
+def _parse_period(value: str) -> tuple[date, date]:
+    """Parses 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD..YYYY-MM-DD' into an inclusive date range."""
+    try:
+        if ".." in value:
+            start_text, end_text = value.split("..", 1)
+            start_date, end_date = date.fromisoformat(start_text), date.fromisoformat(end_text)
+        elif len(value) == 7:
+            year, month = int(value[:4]), int(value[5:])
+            start_date = date(year, month, 1)
+            end_date = date(year, month, calendar.monthrange(year, month)[1])
+        elif len(value) == 4:
+            start_date, end_date = date(int(value), 1, 1), date(int(value), 12, 31)
+        else:
+            raise ValueError(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period '{value}'. Use YYYY, YYYY-MM or YYYY-MM-DD..YYYY-MM-DD."
+        )
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period '{value}': start date cannot be after end date."
+        )
+    return start_date, end_date
+
+def _ranges_totals_statement(user_id: int, ranges: List[tuple[date, date]]):
+    """
+    One aggregate pass over several date ranges: per (category, type), one SUM(CASE ...) column
+    per range. Ranges may overlap; each is summed independently.
+    """
+    range_sums = [
+        func.sum(case((and_(Transaction.date >= range_start, Transaction.date <= range_end), Transaction.amount), else_=0.0))
+        for range_start, range_end in ranges
+    ]
+    return (
+        select(Transaction.category_id, Category.name, Transaction.type, *range_sums)
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .where(Transaction.owner_id == user_id)
+        .where(or_(*[
+            and_(Transaction.date >= range_start, Transaction.date <= range_end)
+            for range_start, range_end in ranges
+        ]))
+        .group_by(Transaction.category_id, Category.name, Transaction.type)
+    )
+
+def _build_comparison_report(labels: List[str], ranges: List[tuple[date, date]], rows: List[tuple]) -> ComparisonReport:
+    """Turns (category_id, category_name, type, amount per range...) rows into totals, deltas and appeared/disappeared lists."""
+    periods = [
+        ComparisonPeriod(label=label, start_date=range_start, end_date=range_end)
+        for label, (range_start, range_end) in zip(labels, ranges)
+    ]
+    categories: List[CategoryComparison] = []
+    for category_id, category_name, tx_type, *range_amounts in rows:
+        amounts = [amount or 0.0 for amount in range_amounts]
+        for period, amount in zip(periods, amounts):
+            if tx_type == CategoryType.INCOME:
+                period.total_income += amount
+            else:
+                period.total_expense += amount
+        if category_name is None:
+            continue # Orphaned transactions count towards totals only
+        categories.append(CategoryComparison(
+            category_id=category_id,
+            category_name=category_name,
+            type=tx_type,
+            amounts=amounts,
+            deltas=[current - previous for previous, current in zip(amounts, amounts[1:])],
+            percent_changes=[
+                (current - previous) / previous * 100 if previous else None
+                for previous, current in zip(amounts, amounts[1:])
+            ],
+        ))
+    for period in periods:
+        period.net_balance = period.total_income - period.total_expense
+
+    # Largest movers first
+    categories.sort(key=lambda category: abs(category.amounts[-1] - category.amounts[0]), reverse=True)
+    return ComparisonReport(
+        periods=periods,
+        categories=categories,
+        appeared_categories=[
+            CategorySummary(category_id=c.category_id, category_name=c.category_name, total_amount=c.amounts[-1])
+            for c in categories if not c.amounts[0] and c.amounts[-1]
+        ],
+        disappeared_categories=[
+            CategorySummary(category_id=c.category_id, category_name=c.category_name, total_amount=c.amounts[0])
+            for c in categories if c.amounts[0] and not c.amounts[-1]
+        ],
+    )
+
+def _range_category_rows(rows: List[tuple], range_index: int) -> List[tuple]:
+    """
+    Picks one range out of _ranges_totals_statement rows, as
+    (category_id, category_name, income_amount, expense_amount) rows.
+    """
+    return merge_category_rows([
+        (category_id, category_name, amounts[range_index], 0.0) if tx_type == CategoryType.INCOME
+        else (category_id, category_name, 0.0, amounts[range_index])
+        for category_id, category_name, tx_type, *amounts in rows
+    ])
+
+@router.get("/compare", response_model=ComparisonReport)
+async def get_comparison_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    periods: List[str] = Query(
+        ..., alias="period",
+        description="Two or more periods, in order: YYYY, YYYY-MM or YYYY-MM-DD..YYYY-MM-DD (repeat the parameter)"
+    ),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Compares per-category totals across periods (e.g. month-over-month or year-over-year) in a
+    single aggregate query. Deltas are computed against the previous period in the list.
+    """
+    if not 2 <= len(periods) <= MAX_COMPARE_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provide between 2 and {MAX_COMPARE_PERIODS} periods to compare."
+        )
+    ranges = [_parse_period(period) for period in periods]
+
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(
+        current_user.id, "compare", *(f"{range_start}..{range_end}" for range_start, range_end in ranges), version=data_version
+    )
+    cached_report = await report_cache.get(cache_key, ComparisonReport)
+    if cached_report is not None:
+        return cached_report
+
+    statement = _ranges_totals_statement(current_user.id, ranges)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+
+    report = _build_comparison_report(periods, ranges, rows)
+    await report_cache.set(cache_key, report)
+    return report
+
+
+# --- Analytics Report ---
+
+@router.get("/analytics", response_model=AnalyticsReport)
+async def get_analytics_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    window: int = Query(7, ge=1, le=365, description="Rolling average window in days"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Category shares, weekday pattern and rolling daily expense average for a date range,
+    computed with vectorized operations on the user's cached NumPy snapshot.
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date cannot be after end date."
+        )
+    if (end_date - start_date).days + 1 > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range too large for the daily rolling average (max {MAX_TIMESERIES_BUCKETS} days)."
+        )
+
+    # Imported here: NumPy is only loaded by the endpoints that use it, not on every (cold) start
+    from services.analytics_service import get_snapshot
+
+    snapshot = await get_snapshot(session, current_user.id)
+    total_income, total_expense = snapshot.totals(start_date, end_date)
+
+    def shares(tx_type: CategoryType) -> List[CategoryShare]:
+        return [
+            CategoryShare(category_id=category_id, category_name=category_name, total_amount=amount, share=share)
+            for category_id, category_name, amount, share in snapshot.category_shares(start_date, end_date, tx_type)
+            if category_name is not None # Orphaned transactions count towards totals only
+        ]
+
+    return AnalyticsReport(
         start_date=start_date,
         end_date=end_date,
         total_income=total_income,
         total_expense=total_expense,
-        net_balance=total_income - total_expense,
-        income_by_category=income_by_category,
-        expense_by_category=expense_by_category
+        expense_shares=shares(CategoryType.EXPENSE),
+        income_shares=shares(CategoryType.INCOME),
+        weekday_expense=snapshot.weekday_totals(start_date, end_date, CategoryType.EXPENSE).tolist(),
+        rolling_window_days=window,
+        rolling_expense_average=snapshot.rolling_average(start_date, end_date, CategoryType.EXPENSE, window).tolist(),
+    )
+
+
+# --- Cash-Flow Forecast ---
+
+@router.get("/forecast", response_model=ForecastReport)
+async def get_forecast_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    months: int = Query(6, ge=1, le=24, description="Number of calendar months to project"),
+    history_months: int = Query(6, ge=1, le=24, description="Full months of history used for average spend"),
+    as_of: Optional[date] = Query(None, description="Forecast from the day after this date (default: today)"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Projects monthly income, expense and balance by expanding active recurring rules in memory
+    (nothing is written to the transaction table) and adding the historical monthly average of
+    categories that have no recurring rule. The first month starts the day after `as_of`; its
+    historical estimate is pro-rated by the remaining days.
+    """
+    as_of = as_of or date.today()
+    window_start = as_of + timedelta(days=1)
+    first_month = window_start.replace(day=1)
+    horizon_end = first_month + relativedelta(months=months) - timedelta(days=1)
+    history_start = first_month - relativedelta(months=history_months)
+    history_end = first_month - timedelta(days=1)
+
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(current_user.id, "forecast", as_of, months, history_months, version=data_version)
+    cached_report = await report_cache.get(cache_key, ForecastReport)
+    if cached_report is not None:
+        return cached_report
+
+    # Active rules with the type of their (owned) category; the generator skips rules without one too
+    rules_statement = (
+        select(
+            RecurringTransaction.start_date, RecurringTransaction.last_created_date, RecurringTransaction.end_date,
+            RecurringTransaction.frequency, RecurringTransaction.amount, RecurringTransaction.category_id, Category.type,
+        )
+        .join(Category, and_(Category.id == RecurringTransaction.category_id, Category.owner_id == RecurringTransaction.owner_id))
+        .where(RecurringTransaction.owner_id == current_user.id)
+        .where(RecurringTransaction.is_active == True)
+    )
+    balance_statement = (
+        select(
+            func.sum(case((Transaction.type == CategoryType.INCOME, Transaction.amount), else_=0.0)),
+            func.sum(case((Transaction.type == CategoryType.EXPENSE, Transaction.amount), else_=0.0)),
+        )
+        .where(Transaction.owner_id == current_user.id)
+        .where(Transaction.date <= as_of)
+    )
+    rules, balance_rows = await exec_concurrently(session, [rules_statement, balance_statement])
+    balance_income, balance_expense = balance_rows[0]
+    history_rows = await fetch_category_rows(session, current_user.id, history_start, history_end)
+
+    # Imported here: NumPy is only loaded by the endpoints that use it, not on every (cold) start
+    import numpy as np
+    from services.forecast_service import expand_occurrences, bucket_by_month
+
+    recurring_income = np.zeros(months)
+    recurring_expense = np.zeros(months)
+    recurring_category_ids = set()
+    for start_date, last_created_date, end_date, frequency, amount, category_id, category_type in rules:
+        recurring_category_ids.add(category_id)
+        occurrences = expand_occurrences(start_date, last_created_date, frequency, horizon_end, end_date)
+        # Overdue occurrences would be generated with past dates, outside the forecast window
+        occurrences = occurrences[occurrences >= np.datetime64(window_start, "D")]
+        monthly_amounts = bucket_by_month(occurrences, first_month, months) * amount
+        if category_type == CategoryType.INCOME:
+            recurring_income += monthly_amounts
+        else:
+            recurring_expense += monthly_amounts
+
+    # Categories covered by a recurring rule are projected from the rule only
+    average_income = sum(income or 0.0 for category_id, _, income, _ in history_rows if category_id not in recurring_category_ids) / history_months
+    average_expense = sum(expense or 0.0 for category_id, _, _, expense in history_rows if category_id not in recurring_category_ids) / history_months
+
+    balance = (balance_income or 0.0) - (balance_expense or 0.0)
+    report = ForecastReport(as_of=as_of, starting_balance=balance, history_months=history_months)
+    for index in range(months):
+        month_start = first_month + relativedelta(months=index)
+        month_end = month_start + relativedelta(months=1) - timedelta(days=1)
+        period_start = max(month_start, window_start)
+        covered = ((month_end - period_start).days + 1) / ((month_end - month_start).days + 1)
+        forecast_month = ForecastMonth(
+            year=month_start.year,
+            month=month_start.month,
+            period_start=period_start,
+            period_end=month_end,
+            recurring_income=float(recurring_income[index]),
+            recurring_expense=float(recurring_expense[index]),
+            estimated_income=average_income * covered,
+            estimated_expense=average_expense * covered,
+        )
+        forecast_month.total_income = forecast_month.recurring_income + forecast_month.estimated_income
+        forecast_month.total_expense = forecast_month.recurring_expense + forecast_month.estimated_expense
+        forecast_month.net_change = forecast_month.total_income - forecast_month.total_expense
+        balance += forecast_month.net_change
+        forecast_month.projected_balance = balance
+        report.months.append(forecast_month)
+
+    await report_cache.set(cache_key, report)
+    return report
+
+
+# --- Running Balance & Ledger ---
+
+def _signed_amount(amount_column, type_column):
+    """Income counts positive, expenses negative."""
+    return case((type_column == CategoryType.INCOME, amount_column), else_=-amount_column)
+
+async def _opening_balance(session: DbSession, user_id: int, before: date) -> float:
+    """
+    Balance of all transactions dated before `before`. The monthly rollup acts as a checkpoint
+    for every whole month before it, so only the current month's raw rows are scanned.
+    """
+    month_start = before.replace(day=1) if settings.REPORTS_USE_ROLLUP else date.min
+    statements = [
+        select(func.sum(_signed_amount(Transaction.amount, Transaction.type)))
+        .where(Transaction.owner_id == user_id)
+        .where(Transaction.date >= month_start)
+        .where(Transaction.date < before)
+    ]
+    if settings.REPORTS_USE_ROLLUP:
+        statements.append(
+            select(func.sum(_signed_amount(MonthlyCategoryRollup.total_amount, MonthlyCategoryRollup.type)))
+            .where(MonthlyCategoryRollup.owner_id == user_id)
+            .where(MonthlyCategoryRollup.year * 12 + MonthlyCategoryRollup.month < before.year * 12 + before.month)
+        )
+    return sum(rows[0] or 0.0 for rows in await exec_concurrently(session, statements))
+
+@router.get("/balance", response_model=BalanceReport)
+async def get_balance_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Daily running balance (all income minus all expenses) for every day with transactions in
+    the range, computed with a SUM() OVER (ORDER BY date) window on top of the daily totals.
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date cannot be after end date."
+        )
+
+    data_version = await get_data_version(session, current_user.id)
+    cache_key = report_cache.make_key(current_user.id, "balance", start_date, end_date, version=data_version)
+    cached_report = await report_cache.get(cache_key, BalanceReport)
+    if cached_report is not None:
+        return cached_report
+
+    signed_amount = _signed_amount(Transaction.amount, Transaction.type)
+    statement = (
+        select(
+            Transaction.date,
+            func.sum(case((Transaction.type == CategoryType.INCOME, Transaction.amount), else_=0.0)),
+            func.sum(case((Transaction.type == CategoryType.EXPENSE, Transaction.amount), else_=0.0)),
+            func.sum(func.sum(signed_amount)).over(order_by=Transaction.date),
+        )
+        .where(Transaction.owner_id == current_user.id)
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+        .group_by(Transaction.date)
+        .order_by(Transaction.date)
+    )
+    opening_balance = await _opening_balance(session, current_user.id, start_date)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+
+    points = [
+        BalancePoint(date=day, income=income, expense=expense, balance=opening_balance + running)
+        for day, income, expense, running in rows
+    ]
+    report = BalanceReport(
+        start_date=start_date,
+        end_date=end_date,
+        opening_balance=opening_balance,
+        closing_balance=points[-1].balance if points else opening_balance,
+        points=points
+    )
+    await report_cache.set(cache_key, report)
+    return report
+
+@router.get("/ledger", response_model=LedgerReport)
+async def get_ledger_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Transactions in the range ordered by (date, id), each with the running balance after it,
+    computed with a SUM() OVER (ORDER BY date, id) window. Pages keep the balances of the
+    full range since the window is evaluated before OFFSET/LIMIT.
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date cannot be after end date."
+        )
+
+    running = func.sum(_signed_amount(Transaction.amount, Transaction.type)).over(order_by=(Transaction.date, Transaction.id))
+    statement = (
+        select(
+            Transaction.id, Transaction.date, Transaction.type, Transaction.amount,
+            Transaction.category_id, Transaction.description, running,
+        )
+        .where(Transaction.owner_id == current_user.id)
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+        .order_by(Transaction.date, Transaction.id)
+        .offset(skip)
+        .limit(limit)
     )
+    opening_balance = await _opening_balance(session, current_user.id, start_date)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+
+    return LedgerReport(
+        start_date=start_date,
+        end_date=end_date,
+        opening_balance=opening_balance,
+        entries=[
+            LedgerEntry(
+                transaction_id=transaction_id, date=tx_date, type=tx_type, amount=amount,
+                category_id=category_id, description=description, balance=opening_balance + running_sum
+            )
+            for transaction_id, tx_date, tx_type, amount, category_id, description, running_sum in rows
+        ]
+    )
+
+
+# --- Amount Statistics ---
+
+@router.get("/statistics", response_model=StatisticsReport)
+async def get_statistics_report(
+    *,
+    session: DbSession = Depends(get_db_session), # Use unified dependency
+    year: int = Query(..., description="Year", ge=1900),
+    month: Optional[int] = Query(None, description="Month (1-12); whole year if omitted", ge=1, le=12),
+    category_id: Optional[int] = Query(None, description="Only this category"),
+    quantiles: List[float] = Query([0.5, 0.9], description="Quantiles to compute, 0-1 (repeat the parameter)"),
+    histogram_bins: int = Query(20, ge=1, le=100, description="Max histogram ranges per category"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Median, percentiles and histogram of transaction amounts per category, from the stored
+    monthly amount sketches (cost depends on sketch size, not on the number of transactions).
+    Quantile values are within `relative_accuracy` of the exact value.
+    """
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Quantiles must be between 0 and 1."
+        )
+
+    statement = (
+        select(CategoryAmountSketch.category_id, Category.name, Category.type, CategoryAmountSketch.bins)
+        .join(Category, Category.id == CategoryAmountSketch.category_id)
+        .where(CategoryAmountSketch.owner_id == current_user.id)
+        .where(CategoryAmountSketch.year == year)
+    )
+    if month is not None:
+        statement = statement.where(CategoryAmountSketch.month == month)
+    if category_id is not None:
+        statement = statement.where(CategoryAmountSketch.category_id == category_id)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+
+    # Merge the monthly sketches per category
+    merged: dict[int, tuple[str, CategoryType, AmountSketch]] = {}
+    for row_category_id, category_name, category_type, bins in rows:
+        _, _, sketch = merged.setdefault(row_category_id, (category_name, category_type, AmountSketch()))
+        sketch.merge(AmountSketch.from_stored(bins))
+
+    categories = [
+        CategoryStatistics(
+            category_id=row_category_id,
+            category_name=category_name,
+            type=category_type,
+            count=sketch.count,
+            quantiles=[QuantileValue(q=q, value=sketch.quantile(q)) for q in quantiles],
+            histogram=[
+                HistogramBin(lower=lower, upper=upper, count=count)
+                for lower, upper, count in sketch.histogram(histogram_bins)
+            ],
+        )
+        for row_category_id, (category_name, category_type, sketch) in merged.items()
+        if sketch.count > 0
+    ]
+    categories.sort(key=lambda category: category.count, reverse=True)
+    return StatisticsReport(year=year, month=month, relative_accuracy=RELATIVE_ACCURACY, categories=categories)
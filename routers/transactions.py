@@ -15,6 +15,9 @@ from core.config import settings
 from models import Transaction, Category, User # Import User model
 from dto import TransactionBase, TransactionRead, TransactionReadWithCategory # Import DTOs
 from middlewares.auth import get_current_active_user # Import dependency
+from services.report_rollup_service import RollupDelta, apply_rollup_delta
+from services.data_version_service import bump_data_version
+from services.anomaly_service import check_and_record_transaction, record_transaction_amount
 
 router = APIRouter()
 
@@ -48,8 +51,14 @@ async def create_transaction( # Changed to async def
         owner_id=current_user.id # Set owner_id
     )
 
-    # 3. Add, commit, refresh
+    # 3. Add, update the monthly rollup in the same DB transaction, commit, refresh
     session.add(db_transaction)
+    rollup_delta = RollupDelta()
+    rollup_delta.add_transaction(db_transaction)
+    await apply_rollup_delta(session, rollup_delta)
+    # Compare with the category's running statistics (may add a SPENDING_ANOMALY notification)
+    await check_and_record_transaction(session, db_transaction, category.name)
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
         await session.refresh(db_transaction) # type: ignore [union-attr]
@@ -144,6 +153,19 @@ async def update_transaction( # Changed to async def
             detail=f"Category with id {transaction_in.category_id} not found or not owned by user."
         )
 
+    # Take the old values out of the monthly rollup before changing them
+    rollup_delta = RollupDelta()
+    rollup_delta.add_transaction(db_transaction, sign=-1)
+    # Only a new amount, category or type is checked for anomalies again (and moved in the
+    # spending statistics); editing e.g. the description must not flag the expense a second time
+    recheck_anomaly = (
+        transaction_in.amount != db_transaction.amount
+        or transaction_in.category_id != db_transaction.category_id
+        or new_category.type != db_transaction.type
+    )
+    if recheck_anomaly:
+        await record_transaction_amount(session, db_transaction, sign=-1)
+
     # Update model fields from the input DTO
     transaction_data = transaction_in.model_dump(exclude_unset=True)
     for key, value in transaction_data.items():
@@ -153,6 +175,11 @@ async def update_transaction( # Changed to async def
     db_transaction.type = new_category.type
 
     session.add(db_transaction)
+    rollup_delta.add_transaction(db_transaction)
+    await apply_rollup_delta(session, rollup_delta)
+    if recheck_anomaly:
+        await check_and_record_transaction(session, db_transaction, new_category.name)
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
     if settings.USE_ASYNC_DB:
         await session.commit() # type: ignore [union-attr]
         await session.refresh(db_transaction) # type: ignore [union-attr]
@@ -179,6 +206,11 @@ async def delete_transaction( # Changed to async def
     if not transaction or transaction.owner_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transaction not found")
 
+    rollup_delta = RollupDelta()
+    rollup_delta.add_transaction(transaction, sign=-1)
+    await apply_rollup_delta(session, rollup_delta)
+    await record_transaction_amount(session, transaction, sign=-1)
+    await bump_data_version(session, current_user.id) # Invalidates cached reports
     if settings.USE_ASYNC_DB:
         await session.delete(transaction) # type: ignore [union-attr]
         await session.commit() # type: ignore [union-attr]
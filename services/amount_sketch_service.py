@@ -0,0 +1,220 @@
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Transaction, CategoryAmountSketch
+from core.config import settings
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# (owner_id, year, month, category_id)
+SketchKey = tuple[int, int, int, int]
+
+# Keys per IN (...) lookup, well below bind parameter limits
+_KEY_BATCH_SIZE = 250
+
+# --- Amount Sketches ---
+# Quantiles use logarithmic bins in the style of DDSketch: bin i covers (gamma^(i-1), gamma^i]
+# and is represented by a value within RELATIVE_ACCURACY of everything in it. Unlike t-digest
+# or KLL, bin counts can be decremented exactly, so transaction updates and deletes keep the
+# sketch identical to one built from scratch. Sketches merge by adding bin counts.
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class AmountSketch:
+    """Sparse log-binned sketch of positive amounts."""
+
+    def __init__(self, bins: Optional[Dict[int, int]] = None) -> None:
+        self.bins: Dict[int, int] = dict(bins or {})
+
+    @staticmethod
+    def bin_index(amount: float) -> int:
+        return math.ceil(math.log(amount) / _LOG_GAMMA)
+
+    @staticmethod
+    def bin_value(index: int) -> float:
+        """Representative value of a bin (relative error <= RELATIVE_ACCURACY for its members)."""
+        return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+    @staticmethod
+    def bin_bounds(index: int) -> tuple[float, float]:
+        return _GAMMA ** (index - 1), _GAMMA ** index
+
+    @classmethod
+    def from_stored(cls, bins: Dict[str, int]) -> "AmountSketch":
+        return cls({int(index): count for index, count in bins.items()})
+
+    def to_stored(self) -> Dict[str, int]:
+        return {str(index): count for index, count in sorted(self.bins.items())}
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def add(self, amount: float, count: int = 1) -> None:
+        """Adds `count` occurrences of amount (negative count removes them)."""
+        index = self.bin_index(amount)
+        new_count = self.bins.get(index, 0) + count
+        if new_count:
+            self.bins[index] = new_count
+        else:
+            del self.bins[index]
+
+    def merge(self, other: "AmountSketch") -> None:
+        for index, count in other.bins.items():
+            new_count = self.bins.get(index, 0) + count
+            if new_count:
+                self.bins[index] = new_count
+            else:
+                self.bins.pop(index, None)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (lower rank, 0 <= q <= 1); None for an empty sketch."""
+        total = self.count
+        if total <= 0:
+            return None
+        rank = math.floor(q * (total - 1))
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self.bin_value(index)
+        return self.bin_value(max(self.bins))
+
+    def histogram(self, max_bins: int) -> List[tuple[float, float, int]]:
+        """(lower, upper, count) ranges covering the sketch, coarsened to at most max_bins ranges."""
+        if not self.bins:
+            return []
+        first, last = min(self.bins), max(self.bins)
+        width = max(1, math.ceil((last - first + 1) / max_bins))
+        coarse: Dict[int, int] = defaultdict(int)
+        for index, count in self.bins.items():
+            coarse[(index - first) // width] += count
+        return [
+            (self.bin_bounds(first + slot * width)[0], self.bin_bounds(first + slot * width + width - 1)[1], count)
+            for slot, count in sorted(coarse.items())
+        ]
+
+
+class SketchDelta:
+    """Amounts added (+count) or removed (-count) per sketch key in one unit of work."""
+
+    def __init__(self) -> None:
+        self.changes: dict[SketchKey, AmountSketch] = defaultdict(AmountSketch)
+
+    def add(self, key: SketchKey, amount: float, count: int) -> None:
+        self.changes[key].add(amount, count)
+
+
+def _insert_missing_statement(dialect_name: str) -> Optional[Any]:
+    """INSERT that skips rows which already exist, if the dialect supports it."""
+    table = CategoryAmountSketch.__table__
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+        return dialect_insert(table).on_conflict_do_nothing(index_elements=[c.name for c in table.primary_key.columns])
+    if dialect_name in ("mysql", "mariadb"):
+        return mysql.insert(table).prefix_with("IGNORE")
+    return None
+
+
+async def apply_sketch_delta(session: DbSession, delta: SketchDelta) -> None:
+    """
+    Merges accumulated amount changes into category_amount_sketch within the caller's
+    transaction (read-modify-write, rows locked FOR UPDATE where the DB supports it).
+    Does not commit.
+    """
+    changes = {key: sketch for key, sketch in delta.changes.items() if sketch.bins}
+    if not changes:
+        return
+    keys = list(changes)
+    # FOR UPDATE cannot lock a row that does not exist yet, so concurrent first writes to a key
+    # would both insert it. Create missing rows empty first; the lock below then serializes them.
+    insert_missing = _insert_missing_statement(session.bind.dialect.name if session.bind is not None else "")
+    if insert_missing is not None:
+        empty_rows = [
+            {"owner_id": owner_id, "year": year, "month": month, "category_id": category_id, "count": 0, "bins": {}}
+            for owner_id, year, month, category_id in keys
+        ]
+        if settings.USE_ASYNC_DB:
+            await session.execute(insert_missing, empty_rows) # type: ignore [union-attr]
+        else:
+            session.execute(insert_missing, empty_rows) # type: ignore [union-attr]
+
+    # Existing rows, looked up in batches of keys (bulk writes such as recurring generation touch many)
+    rows: dict[SketchKey, CategoryAmountSketch] = {}
+    for start in range(0, len(keys), _KEY_BATCH_SIZE):
+        statement = (
+            select(CategoryAmountSketch)
+            .where(tuple_(
+                CategoryAmountSketch.owner_id, CategoryAmountSketch.year, CategoryAmountSketch.month, CategoryAmountSketch.category_id,
+            ).in_(keys[start:start + _KEY_BATCH_SIZE]))
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        if settings.USE_ASYNC_DB:
+            existing = (await session.exec(statement)).all() # type: ignore [union-attr]
+        else:
+            existing = session.exec(statement).all() # type: ignore [union-attr]
+        rows.update(((row.owner_id, row.year, row.month, row.category_id), row) for row in existing)
+
+    for key, change in changes.items():
+        row = rows.get(key)
+        if row is None: # Only without insert-or-ignore support
+            owner_id, year, month, category_id = key
+            row = CategoryAmountSketch(owner_id=owner_id, year=year, month=month, category_id=category_id)
+        sketch = AmountSketch.from_stored(row.bins)
+        sketch.merge(change)
+        if sketch.count <= 0:
+            if key in rows:
+                if settings.USE_ASYNC_DB:
+                    await session.delete(row) # type: ignore [union-attr]
+                else:
+                    session.delete(row) # type: ignore [union-attr]
+            continue
+        row.bins = sketch.to_stored() # Reassign so the JSON column is flagged as changed
+        row.count = sketch.count
+        session.add(row)
+
+
+async def rebuild_amount_sketches(session: DbSession, owner_id: Optional[int] = None) -> int:
+    """
+    Regenerates category_amount_sketch from raw transactions (for all users, or one owner).
+    Uses the given session without committing. Returns the number of sketch rows written.
+    """
+    clear = delete(CategoryAmountSketch)
+    amounts = select(Transaction.owner_id, Transaction.date, Transaction.category_id, Transaction.amount)
+    if owner_id is not None:
+        clear = clear.where(CategoryAmountSketch.owner_id == owner_id)
+        amounts = amounts.where(Transaction.owner_id == owner_id)
+
+    if settings.USE_ASYNC_DB:
+        await session.execute(clear) # type: ignore [union-attr]
+        rows: Iterable = (await session.exec(amounts)).all() # type: ignore [union-attr]
+    else:
+        session.execute(clear) # type: ignore [union-attr]
+        rows = session.exec(amounts).all() # type: ignore [union-attr]
+
+    sketches: dict[SketchKey, AmountSketch] = defaultdict(AmountSketch)
+    for tx_owner_id, tx_date, category_id, amount in rows:
+        sketches[(tx_owner_id, tx_date.year, tx_date.month, category_id)].add(amount)
+    session.add_all(
+        CategoryAmountSketch(
+            owner_id=key[0], year=key[1], month=key[2], category_id=key[3],
+            count=sketch.count, bins=sketch.to_stored(),
+        )
+        for key, sketch in sketches.items()
+    )
+    if settings.USE_ASYNC_DB:
+        await session.flush() # type: ignore [union-attr]
+    else:
+        session.flush() # type: ignore [union-attr]
+    return len(sketches)
@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional, Union
+
+import numpy as np
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Transaction, Category, CategoryType
+from core.config import settings
+from services.data_version_service import get_data_version
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# --- Columnar Analytics Snapshot ---
+# A user's transactions are loaded once into parallel NumPy arrays sorted by date.
+# Date ranges become a pair of binary searches (searchsorted) and aggregations are
+# bincount/cumsum over the slice, so analytics never materialize ORM objects.
+# Snapshots are cached per user and tagged with the user's data_version; a write bumps
+# the version and the next lookup reloads the snapshot.
+
+
+class TransactionSnapshot:
+    """Immutable columnar view of one user's transactions, sorted by date."""
+
+    def __init__(
+        self,
+        version: int,
+        days: np.ndarray,
+        amounts: np.ndarray,
+        category_ids: np.ndarray,
+        is_income: np.ndarray,
+        category_names: dict[int, str],
+    ) -> None:
+        self.version = version
+        self.days = days # date.toordinal(), int32
+        self.amounts = amounts # float64
+        self.category_ids = category_ids # int32
+        self.is_income = is_income # bool
+        self.category_names = category_names
+
+    @classmethod
+    def from_rows(cls, version: int, rows: List[tuple], category_names: dict[int, str]) -> "TransactionSnapshot":
+        """Builds a snapshot from (date, amount, category_id, type) rows already ordered by date."""
+        count = len(rows)
+        return cls(
+            version=version,
+            days=np.fromiter((row[0].toordinal() for row in rows), dtype=np.int32, count=count),
+            amounts=np.fromiter((row[1] for row in rows), dtype=np.float64, count=count),
+            category_ids=np.fromiter((row[2] for row in rows), dtype=np.int32, count=count),
+            is_income=np.fromiter((row[3] == CategoryType.INCOME for row in rows), dtype=bool, count=count),
+            category_names=category_names,
+        )
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _range(self, start_date: date, end_date: date) -> slice:
+        """Index slice of the transactions dated within [start_date, end_date]."""
+        first = np.searchsorted(self.days, start_date.toordinal(), side="left")
+        last = np.searchsorted(self.days, end_date.toordinal(), side="right")
+        return slice(first, last)
+
+    def _type_mask(self, period: slice, tx_type: CategoryType) -> np.ndarray:
+        return self.is_income[period] if tx_type == CategoryType.INCOME else ~self.is_income[period]
+
+    def totals(self, start_date: date, end_date: date) -> tuple[float, float]:
+        """(total_income, total_expense) for the range."""
+        period = self._range(start_date, end_date)
+        amounts, is_income = self.amounts[period], self.is_income[period]
+        income = float(amounts[is_income].sum())
+        return income, float(amounts.sum()) - income
+
+    def category_rows(self, start_date: date, end_date: date) -> List[tuple]:
+        """
+        (category_id, category_name, income_amount, expense_amount) rows for the range, the
+        same shape the report helpers fold into totals and breakdowns.
+        """
+        period = self._range(start_date, end_date)
+        if period.start == period.stop:
+            return []
+        category_ids, slots = np.unique(self.category_ids[period], return_inverse=True)
+        amounts, is_income = self.amounts[period], self.is_income[period]
+        income = np.bincount(slots, weights=np.where(is_income, amounts, 0.0), minlength=len(category_ids))
+        expense = np.bincount(slots, weights=np.where(is_income, 0.0, amounts), minlength=len(category_ids))
+        return [
+            (int(category_id), self.category_names.get(int(category_id)), float(income_amount), float(expense_amount))
+            for category_id, income_amount, expense_amount in zip(category_ids, income, expense)
+        ]
+
+    def category_shares(self, start_date: date, end_date: date, tx_type: CategoryType) -> List[tuple[int, Optional[str], float, float]]:
+        """(category_id, category_name, amount, share of the type's total) for the range, largest first."""
+        period = self._range(start_date, end_date)
+        mask = self._type_mask(period, tx_type)
+        category_ids, slots = np.unique(self.category_ids[period][mask], return_inverse=True)
+        sums = np.bincount(slots, weights=self.amounts[period][mask], minlength=len(category_ids))
+        total = sums.sum()
+        order = np.argsort(-sums, kind="stable")
+        return [
+            (int(category_ids[i]), self.category_names.get(int(category_ids[i])), float(sums[i]), float(sums[i] / total) if total else 0.0)
+            for i in order
+        ]
+
+    def daily_totals(self, start_date: date, end_date: date, tx_type: CategoryType) -> np.ndarray:
+        """One sum per calendar day in the range (zeros for days without transactions)."""
+        period = self._range(start_date, end_date)
+        mask = self._type_mask(period, tx_type)
+        offsets = self.days[period][mask] - start_date.toordinal()
+        day_count = end_date.toordinal() - start_date.toordinal() + 1
+        return np.bincount(offsets, weights=self.amounts[period][mask], minlength=day_count)
+
+    def rolling_average(self, start_date: date, end_date: date, tx_type: CategoryType, window: int) -> np.ndarray:
+        """
+        Trailing `window`-day average of daily totals for every day in the range. Days before
+        start_date are included in the window, so the first values aren't biased towards zero.
+        """
+        warmup_start = date.fromordinal(start_date.toordinal() - (window - 1))
+        cumulative = np.concatenate(([0.0], np.cumsum(self.daily_totals(warmup_start, end_date, tx_type))))
+        return (cumulative[window:] - cumulative[:-window]) / window
+
+    def weekday_totals(self, start_date: date, end_date: date, tx_type: CategoryType) -> np.ndarray:
+        """Sums per weekday, Monday first."""
+        period = self._range(start_date, end_date)
+        mask = self._type_mask(period, tx_type)
+        # Ordinal 1 (0001-01-01) is a Monday
+        weekdays = (self.days[period][mask] - 1) % 7
+        return np.bincount(weekdays, weights=self.amounts[period][mask], minlength=7)
+
+
+class SnapshotCache:
+    """In-process LRU of TransactionSnapshot per user, validated against data_version on every lookup."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, TransactionSnapshot] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int) -> Optional[TransactionSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get(user_id)
+            if snapshot is None or snapshot.version != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def set(self, user_id: int, snapshot: TransactionSnapshot) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = snapshot
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+snapshot_cache = SnapshotCache(max_entries=settings.ANALYTICS_SNAPSHOT_CACHE_SIZE)
+
+
+async def load_snapshot(session: DbSession, user_id: int, version: int) -> TransactionSnapshot:
+    """Reads a user's transactions (four columns only) and category names into a new snapshot."""
+    transactions = (
+        select(Transaction.date, Transaction.amount, Transaction.category_id, Transaction.type)
+        .where(Transaction.owner_id == user_id)
+        .order_by(Transaction.date)
+    )
+    categories = select(Category.id, Category.name).where(Category.owner_id == user_id)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(transactions)).all() # type: ignore [union-attr]
+        category_rows = (await session.exec(categories)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(transactions).all() # type: ignore [union-attr]
+        category_rows = session.exec(categories).all() # type: ignore [union-attr]
+    return TransactionSnapshot.from_rows(version, rows, dict(category_rows))
+
+async def get_snapshot(session: DbSession, user_id: int) -> TransactionSnapshot:
+    """Returns the user's cached snapshot, reloading it if the user's data_version has moved on."""
+    version = await get_data_version(session, user_id)
+    snapshot = snapshot_cache.get(user_id, version)
+    if snapshot is None:
+        snapshot = await load_snapshot(session, user_id, version)
+        snapshot_cache.set(user_id, snapshot)
+    return snapshot
@@ -0,0 +1,234 @@
+import math
+from typing import Any, List, Optional, Union
+
+from sqlalchemy import delete, func, inspect, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Transaction, CategorySpendingStats, CategoryType, Notification, NotificationType
+from core.config import settings
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# (owner_id, category_id) pairs per IN (...) lookup, well below bind parameter limits
+_KEY_BATCH_SIZE = 500
+
+# --- Spending Anomaly Detection ---
+# Each (user, category) keeps Welford running statistics of its transaction amounts.
+# A new expense is compared with the statistics *before* it is added: if it lies more than
+# ANOMALY_Z_THRESHOLD standard deviations above the mean (and the category has at least
+# ANOMALY_MIN_SAMPLES transactions), a SPENDING_ANOMALY notification is created.
+# Removing a value is the exact inverse of adding it, so updates and deletes keep the
+# statistics equal to ones computed from scratch (up to float rounding).
+
+
+def welford_add(stats: CategorySpendingStats, amount: float) -> None:
+    stats.count += 1
+    delta = amount - stats.mean
+    stats.mean += delta / stats.count
+    stats.m2 += delta * (amount - stats.mean)
+
+def welford_remove(stats: CategorySpendingStats, amount: float) -> None:
+    if stats.count <= 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    delta = amount - stats.mean
+    stats.count -= 1
+    stats.mean -= delta / stats.count
+    stats.m2 = max(0.0, stats.m2 - delta * (amount - stats.mean))
+
+def welford_merge(stats: CategorySpendingStats, count: int, mean: float, m2: float) -> None:
+    """Adds a whole batch, given as its own count/mean/M2 (Chan et al.'s parallel combination)."""
+    total = stats.count + count
+    if total <= 0:
+        return
+    delta = mean - stats.mean
+    stats.m2 += m2 + delta * delta * stats.count * count / total
+    stats.mean += delta * count / total
+    stats.count = total
+
+def standard_deviation(stats: CategorySpendingStats) -> float:
+    """Sample standard deviation; 0 with fewer than two values."""
+    return math.sqrt(stats.m2 / (stats.count - 1)) if stats.count > 1 else 0.0
+
+def z_score(stats: CategorySpendingStats, amount: float) -> Optional[float]:
+    """How unusual `amount` is for the category; None while there isn't enough history."""
+    std = standard_deviation(stats)
+    if stats.count < settings.ANOMALY_MIN_SAMPLES or std == 0:
+        return None
+    return (amount - stats.mean) / std
+
+
+def _insert_missing_statement(dialect_name: str) -> Optional[Any]:
+    """INSERT that skips rows which already exist, if the dialect supports it."""
+    table = CategorySpendingStats.__table__
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+        return dialect_insert(table).on_conflict_do_nothing(index_elements=[c.name for c in table.primary_key.columns])
+    if dialect_name in ("mysql", "mariadb"):
+        return mysql.insert(table).prefix_with("IGNORE")
+    return None
+
+async def _insert_missing(session: DbSession, keys: List[tuple[int, int]]) -> None:
+    """
+    Creates empty statistics rows for the (owner_id, category_id) keys that have none yet.
+    FOR UPDATE cannot lock a missing row, so concurrent first writes to a category would both
+    insert it; with the row in place, the locking read serializes them.
+    """
+    insert_missing = _insert_missing_statement(session.bind.dialect.name if session.bind is not None else "")
+    if insert_missing is None or not keys:
+        return
+    rows = [{"owner_id": owner_id, "category_id": category_id, "count": 0, "mean": 0.0, "m2": 0.0} for owner_id, category_id in keys]
+    if settings.USE_ASYNC_DB:
+        await session.execute(insert_missing, rows) # type: ignore [union-attr]
+    else:
+        session.execute(insert_missing, rows) # type: ignore [union-attr]
+
+async def _get_stats(session: DbSession, owner_id: int, category_id: int) -> CategorySpendingStats:
+    """The category's statistics row, locked FOR UPDATE where supported (created empty if missing)."""
+    await _insert_missing(session, [(owner_id, category_id)])
+    statement = (
+        select(CategorySpendingStats)
+        .where(CategorySpendingStats.owner_id == owner_id)
+        .where(CategorySpendingStats.category_id == category_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    if settings.USE_ASYNC_DB:
+        stats = (await session.exec(statement)).first() # type: ignore [union-attr]
+    else:
+        stats = session.exec(statement).first() # type: ignore [union-attr]
+    # New, unsaved row only without insert-or-ignore support
+    return stats or CategorySpendingStats(owner_id=owner_id, category_id=category_id)
+
+async def _save_stats(session: DbSession, stats: CategorySpendingStats) -> None:
+    """Stores updated statistics; a category whose last amount was removed loses its row."""
+    if stats.count > 0:
+        session.add(stats)
+    elif inspect(stats).persistent:
+        # Flushed right away, so a following insert-or-ignore of the same key sees the row gone
+        if settings.USE_ASYNC_DB:
+            await session.delete(stats) # type: ignore [union-attr]
+            await session.flush() # type: ignore [union-attr]
+        else:
+            session.delete(stats) # type: ignore [union-attr]
+            session.flush() # type: ignore [union-attr]
+
+async def record_transaction_amount(session: DbSession, transaction: Transaction, sign: int = 1) -> None:
+    """Adds (sign=1) or removes (sign=-1) a transaction's amount from its category's statistics. Does not commit."""
+    stats = await _get_stats(session, transaction.owner_id, transaction.category_id)
+    if sign > 0:
+        welford_add(stats, transaction.amount)
+    else:
+        welford_remove(stats, transaction.amount)
+    await _save_stats(session, stats)
+
+async def record_amount_batches(session: DbSession, batches: dict[tuple[int, int], List[tuple[float, int]]]) -> None:
+    """
+    Adds many amounts at once: {(owner_id, category_id): [(amount, times), ...]}. Loads the
+    affected statistics rows in a few queries instead of one per transaction. Does not commit.
+    """
+    keys = list(batches)
+    await _insert_missing(session, keys)
+    existing: dict[tuple[int, int], CategorySpendingStats] = {}
+    for start in range(0, len(keys), _KEY_BATCH_SIZE):
+        statement = (
+            select(CategorySpendingStats)
+            .where(tuple_(CategorySpendingStats.owner_id, CategorySpendingStats.category_id).in_(keys[start:start + _KEY_BATCH_SIZE]))
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        if settings.USE_ASYNC_DB:
+            rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+        else:
+            rows = session.exec(statement).all() # type: ignore [union-attr]
+        existing.update(((row.owner_id, row.category_id), row) for row in rows)
+
+    for (owner_id, category_id), amounts in batches.items():
+        stats = existing.get((owner_id, category_id)) or CategorySpendingStats(owner_id=owner_id, category_id=category_id)
+        for amount, times in amounts:
+            welford_merge(stats, times, amount, 0.0) # Identical amounts: no spread of their own
+        session.add(stats)
+
+async def delete_category_stats(session: DbSession, category_id: int) -> None:
+    """Removes a category's statistics rows before the category is deleted. Does not commit."""
+    statement = delete(CategorySpendingStats).where(CategorySpendingStats.category_id == category_id)
+    if settings.USE_ASYNC_DB:
+        await session.execute(statement) # type: ignore [union-attr]
+    else:
+        session.execute(statement) # type: ignore [union-attr]
+
+async def check_and_record_transaction(
+    session: DbSession, transaction: Transaction, category_name: str
+) -> Optional[Notification]:
+    """
+    Flags the transaction if it's an unusually large expense for its category, then adds it to
+    the category's statistics. Returns the notification added to the session, if any. Does not commit.
+    """
+    stats = await _get_stats(session, transaction.owner_id, transaction.category_id)
+    notification = None
+    score = z_score(stats, transaction.amount)
+    if transaction.type == CategoryType.EXPENSE and score is not None and score >= settings.ANOMALY_Z_THRESHOLD:
+        # The notification links to the transaction, which needs its id
+        if settings.USE_ASYNC_DB:
+            await session.flush() # type: ignore [union-attr]
+        else:
+            session.flush() # type: ignore [union-attr]
+        notification = Notification(
+            user_id=transaction.owner_id,
+            type=NotificationType.SPENDING_ANOMALY,
+            message=(
+                f"Unusual spending: {transaction.amount:.2f} in '{category_name}' is "
+                f"{transaction.amount / stats.mean:.1f}x your normal {stats.mean:.2f}."
+            ),
+            related_entity_id=transaction.id,
+            related_entity_type="transaction",
+        )
+        session.add(notification)
+
+    welford_add(stats, transaction.amount)
+    session.add(stats)
+    return notification
+
+
+async def rebuild_spending_stats(session: DbSession, owner_id: Optional[int] = None) -> int:
+    """
+    Regenerates category_spending_stats from raw transactions (for all users, or one owner).
+    Uses the given session without committing. Returns the number of rows written.
+    """
+    clear = delete(CategorySpendingStats)
+    aggregate = (
+        select(
+            Transaction.owner_id,
+            Transaction.category_id,
+            func.count(Transaction.id),
+            func.avg(Transaction.amount),
+            func.sum(Transaction.amount * Transaction.amount),
+        )
+        .group_by(Transaction.owner_id, Transaction.category_id)
+    )
+    if owner_id is not None:
+        clear = clear.where(CategorySpendingStats.owner_id == owner_id)
+        aggregate = aggregate.where(Transaction.owner_id == owner_id)
+
+    if settings.USE_ASYNC_DB:
+        await session.execute(clear) # type: ignore [union-attr]
+        rows = (await session.exec(aggregate)).all() # type: ignore [union-attr]
+    else:
+        session.execute(clear) # type: ignore [union-attr]
+        rows = session.exec(aggregate).all() # type: ignore [union-attr]
+
+    session.add_all(
+        CategorySpendingStats(
+            owner_id=tx_owner_id, category_id=category_id, count=count, mean=mean,
+            m2=max(0.0, sum_of_squares - count * mean * mean),
+        )
+        for tx_owner_id, category_id, count, mean, sum_of_squares in rows
+    )
+    if settings.USE_ASYNC_DB:
+        await session.flush() # type: ignore [union-attr]
+    else:
+        session.flush() # type: ignore [union-attr]
+    return len(rows)
@@ -0,0 +1,126 @@
+from typing import List, Optional, Union
+
+from sqlalchemy import delete, insert, literal, update
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Category, CategoryClosure
+from core.config import settings
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# --- Category Tree ---
+# Maintains category_closure alongside Category.parent_id/depth. Every category has a
+# self row (distance 0) plus one row per ancestor. Categories created before the tree
+# existed have no rows yet; they are all top-level, so a missing self row is added
+# the first time such a category takes part in a tree change.
+
+
+async def _exec_all(session: DbSession, statement) -> List:
+    if settings.USE_ASYNC_DB:
+        return (await session.exec(statement)).all() # type: ignore [union-attr]
+    return session.exec(statement).all() # type: ignore [union-attr]
+
+async def _execute(session: DbSession, statement) -> None:
+    if settings.USE_ASYNC_DB:
+        await session.execute(statement) # type: ignore [union-attr]
+    else:
+        session.execute(statement) # type: ignore [union-attr]
+
+async def _ensure_self_row(session: DbSession, category: Category) -> None:
+    existing = await _exec_all(
+        session,
+        select(CategoryClosure.ancestor_id)
+        .where(CategoryClosure.ancestor_id == category.id)
+        .where(CategoryClosure.descendant_id == category.id)
+    )
+    if not existing:
+        await _execute(session, insert(CategoryClosure).values(
+            ancestor_id=category.id, descendant_id=category.id, owner_id=category.owner_id,
+            distance=0, ancestor_depth=category.depth,
+        ))
+
+async def subtree_ids(session: DbSession, category: Category) -> List[int]:
+    """Ids of the category and all its descendants."""
+    return list(await _exec_all(
+        session,
+        select(CategoryClosure.descendant_id)
+        .where(CategoryClosure.owner_id == category.owner_id)
+        .where(CategoryClosure.ancestor_id == category.id)
+    ))
+
+async def attach_category(session: DbSession, category: Category, parent: Optional[Category] = None) -> None:
+    """Adds closure rows for a new (flushed, childless) category. Does not commit."""
+    category.parent_id = parent.id if parent else None
+    category.depth = parent.depth + 1 if parent else 0
+    session.add(category)
+    rows = [{"ancestor_id": category.id, "descendant_id": category.id, "owner_id": category.owner_id, "distance": 0, "ancestor_depth": category.depth}]
+    await _execute(session, insert(CategoryClosure).values(rows))
+    if parent is not None:
+        await _ensure_self_row(session, parent)
+        # The parent's ancestors (itself included) become the new category's ancestors
+        await _execute(session, insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "owner_id", "distance", "ancestor_depth"],
+            select(
+                CategoryClosure.ancestor_id, literal(category.id), CategoryClosure.owner_id,
+                CategoryClosure.distance + 1, CategoryClosure.ancestor_depth,
+            ).where(CategoryClosure.descendant_id == parent.id),
+        ))
+
+async def move_category(session: DbSession, category: Category, new_parent: Optional[Category]) -> None:
+    """
+    Re-parents a category together with its subtree. Raises ValueError if new_parent is
+    inside the subtree (which would create a cycle). Does not commit.
+    """
+    await _ensure_self_row(session, category)
+    moved_ids = await subtree_ids(session, category)
+    if new_parent is not None and new_parent.id in moved_ids:
+        raise ValueError("A category cannot be moved below itself or one of its subcategories.")
+
+    # Detach: drop the links from the old ancestors into the subtree
+    await _execute(
+        session,
+        delete(CategoryClosure)
+        .where(CategoryClosure.descendant_id.in_(moved_ids))
+        .where(CategoryClosure.ancestor_id.not_in(moved_ids))
+    )
+
+    # Shift the subtree's depths
+    new_depth = new_parent.depth + 1 if new_parent else 0
+    depth_change = new_depth - category.depth
+    if depth_change:
+        await _execute(
+            session,
+            update(Category).where(Category.id.in_(moved_ids)).values(depth=Category.depth + depth_change)
+        )
+        await _execute(
+            session,
+            update(CategoryClosure).where(CategoryClosure.ancestor_id.in_(moved_ids))
+            .values(ancestor_depth=CategoryClosure.ancestor_depth + depth_change)
+        )
+    category.depth = new_depth
+    category.parent_id = new_parent.id if new_parent else None
+    session.add(category)
+
+    # Attach: every ancestor of the new parent (itself included) x every node of the subtree
+    if new_parent is not None:
+        await _ensure_self_row(session, new_parent)
+        above, below = aliased(CategoryClosure), aliased(CategoryClosure)
+        await _execute(session, insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "owner_id", "distance", "ancestor_depth"],
+            select(
+                above.ancestor_id, below.descendant_id, above.owner_id,
+                above.distance + below.distance + 1, above.ancestor_depth,
+            )
+            .where(above.descendant_id == new_parent.id)
+            .where(below.ancestor_id == category.id),
+        ))
+
+async def detach_category(session: DbSession, category: Category) -> None:
+    """Removes a childless category's closure rows before it is deleted. Does not commit."""
+    await _execute(session, delete(CategoryClosure).where(CategoryClosure.descendant_id == category.id))
+
+async def has_children(session: DbSession, category: Category) -> bool:
+    return bool(await _exec_all(session, select(Category.id).where(Category.parent_id == category.id).limit(1)))
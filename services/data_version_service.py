@@ -0,0 +1,44 @@
+from typing import Union
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import User
+from core.config import settings
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# A per-user counter that changes whenever data feeding the reports changes.
+# Cached report results are keyed on it, so a write invalidates all of a user's
+# cached reports in O(1) without scanning or deleting cache keys.
+
+async def bump_data_version(session: DbSession, *user_ids: int) -> None:
+    """
+    Increments data_version for the given users in a single UPDATE.
+    Does not commit; call it before the commit of the write it belongs to.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    # Increment in SQL so concurrent writers never hand out the same version twice
+    statement = (
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if settings.USE_ASYNC_DB:
+        await session.execute(statement) # type: ignore [union-attr]
+    else:
+        session.execute(statement) # type: ignore [union-attr]
+
+async def get_data_version(session: DbSession, user_id: int) -> int:
+    """Reads the current data_version straight from the DB (never from a possibly stale User instance)."""
+    statement = select(User.data_version).where(User.id == user_id)
+    if settings.USE_ASYNC_DB:
+        version = (await session.exec(statement)).first() # type: ignore [union-attr]
+    else:
+        version = session.exec(statement).first() # type: ignore [union-attr]
+    return version or 0
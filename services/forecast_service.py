@@ -0,0 +1,55 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from models import RecurrenceFrequency
+from services.recurring_transaction_service import get_next_due_date
+
+# --- Recurring Rule Expansion ---
+# Expands a rule into all its occurrence dates up to a horizon as one NumPy array, without
+# stepping through get_next_due_date() one occurrence at a time. The results match what
+# generate_due_transactions() would create, including its month-end behaviour: each
+# occurrence is relativedelta(months=1) from the *previous* one, so once a day is clipped
+# (Jan 31 -> Feb 29) later occurrences keep the clipped day (Mar 29, Apr 29, ...).
+
+_MONTH_STEPS = {RecurrenceFrequency.MONTHLY: 1, RecurrenceFrequency.YEARLY: 12}
+_DAY_STEPS = {RecurrenceFrequency.DAILY: 1, RecurrenceFrequency.WEEKLY: 7}
+
+
+def expand_occurrences(
+    start_date: date,
+    last_created_date: Optional[date],
+    frequency: RecurrenceFrequency,
+    until: date,
+    end_date: Optional[date] = None,
+) -> np.ndarray:
+    """
+    All occurrence dates (datetime64[D], ascending) a rule still has to generate on or before
+    `until`, honouring the rule's end_date.
+    """
+    first = get_next_due_date(start_date, last_created_date, frequency)
+    last = min(until, end_date) if end_date else until
+    if first > last:
+        return np.array([], dtype="datetime64[D]")
+
+    first_day = np.datetime64(first, "D")
+    if frequency in _DAY_STEPS:
+        return np.arange(first_day, np.datetime64(last, "D") + 1, _DAY_STEPS[frequency])
+
+    step = _MONTH_STEPS[frequency]
+    first_month = np.datetime64(first, "M")
+    count = (np.datetime64(last, "M") - first_month).astype(int) // step + 1
+    months = first_month + np.arange(count) * step
+    month_lengths = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(int)
+    # Chained relativedelta: the day can only shrink, never recover
+    days = np.minimum(first.day, np.minimum.accumulate(month_lengths))
+    occurrences = months.astype("datetime64[D]") + (days - 1)
+    return occurrences[occurrences <= np.datetime64(last, "D")]
+
+
+def bucket_by_month(occurrences: np.ndarray, first_month: date, month_count: int) -> np.ndarray:
+    """Number of occurrences falling in each of `month_count` calendar months starting at `first_month`."""
+    offsets = (occurrences.astype("datetime64[M]") - np.datetime64(first_month, "M")).astype(int)
+    offsets = offsets[(offsets >= 0) & (offsets < month_count)]
+    return np.bincount(offsets, minlength=month_count)
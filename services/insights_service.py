@@ -0,0 +1,159 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, extract, func, insert
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, create_engine, select
+
+from models import Transaction, Category, CategoryType, User, SpendingInsight
+from core.config import settings, SYNC_DATABASE_URL
+
+# --- Anonymized Insights Pipeline ---
+# Aggregates spending per (category name, month, cohort) across opted-in users.
+#  * Owners are split into chunks; each chunk is aggregated by a worker process that streams
+#    its owners' transactions with a server-side cursor, so no process holds the whole table.
+#  * Every owner lives in exactly one chunk, so per-user figures (cohort, distinct user counts)
+#    are exact within a chunk and chunk results can simply be added together.
+#  * Groups with fewer than INSIGHTS_MIN_COHORT_SIZE distinct users are dropped (k-anonymity).
+
+# (category_name, year, month, cohort, type) -> [user_count, transaction_count, total_amount]
+GroupKey = tuple[str, int, int, str, CategoryType]
+
+
+def cohort_label(monthly_expense: float, bounds: List[float]) -> str:
+    """Monthly expense band, e.g. bounds [500, 1000] give "<500", "500-1000" and "1000+"."""
+    lower = None
+    for bound in bounds:
+        if monthly_expense < bound:
+            return f"<{bound:g}" if lower is None else f"{lower:g}-{bound:g}"
+        lower = bound
+    return f"{lower:g}+" if lower is not None else "all"
+
+
+def aggregate_owner_chunk(
+    database_url: str, owner_ids: List[int], start_date: date, end_date: date, cohort_bounds: List[float]
+) -> dict[GroupKey, list]:
+    """
+    Worker: aggregates one chunk of owners. Runs in a separate process with its own engine.
+    Rows are pre-grouped per (owner, month, category name, type) in SQL and streamed.
+    """
+    engine = create_engine(database_url, poolclass=NullPool)
+    category_name = func.lower(func.trim(Category.name))
+    statement = (
+        select(
+            Transaction.owner_id,
+            extract("year", Transaction.date),
+            extract("month", Transaction.date),
+            category_name,
+            Transaction.type,
+            func.count(Transaction.id),
+            func.sum(Transaction.amount),
+        )
+        .join(Category, Category.id == Transaction.category_id)
+        .where(Transaction.owner_id.in_(owner_ids))
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+        .group_by(Transaction.owner_id, extract("year", Transaction.date), extract("month", Transaction.date), category_name, Transaction.type)
+        .execution_options(stream_results=True, yield_per=5000)
+    )
+
+    # Per (owner, year, month): the rows to place in a cohort and the month's total expense
+    owner_months: dict[tuple, list] = defaultdict(list)
+    owner_month_expense: dict[tuple, float] = defaultdict(float)
+    try:
+        with Session(engine) as session:
+            for owner_id, year, month, name, tx_type, count, amount in session.exec(statement):
+                owner_month = (owner_id, int(year), int(month))
+                owner_months[owner_month].append((name, CategoryType(tx_type), count, amount))
+                if tx_type == CategoryType.EXPENSE:
+                    owner_month_expense[owner_month] += amount
+    finally:
+        engine.dispose()
+
+    groups: dict[GroupKey, list] = defaultdict(lambda: [0, 0, 0.0])
+    for (owner_id, year, month), rows in owner_months.items():
+        cohort = cohort_label(owner_month_expense[(owner_id, year, month)], cohort_bounds)
+        for name, tx_type, count, amount in rows:
+            group = groups[(name, year, month, cohort, tx_type)]
+            group[0] += 1 # One distinct user (rows are already unique per owner)
+            group[1] += count
+            group[2] += amount
+    return dict(groups)
+
+
+def _chunks(owner_ids: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(owner_ids), size):
+        yield owner_ids[start:start + size]
+
+
+def run_insights_pipeline(
+    start_date: date,
+    end_date: date,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    min_cohort_size: Optional[int] = None,
+    database_url: Optional[str] = None,
+) -> int:
+    """
+    Recomputes spending_insight for the months between start_date and end_date (inclusive,
+    whole months expected). workers=0 runs the chunks in-process. Returns rows written.
+    """
+    workers = settings.INSIGHTS_WORKERS if workers is None else workers
+    chunk_size = chunk_size or settings.INSIGHTS_CHUNK_OWNERS
+    min_cohort_size = min_cohort_size or settings.INSIGHTS_MIN_COHORT_SIZE
+    database_url = database_url or SYNC_DATABASE_URL
+    cohort_bounds = settings.INSIGHTS_COHORT_BOUNDS
+
+    engine = create_engine(database_url, poolclass=NullPool)
+    try:
+        with Session(engine) as session:
+            owner_ids = list(session.exec(
+                select(User.id).where(User.share_anonymized_insights == True).order_by(User.id)
+            ).all())
+        print(f"Building insights for {len(owner_ids)} opted-in users, {start_date} to {end_date}.")
+
+        chunk_args = [(database_url, chunk, start_date, end_date, cohort_bounds) for chunk in _chunks(owner_ids, chunk_size)]
+        if workers > 0 and len(chunk_args) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunk_results = list(pool.map(aggregate_owner_chunk, *zip(*chunk_args)))
+        else:
+            chunk_results = [aggregate_owner_chunk(*args) for args in chunk_args]
+
+        merged: dict[GroupKey, list] = defaultdict(lambda: [0, 0, 0.0])
+        for chunk_result in chunk_results:
+            for key, (user_count, transaction_count, total_amount) in chunk_result.items():
+                group = merged[key]
+                group[0] += user_count
+                group[1] += transaction_count
+                group[2] += total_amount
+
+        computed_at = datetime.utcnow()
+        rows = [
+            {
+                "category_name": name, "year": year, "month": month, "cohort": cohort, "type": tx_type,
+                "user_count": user_count, "transaction_count": transaction_count,
+                "total_amount": total_amount, "average_per_user": total_amount / user_count,
+                "computed_at": computed_at,
+            }
+            for (name, year, month, cohort, tx_type), (user_count, transaction_count, total_amount) in merged.items()
+            if user_count >= min_cohort_size # k-anonymity
+        ]
+
+        # Replace the recomputed months in one transaction
+        month_index = SpendingInsight.year * 12 + SpendingInsight.month
+        with Session(engine) as session:
+            session.execute(
+                delete(SpendingInsight)
+                .where(month_index >= start_date.year * 12 + start_date.month)
+                .where(month_index <= end_date.year * 12 + end_date.month)
+            )
+            if rows:
+                session.execute(insert(SpendingInsight), rows)
+            session.commit()
+    finally:
+        engine.dispose()
+
+    print(f"Insights written: {len(rows)} groups ({len(merged) - len(rows)} suppressed below k={min_cohort_size}).")
+    return len(rows)
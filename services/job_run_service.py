@@ -0,0 +1,196 @@
+import asyncio
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import JobRun, JobRunStatus, JobCheckpoint
+from core.db import sync_session_scope, async_session_scope
+from core.config import settings
+from services.job_worker import run_job
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# --- Job Run History ---
+# Every run of a background job is recorded in job_run: a row is committed as "running" before
+# the job starts, updated with progress and completed (finish time, rows created, error) when it
+# ends, each in its own short transaction. The row is the only channel between the process
+# running a job and anyone asking about it, so status is visible from every worker and node.
+
+
+async def _save(job_run: JobRun) -> JobRun:
+    """Writes the run in its own transaction and returns it detached (attributes stay loaded)."""
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            job_run = await session.merge(job_run)
+            await session.flush()
+            session.expunge(job_run)
+    else:
+        with sync_session_scope() as session:
+            job_run = session.merge(job_run)
+            session.flush()
+            session.expunge(job_run)
+    return job_run
+
+async def _find_in_progress(dedup_key: str) -> Optional[JobRun]:
+    statement = select(JobRun).where(JobRun.dedup_key == dedup_key)
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            return (await session.exec(statement)).first() # type: ignore [union-attr]
+    with sync_session_scope() as session:
+        job_run = session.exec(statement).first() # type: ignore [union-attr]
+        if job_run is not None:
+            session.expunge(job_run)
+        return job_run
+
+async def start_job_run(
+    job_id: str,
+    trigger: str = "scheduled",
+    host: Optional[str] = None,
+    parameters: Optional[dict[str, Any]] = None,
+    requested_by: Optional[int] = None,
+    dedup_key: Optional[str] = None,
+) -> tuple[JobRun, bool]:
+    """
+    Records a new run as running. Returns (run, True), or (the run in progress, False) if a run
+    with the same dedup_key hasn't finished yet. A run holding its key for longer than
+    JOB_STALE_AFTER_SECONDS is taken to have died with its process and is marked failed.
+    """
+    for _ in range(3):
+        try:
+            job_run = await _save(JobRun(
+                job_id=job_id, trigger=trigger, host=host, parameters=parameters or {},
+                requested_by=requested_by, dedup_key=dedup_key,
+            ))
+            return job_run, True
+        except IntegrityError:
+            if dedup_key is None:
+                raise
+        existing = await _find_in_progress(dedup_key)
+        if existing is None:
+            continue # Finished in the meantime
+        if existing.started_at >= datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS):
+            return existing, False
+        await finish_job_run(existing, error="Abandoned: no result after JOB_STALE_AFTER_SECONDS")
+    raise RuntimeError(f"Could not start job '{job_id}' ({dedup_key}): runs with the same key keep conflicting.")
+
+async def update_job_progress(job_run: JobRun, chunks_done: int, chunk_count: int, rows_created: int) -> JobRun:
+    job_run.chunks_done = chunks_done
+    job_run.chunk_count = chunk_count
+    job_run.rows_created = rows_created
+    return await _save(job_run)
+
+async def finish_job_run(job_run: JobRun, result: Any = None, error: Optional[str] = None) -> JobRun:
+    """Marks the run succeeded (recording an int result as rows created) or failed, and releases its dedup key."""
+    job_run.status = JobRunStatus.FAILED if error is not None else JobRunStatus.SUCCEEDED
+    job_run.error = error
+    if isinstance(result, int):
+        job_run.rows_created = result
+    job_run.finished_at = datetime.utcnow()
+    job_run.dedup_key = None
+    return await _save(job_run)
+
+def describe_error(error: BaseException) -> str:
+    return "".join(traceback.format_exception_only(type(error), error)).strip()
+
+async def record_job_run(
+    job_id: str,
+    job: Callable[..., Awaitable[Any]],
+    *args: Any,
+    trigger: str = "scheduled",
+    host: Optional[str] = None,
+    **kwargs: Any,
+) -> Any:
+    """Runs job(*args, **kwargs), recording it in job_run. Re-raises the job's exception after recording it."""
+    job_run, _ = await start_job_run(job_id, trigger=trigger, host=host)
+    try:
+        result = await job(*args, **kwargs)
+    except Exception as e:
+        await finish_job_run(job_run, error=describe_error(e))
+        raise
+    await finish_job_run(job_run, result)
+    return result
+
+async def get_job_run(session: DbSession, job_run_id: int) -> Optional[JobRun]:
+    if settings.USE_ASYNC_DB:
+        return await session.get(JobRun, job_run_id) # type: ignore [union-attr]
+    return session.get(JobRun, job_run_id) # type: ignore [union-attr]
+
+async def get_job_runs(session: DbSession, job_id: Optional[str] = None, limit: int = 20) -> List[JobRun]:
+    """Most recent runs first, optionally of one job."""
+    statement = select(JobRun).order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit)
+    if job_id is not None:
+        statement = statement.where(JobRun.job_id == job_id)
+    if settings.USE_ASYNC_DB:
+        return list((await session.exec(statement)).all()) # type: ignore [union-attr]
+    return list(session.exec(statement).all()) # type: ignore [union-attr]
+
+
+# --- Checkpoints ---
+
+async def get_job_checkpoint(job_id: str) -> Optional[datetime]:
+    """The position (UTC) the job last recorded, or None if it never ran to completion."""
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            checkpoint = await session.get(JobCheckpoint, job_id) # type: ignore [union-attr]
+            return checkpoint.position if checkpoint is not None else None
+    with sync_session_scope() as session:
+        checkpoint = session.get(JobCheckpoint, job_id) # type: ignore [union-attr]
+        return checkpoint.position if checkpoint is not None else None
+
+async def set_job_checkpoint(job_id: str, position: datetime) -> None:
+    """Records how far the job has got, in its own transaction."""
+    checkpoint = JobCheckpoint(job_id=job_id, position=position, updated_at=datetime.utcnow())
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            await session.merge(checkpoint) # type: ignore [union-attr]
+    else:
+        with sync_session_scope() as session:
+            session.merge(checkpoint) # type: ignore [union-attr]
+
+
+# --- Background Execution ---
+# Manually triggered jobs run in a small pool of worker processes (JOB_WORKERS), so long
+# generation runs don't compete with requests for the web worker's event loop. Workers are
+# spawned, not forked: a fresh interpreter creates its own engines instead of sharing this
+# process' pooled connections (services/job_worker.py is their entry point). With JOB_WORKERS=0
+# (and in serverless mode) jobs run as tasks on the current event loop.
+
+_job_pool: Optional[ProcessPoolExecutor] = None
+_background_jobs: set[asyncio.Future] = set() # Keeps in-process tasks referenced until done
+
+def run_in_background(job: Callable[..., Awaitable[Any]], *args: Any) -> asyncio.Future:
+    """
+    Starts job(*args) off the request path and returns its future. `job` must be a module-level
+    async function (it is sent to the worker process by reference) that records its own outcome.
+    """
+    global _job_pool
+    if settings.JOB_WORKERS > 0 and not settings.SERVERLESS:
+        if _job_pool is None:
+            _job_pool = ProcessPoolExecutor(max_workers=settings.JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        # By reference: the worker can only import the job's module once it has loaded core
+        future = asyncio.get_running_loop().run_in_executor(_job_pool, run_job, f"{job.__module__}:{job.__qualname__}", *args)
+    else:
+        future = asyncio.ensure_future(job(*args))
+    _background_jobs.add(future)
+    future.add_done_callback(_background_job_done)
+    return future
+
+def _background_job_done(future: asyncio.Future) -> None:
+    _background_jobs.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        # Jobs record their own failures; this is a crash outside of that (e.g. a worker process died)
+        print(f"Background job crashed: {describe_error(future.exception())}")
+
+def shutdown_job_workers() -> None:
+    """Stops the worker processes (at application shutdown); running jobs are allowed to finish."""
+    global _job_pool
+    if _job_pool is not None:
+        _job_pool.shutdown(wait=True)
+        _job_pool = None
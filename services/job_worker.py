@@ -0,0 +1,32 @@
+import asyncio
+import importlib
+from typing import Any
+
+# --- Job Worker Entry Point ---
+# Runs in the spawned job worker processes (see services/job_run_service.py). A fresh interpreter
+# imports whatever module the submitted callable lives in, and the app's modules can only be
+# imported in one order: core first (it loads the routers, which load the services). So this
+# module imports nothing from the app itself, and jobs are passed by reference
+# ("module:function") and resolved only after core has been loaded.
+
+
+def run_job(job_ref: str, *args: Any) -> Any:
+    """Imports the app, resolves `job_ref` and runs the async job to completion."""
+    import core # noqa: F401 (loads the app modules in dependency order)
+
+    from core.db import get_async_engine
+
+    module_name, _, function_name = job_ref.partition(":")
+    job = getattr(importlib.import_module(module_name), function_name)
+
+    async def run() -> Any:
+        try:
+            return await job(*args)
+        finally:
+            # Pooled connections are bound to this job's event loop, which asyncio.run closes:
+            # the worker's next job must not check them out
+            async_engine = get_async_engine()
+            if async_engine is not None:
+                await async_engine.dispose()
+
+    return asyncio.run(run())
@@ -1,15 +1,30 @@
-from datetime import date, timedelta
-from datetime import date, timedelta
+import asyncio
+import inspect
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from sqlmodel import Session, select # Keep sync Session for type hint if needed
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
 from dateutil.relativedelta import relativedelta
-from typing import Optional, List, Union, Any
+from typing import Optional, List, Union, Any, Callable, Awaitable
+from sqlalchemy import insert, or_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 
 # Import models including Notification
-from models import RecurringTransaction, Transaction, RecurrenceFrequency, Category, User, Notification, NotificationType
+from models import RecurringTransaction, Transaction, RecurrenceFrequency, Category, CategoryType, User, Notification, NotificationType, JobRun
 # Import both session scopes and settings
-from core.db import sync_session_scope, async_session_scope
+from core.db import sync_session_scope, async_session_scope, get_async_engine
 from core.config import settings
+from services.report_rollup_service import RollupDelta, apply_rollup_delta
+from services.data_version_service import bump_data_version
+from services.anomaly_service import record_amount_batches
+from services.job_run_service import (
+    start_job_run, update_job_progress, finish_job_run, describe_error, run_in_background, get_job_checkpoint, set_job_checkpoint,
+)
+from services.report_snapshot_service import refresh_stale_snapshots
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
 
 def get_next_due_date(start_date: date, last_created: Optional[date], frequency: RecurrenceFrequency) -> date:
     """Calculates the next due date based on frequency."""
@@ -29,99 +44,383 @@ def get_next_due_date(start_date: date, last_created: Optional[date], frequency:
         # Should not happen with Enum validation, but good practice
         raise ValueError(f"Unknown frequency: {frequency}")
 
-# This function needs to handle both sync and async execution internally
-# It cannot be async itself if called directly from sync code,
-# but the internal DB operations need to be conditional.
-# If run via FastAPI background task, it can be async. Let's make it async.
-async def generate_due_transactions(run_date: date = date.today()):
+def next_due_date_for(rule: RecurringTransaction, last_created_date: Optional[date] = None) -> Optional[date]:
+    """
+    The rule's next occurrence still to be generated (after last_created_date, default: the rule's
+    own), or None if that is past the rule's end date.
+    """
+    next_due = get_next_due_date(rule.start_date, last_created_date or rule.last_created_date, rule.frequency)
+    if rule.end_date and next_due > rule.end_date:
+        return None
+    return next_due
+
+# (lowest owner_id, highest owner_id) of a chunk, inclusive
+OwnerRange = tuple[int, int]
+
+# SQLite allows one writer at a time, so chunks run one after another there
+_SERIAL_DIALECTS = {"sqlite"}
+
+def _due_condition(run_date: date, timezones: Optional[List[str]] = None) -> Any:
+    """
+    Active rules that are due, via the (is_active, next_due_date) index. Rules created before
+    next_due_date existed (NULL) are picked up once to fill it in. With `timezones`, only rules
+    of users in those time zones.
+    """
+    condition = (RecurringTransaction.is_active == True) & or_(
+        RecurringTransaction.next_due_date <= run_date, RecurringTransaction.next_due_date.is_(None)
+    )
+    if timezones is not None:
+        condition = condition & RecurringTransaction.owner_id.in_(select(User.id).where(User.timezone.in_(timezones)))
+    return condition
+
+async def _due_owner_ranges(run_date: date, chunk_size: int, timezones: Optional[List[str]] = None) -> List[OwnerRange]:
+    """Splits the owners with due rules into contiguous owner_id ranges of up to chunk_size owners."""
+    statement = (
+        select(RecurringTransaction.owner_id).where(_due_condition(run_date, timezones))
+        .distinct().order_by(RecurringTransaction.owner_id)
+    )
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            owner_ids = list((await session.exec(statement)).all()) # type: ignore [union-attr]
+    else:
+        with sync_session_scope() as session:
+            owner_ids = list(session.exec(statement).all()) # type: ignore [union-attr]
+    return [
+        (owner_ids[chunk_start], owner_ids[min(chunk_start + chunk_size, len(owner_ids)) - 1])
+        for chunk_start in range(0, len(owner_ids), chunk_size)
+    ]
+
+async def _generate_chunk(run_date: date, owner_range: OwnerRange, timezones: Optional[List[str]] = None) -> int:
+    """Generates one chunk of owners in its own session and transaction, committed on success."""
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            return await _generate_due_in_session(session, run_date, owner_range, timezones)
+    with sync_session_scope() as session:
+        return await _generate_due_in_session(session, run_date, owner_range, timezones)
+
+async def generate_due_transactions(
+    run_date: Optional[date] = None,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int, int], Optional[Awaitable[None]]]] = None,
+    timezones: Optional[List[str]] = None,
+) -> int:
     """
     Checks for active recurring transactions that are due to be created
-    on or before the run_date and generates the corresponding Transaction records.
+    on or before the run_date (default: today, on the server) and generates the corresponding
+    Transaction records. With `timezones`, only for users in those time zones.
+    Owners with due rules are split into chunks of `chunk_size` (by owner_id range); each chunk
+    is generated and committed in its own session, up to `workers` chunks at a time in async
+    mode (one at a time in sync mode and on SQLite). A failing chunk is retried, and if it keeps
+    failing the other chunks' work is kept and its rules simply stay due for the next run.
+    on_progress(chunks_done, chunk_count, created_so_far) is called (and awaited, if it returns
+    an awaitable) after every chunk.
     Handles both sync and async database sessions based on settings.
     """
+    run_date = run_date or date.today() # Resolved per call: long-lived workers see the current date
+    workers = workers or settings.RECURRING_WORKERS
+    chunk_size = chunk_size or settings.RECURRING_CHUNK_OWNERS
+    print(f"Running recurring transaction generation for date: {run_date}" + (f" (time zones: {', '.join(timezones)})" if timezones is not None else ""))
+
+    owner_ranges = await _due_owner_ranges(run_date, chunk_size, timezones)
+    async_engine = get_async_engine()
+    if not settings.USE_ASYNC_DB or async_engine is None or async_engine.dialect.name in _SERIAL_DIALECTS:
+        # Sync sessions block the event loop anyway
+        workers = 1
+    print(f"Generating {len(owner_ranges)} chunk(s) of up to {chunk_size} owners with {workers} worker(s).")
+
+    semaphore = asyncio.Semaphore(workers)
+    created_count = 0
+    chunks_done = 0
+    failed_ranges: List[OwnerRange] = []
+
+    async def process(owner_range: OwnerRange) -> None:
+        nonlocal created_count, chunks_done
+        async with semaphore:
+            for attempt in range(settings.RECURRING_CHUNK_RETRIES + 1):
+                try:
+                    created = await _generate_chunk(run_date, owner_range, timezones)
+                    break
+                except Exception as e:
+                    print(f"Recurring generation failed for owners {owner_range[0]}-{owner_range[1]} (attempt {attempt + 1}): {e}")
+                    if attempt < settings.RECURRING_CHUNK_RETRIES:
+                        await asyncio.sleep(settings.RECURRING_CHUNK_RETRY_DELAY_SECONDS * (attempt + 1))
+            else:
+                failed_ranges.append(owner_range)
+                created = 0
+        created_count += created
+        chunks_done += 1
+        print(f"Recurring generation: {chunks_done}/{len(owner_ranges)} chunks done, {created_count} transactions created.")
+        if on_progress is not None:
+            reported = on_progress(chunks_done, len(owner_ranges), created_count)
+            if inspect.isawaitable(reported):
+                await reported
+
+    await asyncio.gather(*(process(owner_range) for owner_range in owner_ranges))
+
+    print(f"Recurring transaction generation complete. Created {created_count} transactions.")
+    if failed_ranges:
+        ranges = ", ".join(f"{low}-{high}" for low, high in sorted(failed_ranges))
+        raise RuntimeError(
+            f"Recurring generation failed for {len(failed_ranges)} of {len(owner_ranges)} chunks (owners {ranges}); "
+            f"{created_count} transactions were created for the others."
+        )
+    return created_count
+
+# --- Scheduled Runs by Local Day ---
+# The scheduler runs hourly. Each run generates for the users whose local day started since
+# the previous run, dated with their local date, so occurrences land on the right day in every
+# time zone and the work is spread over up to 24 small runs instead of one daily spike.
+
+# job_checkpoint entry: the instant up to which local midnights have been handled
+LOCAL_DAYS_CHECKPOINT = "generate_recurring_transactions:local_days"
+
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"Warning: Unknown time zone '{name}'; treating it as UTC.")
+        return ZoneInfo("UTC")
+
+def new_local_days(timezones: List[str], now: datetime, window: timedelta = timedelta(hours=1)) -> dict[date, List[str]]:
+    """
+    Groups the time zones whose local date changed during (now - window, now] by their current
+    local date. Comparing dates rather than looking for local hour 0 also covers half-hour offsets and
+    DST transitions that skip or repeat midnight.
+    """
+    days: dict[date, List[str]] = defaultdict(list)
+    for name in timezones:
+        zone = _zone(name)
+        local_today = now.astimezone(zone).date()
+        if (now - window).astimezone(zone).date() != local_today:
+            days[local_today].append(name)
+    return dict(days)
+
+async def generate_due_for_new_local_days(now: Optional[datetime] = None) -> int:
+    """
+    Scheduled (hourly) generation: for every time zone where a new day has started since the
+    last successful run, generates the due transactions of that zone's users up to their local
+    date. The span starts at the stored checkpoint rather than an hour ago, so a run that fires
+    late, or follows skipped or coalesced runs, still covers every local midnight in between.
+    A failing run doesn't move the checkpoint; the next one retries the same span (generation is
+    idempotent). Report snapshots the new transactions made stale are recomputed right away.
+    Returns the number of transactions created.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    since = await get_job_checkpoint(LOCAL_DAYS_CHECKPOINT)
+    since = since.replace(tzinfo=timezone.utc) if since is not None else now - timedelta(hours=1)
+    if since >= now:
+        return 0 # Span already handled (e.g. a clock step backwards)
+    statement = select(User.timezone).where(
+        User.id.in_(select(RecurringTransaction.owner_id).where(RecurringTransaction.is_active == True))
+    ).distinct()
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            timezones = list((await session.exec(statement)).all()) # type: ignore [union-attr]
+    else:
+        with sync_session_scope() as session:
+            timezones = list(session.exec(statement).all()) # type: ignore [union-attr]
+
     created_count = 0
-    print(f"Running recurring transaction generation for date: {run_date}")
+    for local_date, day_timezones in sorted(new_local_days(timezones, now, window=now - since).items()):
+        created_count += await generate_due_transactions(run_date=local_date, timezones=day_timezones)
+        # These users' data changed after the nightly snapshot run (unless they are on UTC)
+        await refresh_stale_snapshots(day_timezones, local_date)
+    await set_job_checkpoint(LOCAL_DAYS_CHECKPOINT, now.replace(tzinfo=None))
+    return created_count
+
+# --- Manually Triggered Runs ---
 
-    # Choose the correct session scope based on settings
-    session_context = async_session_scope() if settings.USE_ASYNC_DB else sync_session_scope()
+GENERATION_JOB_ID = "generate_recurring_transactions"
 
-    async with session_context as session: # Use async with for async scope
-        # Find active recurring rules where start_date is on or before run_date
+async def run_generation_job(job_run_id: int, run_date: date) -> None:
+    """
+    Background entry point (worker process or in-process task) for a manually triggered run:
+    generates, reporting progress and the outcome on the job_run row.
+    """
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            job_run = await session.get(JobRun, job_run_id) # type: ignore [union-attr]
+    else:
+        with sync_session_scope() as session:
+            job_run = session.get(JobRun, job_run_id) # type: ignore [union-attr]
+            session.expunge(job_run)
+
+    async def report_progress(chunks_done: int, chunk_count: int, created: int) -> None:
+        await update_job_progress(job_run, chunks_done, chunk_count, created)
+
+    try:
+        created_count = await generate_due_transactions(run_date=run_date, on_progress=report_progress)
+    except Exception as e:
+        await finish_job_run(job_run, error=describe_error(e))
+        return
+    await finish_job_run(job_run, created_count)
+
+async def submit_generation_job(run_date: date, requested_by: Optional[int] = None) -> tuple[JobRun, bool]:
+    """
+    Starts a background generation run for run_date and returns (its job_run row, True). While
+    a run for the same date is still in progress (in any process), returns (that run, False)
+    instead of starting another.
+    """
+    job_run, created = await start_job_run(
+        GENERATION_JOB_ID, trigger="manual", parameters={"run_date": run_date.isoformat()},
+        requested_by=requested_by, dedup_key=f"{GENERATION_JOB_ID}:{run_date.isoformat()}",
+    )
+    if created:
+        run_in_background(run_generation_job, job_run.id, run_date)
+    return job_run, created
+
+async def _execute(session: DbSession, statement: Any, params: Optional[List[dict]] = None) -> None:
+    if settings.USE_ASYNC_DB:
+        await session.execute(statement, params) # type: ignore [union-attr]
+    else:
+        session.execute(statement, params) # type: ignore [union-attr]
+
+def _rule_update(rule: RecurringTransaction, last_created_date: Optional[date]) -> dict:
+    """Bulk UPDATE parameters for a processed rule; rules past their end date are deactivated."""
+    next_due = next_due_date_for(rule, last_created_date)
+    return {"id": rule.id, "last_created_date": last_created_date, "next_due_date": next_due, "is_active": next_due is not None}
+
+async def _generate_due_in_session(
+    session: DbSession, run_date: date, owner_range: Optional[OwnerRange] = None, timezones: Optional[List[str]] = None
+) -> int:
+    """
+    Set-based generation: every due occurrence of every rule (of the owners in owner_range and
+    timezones, if given) is expanded in memory, then transactions and notifications are written
+    with bulk INSERTs and the rules advanced with one bulk UPDATE, all in the caller's transaction.
+    Returns the number of transactions created.
+    """
+    # Imported here: forecast_service builds on get_next_due_date from this module
+    from services.forecast_service import expand_occurrences
+
+    due_rules = select(RecurringTransaction).where(_due_condition(run_date, timezones))
+    if owner_range is not None:
+        due_rules = due_rules.where(RecurringTransaction.owner_id.between(*owner_range))
+    # Every category those rules point to, in one query
+    rule_categories = select(Category.id, Category.owner_id, Category.type).where(
+        Category.id.in_(due_rules.with_only_columns(RecurringTransaction.category_id))
+    )
+    if settings.USE_ASYNC_DB:
+        active_rules = (await session.exec(due_rules)).all() # type: ignore [union-attr]
+        category_rows = (await session.exec(rule_categories)).all() # type: ignore [union-attr]
+    else:
+        active_rules = session.exec(due_rules).all() # type: ignore [union-attr]
+        category_rows = session.exec(rule_categories).all() # type: ignore [union-attr]
+    categories = {category_id: (owner_id, category_type) for category_id, owner_id, category_type in category_rows}
+
+    now = datetime.utcnow()
+    transaction_rows: List[dict] = []
+    rule_updates: List[dict] = []
+    # rule id -> (rule, category type) for every rule with occurrences to insert
+    generating: dict[int, tuple[RecurringTransaction, CategoryType]] = {}
+
+    for rule in active_rules:
+        occurrences = expand_occurrences(rule.start_date, rule.last_created_date, rule.frequency, run_date, rule.end_date)
+        if len(occurrences) == 0:
+            # Not due yet (next_due_date was missing), or past its end date
+            rule_updates.append(_rule_update(rule, rule.last_created_date))
+            continue
+
+        category = categories.get(rule.category_id)
+        if category is None or category[0] != rule.owner_id:
+            print(f"Warning: Category ID {rule.category_id} not found or invalid for recurring rule ID {rule.id}. Skipping generation.")
+            continue
+        category_type = category[1]
+
+        due_dates: List[date] = occurrences.tolist()
+        transaction_rows.extend(
+            {
+                "amount": rule.amount, "type": category_type, "date": due_date, "description": rule.description,
+                "category_id": rule.category_id, "owner_id": rule.owner_id, "created_at": now,
+                "recurring_rule_id": rule.id, "occurrence_date": due_date,
+            }
+            for due_date in due_dates
+        )
+        generating[rule.id] = (rule, category_type)
+        rule_updates.append(_rule_update(rule, due_dates[-1]))
+
+    # Bulk UPDATE by primary key: advance every rule past its last generated occurrence
+    if rule_updates:
+        await _execute(session, update(RecurringTransaction), rule_updates)
+    if not transaction_rows:
+        return 0
+
+    # Only occurrences no other run has inserted yet count from here on
+    inserted = await _insert_occurrences(session, transaction_rows)
+    if not inserted:
+        return 0
+
+    notification_rows: List[dict] = []
+    # Monthly rollup changes and anomaly statistics for all generated transactions, applied once before commit
+    rollup_delta = RollupDelta()
+    amount_batches: dict[tuple[int, int], List[tuple[float, int]]] = defaultdict(list)
+    affected_owner_ids = set()
+    dates_by_rule: dict[int, List[date]] = defaultdict(list)
+    for rule_id, occurrence_date in inserted:
+        dates_by_rule[rule_id].append(occurrence_date)
+
+    for rule_id, due_dates in dates_by_rule.items():
+        rule, category_type = generating[rule_id]
+        # A notification for the user per generated transaction
+        notification_rows.extend(
+            {
+                "user_id": rule.owner_id, "type": NotificationType.RECURRING_TX_GENERATED, "is_read": False, "created_at": now,
+                "message": f"Recurring transaction '{rule.description}' of {rule.amount} generated for {due_date}.",
+            }
+            for due_date in sorted(due_dates)
+        )
+        # All occurrences of a rule share its amount, so rollups and sketches take one change per month
+        for (year, month), count in Counter((due_date.year, due_date.month) for due_date in due_dates).items():
+            rollup_delta.add(rule.owner_id, date(year, month, 1), rule.category_id, category_type, rule.amount * count, count)
+            rollup_delta.sketches.add((rule.owner_id, year, month, rule.category_id), rule.amount, count)
+        # Scheduled amounts are expected, so they feed the anomaly statistics without being checked
+        amount_batches[(rule.owner_id, rule.category_id)].append((rule.amount, len(due_dates)))
+        affected_owner_ids.add(rule.owner_id)
+
+    await _execute(session, insert(Notification), notification_rows)
+    await record_amount_batches(session, amount_batches)
+    # Keep the monthly rollup in step with the generated transactions (same DB transaction)
+    await apply_rollup_delta(session, rollup_delta)
+    await bump_data_version(session, *affected_owner_ids) # Invalidates cached reports
+    return len(inserted)
+
+async def _insert_occurrences(session: DbSession, transaction_rows: List[dict]) -> List[tuple[int, date]]:
+    """
+    Inserts generated transactions, skipping occurrences that already exist (unique
+    recurring_rule_id + occurrence_date), so overlapping or repeated runs converge to one row per
+    occurrence. Returns the (recurring_rule_id, occurrence_date) pairs actually inserted.
+    """
+    dialect_name = session.bind.dialect.name if session.bind is not None else ""
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
         statement = (
-            select(RecurringTransaction)
-            .where(RecurringTransaction.is_active == True)
-            .where(RecurringTransaction.start_date <= run_date)
+            dialect_insert(Transaction)
+            .on_conflict_do_nothing(index_elements=["recurring_rule_id", "occurrence_date"])
+            .returning(Transaction.recurring_rule_id, Transaction.occurrence_date)
         )
         if settings.USE_ASYNC_DB:
-            results = await session.exec(statement) # type: ignore [union-attr]
-            active_rules = results.all()
+            result = await session.execute(statement, transaction_rows) # type: ignore [union-attr]
         else:
-            active_rules = session.exec(statement).all() # type: ignore [union-attr]
-
-
-        for rule in active_rules:
-            # Determine the next date a transaction should be created
-            next_due = get_next_due_date(rule.start_date, rule.last_created_date, rule.frequency)
-
-            # Loop to create transactions if multiple are due (e.g., if job hasn't run)
-            while next_due <= run_date:
-                # Check if the rule has an end date and if we've passed it
-                if rule.end_date and next_due > rule.end_date:
-                    print(f"Recurring rule ID {rule.id} ended ({rule.end_date}). Stopping generation for this rule on {next_due}.")
-                    break # Stop generating for this rule
-
-                # Get category details (needed for transaction type)
-                if settings.USE_ASYNC_DB:
-                    category = await session.get(Category, rule.category_id) # type: ignore [union-attr]
-                else:
-                    category = session.get(Category, rule.category_id) # type: ignore [union-attr]
-
-                if not category or category.owner_id != rule.owner_id:
-                    print(f"Warning: Category ID {rule.category_id} not found or invalid for recurring rule ID {rule.id}. Skipping generation for {next_due}.")
-                    break # Stop generating for this rule for this cycle
-
-                # Create the actual transaction record
-                new_transaction = Transaction(
-                    amount=rule.amount,
-                    type=category.type,
-                    date=next_due,
-                    description=rule.description,
-                    category_id=rule.category_id,
-                    owner_id=rule.owner_id
-                )
-                session.add(new_transaction)
-                created_count += 1
-                print(f"Created transaction for rule ID {rule.id} on date {next_due}")
-
-                # Create a notification for the user
-                notification_message = f"Recurring transaction '{rule.description}' of {rule.amount} generated for {next_due}."
-                new_notification = Notification(
-                    user_id=rule.owner_id,
-                    type=NotificationType.RECURRING_TX_GENERATED,
-                    message=notification_message,
-                    # Optional: Link notification to the generated transaction (requires flushing to get ID)
-                    # related_entity_id=new_transaction.id, # Need to flush first if ID is needed immediately
-                    # related_entity_type="transaction"
-                )
-                session.add(new_notification)
-
-                # Update the rule's last created date
-                rule.last_created_date = next_due
-                session.add(rule)
-
-                # Flush changes within the loop if needed (especially for async)
-                if settings.USE_ASYNC_DB:
-                    await session.flush() # type: ignore [union-attr]
-                else:
-                    session.flush() # type: ignore [union-attr]
-
-                # Calculate the *next* potential due date for the loop
-                next_due = get_next_due_date(rule.start_date, rule.last_created_date, rule.frequency)
-
-        # Commit happens automatically when exiting the session_scope context manager
+            result = session.execute(statement, transaction_rows) # type: ignore [union-attr]
+        return [tuple(row) for row in result.all()]
 
-    print(f"Recurring transaction generation complete. Created {created_count} transactions.")
-    return created_count
+    if dialect_name in ("mysql", "mariadb"):
+        # No RETURNING here: INSERT IGNORE row by row, a duplicate reports a rowcount of 0
+        statement = mysql.insert(Transaction).prefix_with("IGNORE")
+        inserted = []
+        for row in transaction_rows:
+            if settings.USE_ASYNC_DB:
+                result = await session.execute(statement, row) # type: ignore [union-attr]
+            else:
+                result = session.execute(statement, row) # type: ignore [union-attr]
+            if result.rowcount:
+                inserted.append((row["recurring_rule_id"], row["occurrence_date"]))
+        return inserted
+
+    # Other dialects: a plain INSERT. A duplicate violates the unique constraint and fails the
+    # chunk; its retry re-reads the rules, which the other run has advanced by then.
+    await _execute(session, insert(Transaction), transaction_rows)
+    return [(row["recurring_rule_id"], row["occurrence_date"]) for row in transaction_rows]
 
 # Note: Need to install python-dateutil: pip install python-dateutil
 # Add 'python-dateutil' to requirements.txt
@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import date
+from typing import Optional, Union, Any
+
+from sqlalchemy import delete, extract, func, insert, and_, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Transaction, MonthlyCategoryRollup, CategoryType
+from core.db import sync_session_scope, async_session_scope
+from core.config import settings
+from services.amount_sketch_service import SketchDelta, apply_sketch_delta, rebuild_amount_sketches
+from services.anomaly_service import rebuild_spending_stats
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# (owner_id, year, month, category_id, type)
+RollupKey = tuple[int, int, int, int, CategoryType]
+
+
+class RollupDelta:
+    """
+    Accumulates changes to monthly_category_rollup for one unit of work.
+    Write paths record every transaction they add (+1) or remove (-1), then call
+    apply_rollup_delta() before committing, so the rollup is updated in the same
+    DB transaction as the raw rows.
+    """
+
+    def __init__(self) -> None:
+        # key -> [amount delta, count delta]
+        self.changes: dict[RollupKey, list] = defaultdict(lambda: [0.0, 0])
+        # Individual amounts for the per-category amount sketches
+        self.sketches = SketchDelta()
+
+    def add(self, owner_id: int, tx_date: date, category_id: int, tx_type: CategoryType, amount: float, count: int = 1) -> None:
+        change = self.changes[(owner_id, tx_date.year, tx_date.month, category_id, CategoryType(tx_type))]
+        change[0] += amount
+        change[1] += count
+
+    def add_transaction(self, transaction: Transaction, sign: int = 1) -> None:
+        """Records a transaction being added (sign=1) or removed (sign=-1)."""
+        self.add(
+            transaction.owner_id, transaction.date, transaction.category_id, transaction.type,
+            sign * transaction.amount, sign
+        )
+        self.sketches.add(
+            (transaction.owner_id, transaction.date.year, transaction.date.month, transaction.category_id),
+            transaction.amount, sign
+        )
+
+
+def _dialect_name(session: DbSession) -> str:
+    return session.bind.dialect.name if session.bind is not None else ""
+
+def _upsert_statement(dialect_name: str) -> Optional[Any]:
+    """INSERT ... ON CONFLICT that adds the incoming sums onto an existing row, if the dialect supports it."""
+    table = MonthlyCategoryRollup.__table__
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key.columns],
+            set_={
+                "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+                "transaction_count": table.c.transaction_count + stmt.excluded.transaction_count,
+            },
+        )
+    if dialect_name in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            total_amount=table.c.total_amount + stmt.inserted.total_amount,
+            transaction_count=table.c.transaction_count + stmt.inserted.transaction_count,
+        )
+    return None
+
+async def apply_rollup_delta(session: DbSession, delta: RollupDelta) -> None:
+    """
+    Applies accumulated changes to monthly_category_rollup (and the amount sketches) within the
+    caller's transaction. Does not commit; the caller commits together with its raw transaction rows.
+    """
+    await apply_sketch_delta(session, delta.sketches)
+
+    rows = [
+        {
+            "owner_id": owner_id, "year": year, "month": month, "category_id": category_id, "type": tx_type,
+            "total_amount": amount, "transaction_count": count,
+        }
+        for (owner_id, year, month, category_id, tx_type), (amount, count) in delta.changes.items()
+        if count != 0 or amount != 0
+    ]
+    if not rows:
+        return
+
+    upsert = _upsert_statement(_dialect_name(session))
+    if upsert is not None:
+        # Atomic read-modify-write in the database, safe against concurrent writers
+        if settings.USE_ASYNC_DB:
+            await session.execute(upsert, rows) # type: ignore [union-attr]
+        else:
+            session.execute(upsert, rows) # type: ignore [union-attr]
+    else:
+        # Fallback for other dialects: ORM get-or-create
+        for row in rows:
+            key = (row["owner_id"], row["year"], row["month"], row["category_id"], row["type"])
+            if settings.USE_ASYNC_DB:
+                rollup = await session.get(MonthlyCategoryRollup, key) # type: ignore [union-attr]
+            else:
+                rollup = session.get(MonthlyCategoryRollup, key) # type: ignore [union-attr]
+            if rollup is None:
+                rollup = MonthlyCategoryRollup(**row)
+            else:
+                rollup.total_amount += row["total_amount"]
+                rollup.transaction_count += row["transaction_count"]
+            session.add(rollup)
+
+    # Drop rows whose last transaction was removed
+    emptied = [row for row in rows if row["transaction_count"] < 0]
+    if emptied:
+        cleanup = (
+            delete(MonthlyCategoryRollup)
+            .where(MonthlyCategoryRollup.transaction_count <= 0)
+            .where(or_(*[
+                and_(
+                    MonthlyCategoryRollup.owner_id == row["owner_id"],
+                    MonthlyCategoryRollup.year == row["year"],
+                    MonthlyCategoryRollup.month == row["month"],
+                    MonthlyCategoryRollup.category_id == row["category_id"],
+                    MonthlyCategoryRollup.type == row["type"],
+                )
+                for row in emptied
+            ]))
+        )
+        if settings.USE_ASYNC_DB:
+            await session.execute(cleanup) # type: ignore [union-attr]
+        else:
+            session.execute(cleanup) # type: ignore [union-attr]
+
+
+async def rebuild_monthly_rollups(session: Optional[DbSession] = None, owner_id: Optional[int] = None) -> int:
+    """
+    Regenerates monthly_category_rollup, category_amount_sketch and category_spending_stats from raw
+    transactions (for all users, or one owner).
+    Uses the given session without committing, or opens (and commits) its own session scope.
+    Returns the number of rollup rows written.
+    """
+    if session is None:
+        if settings.USE_ASYNC_DB:
+            async with async_session_scope() as scoped_session:
+                return await rebuild_monthly_rollups(scoped_session, owner_id)
+        with sync_session_scope() as scoped_session:
+            return await rebuild_monthly_rollups(scoped_session, owner_id)
+
+    clear = delete(MonthlyCategoryRollup)
+    aggregate = (
+        select(
+            Transaction.owner_id,
+            extract("year", Transaction.date),
+            extract("month", Transaction.date),
+            Transaction.category_id,
+            Transaction.type,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id),
+        )
+        .group_by(
+            Transaction.owner_id,
+            extract("year", Transaction.date),
+            extract("month", Transaction.date),
+            Transaction.category_id,
+            Transaction.type,
+        )
+    )
+    if owner_id is not None:
+        clear = clear.where(MonthlyCategoryRollup.owner_id == owner_id)
+        aggregate = aggregate.where(Transaction.owner_id == owner_id)
+
+    fill = insert(MonthlyCategoryRollup).from_select(
+        ["owner_id", "year", "month", "category_id", "type", "total_amount", "transaction_count"],
+        aggregate,
+    )
+    count_rows = select(func.count()).select_from(MonthlyCategoryRollup)
+    if owner_id is not None:
+        count_rows = count_rows.where(MonthlyCategoryRollup.owner_id == owner_id)
+
+    if settings.USE_ASYNC_DB:
+        await session.execute(clear) # type: ignore [union-attr]
+        await session.execute(fill) # type: ignore [union-attr]
+        written = (await session.exec(count_rows)).one() # type: ignore [union-attr]
+    else:
+        session.execute(clear) # type: ignore [union-attr]
+        session.execute(fill) # type: ignore [union-attr]
+        written = session.exec(count_rows).one() # type: ignore [union-attr]
+    await rebuild_amount_sketches(session, owner_id)
+    await rebuild_spending_stats(session, owner_id)
+    return written
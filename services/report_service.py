@@ -0,0 +1,213 @@
+import calendar
+from datetime import date, timedelta
+from typing import List, Optional, Union
+
+from sqlalchemy import and_, case, or_
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import exec_concurrently
+from core.config import settings
+from models import Transaction, Category, CategoryType, MonthlyCategoryRollup, CategoryClosure
+from dto.report_dto import MonthlyReport, YearlyReport, CategorySummary
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+
+# Report computations shared by the report endpoints (routers/reports.py) and the report
+# snapshot job (services/report_snapshot_service.py).
+
+# --- Category Totals for a Period ---
+
+def _category_totals_statement(user_id: int, start_date: date, end_date: date):
+    """
+    Single aggregate query for a period: income and expense sums per category.
+    SUM(CASE ...) on `type` replaces loading every Transaction plus two GROUP BY queries.
+    Outer join so transactions whose category was deleted still count towards the totals.
+    """
+    income_amount = func.sum(case((Transaction.type == CategoryType.INCOME, Transaction.amount), else_=0.0))
+    expense_amount = func.sum(case((Transaction.type == CategoryType.EXPENSE, Transaction.amount), else_=0.0))
+    return (
+        select(
+            Transaction.category_id,
+            Category.name.label("category_name"),
+            income_amount.label("income_amount"),
+            expense_amount.label("expense_amount"),
+        )
+        .outerjoin(Category, Category.id == Transaction.category_id)
+        .where(Transaction.owner_id == user_id)
+        .where(Transaction.date >= start_date)
+        .where(Transaction.date <= end_date)
+        .group_by(Transaction.category_id, Category.name)
+    )
+
+def summarize_category_rows(
+    rows: List[tuple]
+) -> tuple[float, float, List[CategorySummary], List[CategorySummary]]:
+    """Folds (category_id, category_name, income_amount, expense_amount) rows into totals and breakdowns."""
+    total_income = 0.0
+    total_expense = 0.0
+    income_by_category: List[CategorySummary] = []
+    expense_by_category: List[CategorySummary] = []
+    for category_id, category_name, income_amount, expense_amount in rows:
+        income_amount = income_amount or 0.0
+        expense_amount = expense_amount or 0.0
+        total_income += income_amount
+        total_expense += expense_amount
+        if category_name is None:
+            continue # Orphaned transactions count towards totals only
+        if income_amount:
+            income_by_category.append(CategorySummary(category_id=category_id, category_name=category_name, total_amount=income_amount))
+        if expense_amount:
+            expense_by_category.append(CategorySummary(category_id=category_id, category_name=category_name, total_amount=expense_amount))
+
+    # Largest categories first
+    income_by_category.sort(key=lambda summary: summary.total_amount, reverse=True)
+    expense_by_category.sort(key=lambda summary: summary.total_amount, reverse=True)
+    return total_income, total_expense, income_by_category, expense_by_category
+
+def _rollup_totals_statement(user_id: int, first_month: date, last_month: date):
+    """Same shape as _category_totals_statement, but read from monthly_category_rollup for whole months."""
+    month_index = MonthlyCategoryRollup.year * 12 + MonthlyCategoryRollup.month
+    income_amount = func.sum(case((MonthlyCategoryRollup.type == CategoryType.INCOME, MonthlyCategoryRollup.total_amount), else_=0.0))
+    expense_amount = func.sum(case((MonthlyCategoryRollup.type == CategoryType.EXPENSE, MonthlyCategoryRollup.total_amount), else_=0.0))
+    return (
+        select(
+            MonthlyCategoryRollup.category_id,
+            Category.name.label("category_name"),
+            income_amount.label("income_amount"),
+            expense_amount.label("expense_amount"),
+        )
+        .outerjoin(Category, Category.id == MonthlyCategoryRollup.category_id)
+        .where(MonthlyCategoryRollup.owner_id == user_id)
+        .where(month_index >= first_month.year * 12 + first_month.month)
+        .where(month_index <= last_month.year * 12 + last_month.month)
+        .group_by(MonthlyCategoryRollup.category_id, Category.name)
+    )
+
+def _split_whole_months(start_date: date, end_date: date) -> tuple[Optional[tuple[date, date]], List[tuple[date, date]]]:
+    """
+    Splits [start_date, end_date] into the span of whole calendar months it covers
+    (first day of the first month, first day of the last month) and the partial-month edges.
+    """
+    first_full = start_date if start_date.day == 1 else date(start_date.year + start_date.month // 12, start_date.month % 12 + 1, 1)
+    end_is_month_end = end_date.day == calendar.monthrange(end_date.year, end_date.month)[1]
+    last_full = end_date.replace(day=1) if end_is_month_end else (end_date.replace(day=1) - timedelta(days=1)).replace(day=1)
+    if first_full > last_full:
+        return None, [(start_date, end_date)] # No whole month inside the range
+
+    edges = []
+    if start_date < first_full:
+        edges.append((start_date, first_full - timedelta(days=1)))
+    last_full_end = date(last_full.year, last_full.month, calendar.monthrange(last_full.year, last_full.month)[1])
+    if last_full_end < end_date:
+        edges.append((last_full_end + timedelta(days=1), end_date))
+    return (first_full, last_full), edges
+
+def merge_category_rows(*row_sets: List[tuple]) -> List[tuple]:
+    """Adds up (category_id, category_name, income_amount, expense_amount) rows from several sources."""
+    merged: dict[tuple, list] = {}
+    for rows in row_sets:
+        for category_id, category_name, income_amount, expense_amount in rows:
+            totals = merged.setdefault((category_id, category_name), [0.0, 0.0])
+            totals[0] += income_amount or 0.0
+            totals[1] += expense_amount or 0.0
+    return [(category_id, category_name, income, expense) for (category_id, category_name), (income, expense) in merged.items()]
+
+def _roll_up_to_level(statement, level: int):
+    """
+    Re-groups (category_id, category_name, income_amount, expense_amount) rows onto each category's
+    ancestor at tree depth `level` in the same query, via one category_closure row per category.
+    Categories at or above that level keep their own row.
+    """
+    rows = statement.subquery()
+    ancestor = aliased(Category)
+    ancestor_at_level = and_(
+        CategoryClosure.descendant_id == rows.c.category_id,
+        or_(
+            CategoryClosure.ancestor_depth == level,
+            and_(CategoryClosure.distance == 0, CategoryClosure.ancestor_depth < level),
+        ),
+    )
+    # No closure row (orphaned transactions): keep the row as it is
+    category_id = func.coalesce(ancestor.id, rows.c.category_id)
+    category_name = func.coalesce(ancestor.name, rows.c.category_name)
+    return (
+        select(
+            category_id.label("category_id"),
+            category_name.label("category_name"),
+            func.sum(rows.c.income_amount).label("income_amount"),
+            func.sum(rows.c.expense_amount).label("expense_amount"),
+        )
+        .select_from(rows)
+        .outerjoin(CategoryClosure, ancestor_at_level)
+        .outerjoin(ancestor, ancestor.id == CategoryClosure.ancestor_id)
+        .group_by(category_id, category_name)
+    )
+
+async def fetch_category_rows(
+    session: DbSession, user_id: int, start_date: date, end_date: date, level: Optional[int] = None
+) -> List[tuple]:
+    """
+    Per-category (category_id, category_name, income_amount, expense_amount) rows for a period.
+    Whole months come from the monthly rollup; only partial-month edges hit raw transactions.
+    With REPORTS_USE_ANALYTICS_SNAPSHOT, rows are computed from the user's in-memory snapshot instead.
+    With `level`, categories are rolled up to their ancestor at that depth of the category tree.
+    """
+    if settings.REPORTS_USE_ANALYTICS_SNAPSHOT and level is None:
+        from services.analytics_service import get_snapshot # Loads NumPy: only when snapshots are enabled
+        snapshot = await get_snapshot(session, user_id)
+        return snapshot.category_rows(start_date, end_date)
+
+    statements = []
+    whole_months, edges = _split_whole_months(start_date, end_date) if settings.REPORTS_USE_ROLLUP else (None, [(start_date, end_date)])
+    if whole_months:
+        statements.append(_rollup_totals_statement(user_id, *whole_months))
+    statements.extend(_category_totals_statement(user_id, edge_start, edge_end) for edge_start, edge_end in edges)
+    if level is not None:
+        statements = [_roll_up_to_level(statement, level) for statement in statements]
+
+    # The rollup and edge queries are independent; run them in parallel where the DB allows
+    row_sets = await exec_concurrently(session, statements)
+    return row_sets[0] if len(row_sets) == 1 else merge_category_rows(*row_sets)
+
+async def generate_report_data( # Changed to async def
+    session: DbSession, user_id: int, start_date: date, end_date: date, level: Optional[int] = None
+) -> tuple[float, float, List[CategorySummary], List[CategorySummary]]:
+    """Helper to calculate totals and breakdowns for a given period and user."""
+    # Plain row tuples, no ORM instances are materialized
+    rows = await fetch_category_rows(session, user_id, start_date, end_date, level)
+    return summarize_category_rows(rows)
+
+
+async def build_monthly_report(session: DbSession, user_id: int, year: int, month: int, level: Optional[int] = None) -> MonthlyReport:
+    """Computes a MonthlyReport (used by the /reports/monthly endpoint and the report snapshot job)."""
+    start_date = date(year, month, 1)
+    end_date = date(year, month, calendar.monthrange(year, month)[1])
+    total_income, total_expense, income_by_category, expense_by_category = await generate_report_data(
+        session, user_id, start_date, end_date, level
+    )
+    return MonthlyReport(
+        year=year,
+        month=month,
+        total_income=total_income,
+        total_expense=total_expense,
+        net_balance=total_income - total_expense,
+        income_by_category=income_by_category,
+        expense_by_category=expense_by_category
+    )
+
+async def build_yearly_report(session: DbSession, user_id: int, year: int, level: Optional[int] = None) -> YearlyReport:
+    """Computes a YearlyReport (used by the /reports/yearly endpoint and the report snapshot job)."""
+    total_income, total_expense, income_by_category, expense_by_category = await generate_report_data(
+        session, user_id, date(year, 1, 1), date(year, 12, 31), level
+    )
+    return YearlyReport(
+        year=year,
+        total_income=total_income,
+        total_expense=total_expense,
+        net_balance=total_income - total_expense,
+        income_by_category=income_by_category,
+        expense_by_category=expense_by_category
+    )
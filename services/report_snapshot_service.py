@@ -0,0 +1,153 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Type, TypeVar, Union
+
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Transaction, ReportSnapshot, User
+from core.db import sync_session_scope, async_session_scope
+from core.config import settings
+from services.data_version_service import get_data_version
+from services.report_service import build_monthly_report, build_yearly_report
+
+# Type hint for sync or async sessions
+DbSession = Union[Session, AsyncSession]
+ReportT = TypeVar("ReportT", bound=SQLModel)
+
+# --- Report Snapshots ---
+# At the start of a month most users open last month's report at about the same time.
+# The nightly job precomputes last month's report and the current year's report for recently
+# active users, so those requests become a single primary-key lookup.
+
+def monthly_period(year: int, month: int) -> str:
+    return f"{year}-{month:02d}"
+
+def yearly_period(year: int) -> str:
+    return str(year)
+
+
+async def get_report_snapshot(
+    session: DbSession, user_id: int, kind: str, period: str, data_version: int, model: Type[ReportT]
+) -> Optional[ReportT]:
+    """Returns the stored report if it was computed at the user's current data_version."""
+    if settings.USE_ASYNC_DB:
+        snapshot = await session.get(ReportSnapshot, (user_id, kind, period)) # type: ignore [union-attr]
+    else:
+        snapshot = session.get(ReportSnapshot, (user_id, kind, period)) # type: ignore [union-attr]
+    if snapshot is None or snapshot.data_version != data_version:
+        return None
+    return model.model_validate(snapshot.payload)
+
+
+async def _active_user_ids(session: DbSession, since: datetime) -> List[int]:
+    """Users who added transactions since `since` (created_at is set on every insert)."""
+    statement = select(Transaction.owner_id).where(Transaction.created_at >= since).distinct().order_by(Transaction.owner_id)
+    if settings.USE_ASYNC_DB:
+        return list((await session.exec(statement)).all()) # type: ignore [union-attr]
+    return list(session.exec(statement).all()) # type: ignore [union-attr]
+
+async def snapshot_user_reports(session: DbSession, user_id: int, as_of: date) -> None:
+    """Computes and stores last month's and the current year's report for one user. Does not commit."""
+    last_month = as_of.replace(day=1) - timedelta(days=1)
+    data_version = await get_data_version(session, user_id)
+    reports = [
+        ("monthly", monthly_period(last_month.year, last_month.month),
+         await build_monthly_report(session, user_id, last_month.year, last_month.month)),
+        ("yearly", yearly_period(as_of.year), await build_yearly_report(session, user_id, as_of.year)),
+    ]
+    for kind, period, report in reports:
+        snapshot = ReportSnapshot(
+            owner_id=user_id, kind=kind, period=period, data_version=data_version,
+            payload=report.model_dump(mode="json"), computed_at=datetime.utcnow(),
+        )
+        if settings.USE_ASYNC_DB:
+            await session.merge(snapshot) # type: ignore [union-attr]
+        else:
+            session.merge(snapshot) # type: ignore [union-attr]
+
+
+async def precompute_report_snapshots(
+    as_of: Optional[date] = None,
+    active_days: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> int:
+    """
+    Scheduler job: snapshots reports for users active in the last `active_days` days.
+    Returns the number of users snapshotted.
+    """
+    as_of = as_of or date.today()
+    active_days = active_days or settings.REPORT_SNAPSHOT_ACTIVE_DAYS
+    since = datetime.utcnow() - timedelta(days=active_days)
+
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            user_ids = await _active_user_ids(session, since)
+    else:
+        with sync_session_scope() as session:
+            user_ids = await _active_user_ids(session, since)
+    print(f"Precomputing report snapshots for {len(user_ids)} active users (as of {as_of}).")
+    written = await snapshot_users(user_ids, as_of, chunk_size, concurrency)
+    print(f"Report snapshots complete for {written} users.")
+    return written
+
+async def snapshot_users(user_ids: List[int], as_of: date, chunk_size: Optional[int] = None, concurrency: Optional[int] = None) -> int:
+    """
+    Snapshots the given users' reports in chunks; in async mode up to `concurrency` users of a
+    chunk run at once (one at a time in sync mode). Each user gets its own session and
+    transaction, so one failure doesn't roll back the others. Returns the number of users snapshotted.
+    """
+    chunk_size = chunk_size or settings.REPORT_SNAPSHOT_CHUNK_SIZE
+    concurrency = concurrency or settings.REPORT_SNAPSHOT_CONCURRENCY
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def snapshot_one(user_id: int) -> bool:
+        async with semaphore:
+            try:
+                if settings.USE_ASYNC_DB:
+                    async with async_session_scope() as session:
+                        await snapshot_user_reports(session, user_id, as_of)
+                else:
+                    with sync_session_scope() as session:
+                        await snapshot_user_reports(session, user_id, as_of)
+                return True
+            except Exception as e:
+                print(f"Report snapshot failed for user {user_id}: {e}")
+                return False
+
+    written = 0
+    for chunk_start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[chunk_start:chunk_start + chunk_size]
+        if settings.USE_ASYNC_DB:
+            written += sum(await asyncio.gather(*(snapshot_one(user_id) for user_id in chunk)))
+        else:
+            # Sync sessions block the event loop anyway
+            for user_id in chunk:
+                written += await snapshot_one(user_id)
+    return written
+
+async def refresh_stale_snapshots(timezones: List[str], as_of: date) -> int:
+    """
+    Recomputes the snapshots of users in `timezones` whose data changed since they were taken,
+    e.g. by recurring generation at their local midnight, which for most time zones comes after
+    the nightly run. Only users that already have snapshots are considered. Returns the number
+    of users snapshotted.
+    """
+    statement = (
+        select(ReportSnapshot.owner_id)
+        .join(User, User.id == ReportSnapshot.owner_id)
+        .where(User.timezone.in_(timezones), ReportSnapshot.data_version != User.data_version)
+        .distinct().order_by(ReportSnapshot.owner_id)
+    )
+    if settings.USE_ASYNC_DB:
+        async with async_session_scope() as session:
+            user_ids = list((await session.exec(statement)).all()) # type: ignore [union-attr]
+    else:
+        with sync_session_scope() as session:
+            user_ids = list(session.exec(statement).all()) # type: ignore [union-attr]
+    if not user_ids:
+        return 0
+    written = await snapshot_users(user_ids, as_of)
+    print(f"Refreshed stale report snapshots for {written} users (as of {as_of}).")
+    return written
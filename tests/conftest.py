@@ -20,6 +20,11 @@ from core.db import get_db_session, sync_engine as app_sync_engine, async_engine
 # Import all models to ensure they are registered with SQLModel metadata
 import models # noqa
 
+# The app's lifespan starts the scheduler: keep its jobs in memory and skip leader election,
+# so tests never write to the development database
+settings.SCHEDULER_JOB_STORE = "memory"
+settings.SCHEDULER_LEADER_ELECTION = False
+
 
 # --- Test Database Setup ---
 
@@ -55,6 +60,16 @@ async def setup_test_database():
         yield
         SQLModel.metadata.drop_all(test_sync_engine)
 
+# Cached reports and analytics snapshots are keyed by user id and data version, which restart with every
+# fresh test database, so don't let results leak between tests
+@pytest.fixture(scope="function", autouse=True)
+def clear_report_cache():
+    from core.cache import report_cache
+    from services.analytics_service import snapshot_cache
+    report_cache.clear()
+    snapshot_cache.clear()
+    yield
+
 # Fixture to provide the correct session type based on settings
 # Use pytest_asyncio.fixture for async fixtures
 @pytest_asyncio.fixture(scope="function")
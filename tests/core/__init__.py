@@ -0,0 +1 @@
+# Makes 'core' test subdirectory a Python package
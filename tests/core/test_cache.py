@@ -0,0 +1,67 @@
+import pytest
+
+from core.cache import ReportCache
+from dto.report_dto import MonthlyReport
+
+# --- ReportCache Tests (in-process tier only) ---
+
+@pytest.mark.asyncio
+async def test_report_cache_hit_and_miss_metrics():
+    """Lookups are counted and the hit ratio reflects them."""
+    cache = ReportCache(max_entries=10)
+    key = ReportCache.make_key(1, "monthly", "2024-01-01", "2024-01-31", version=3)
+    assert key == "report:1:monthly:2024-01-01:2024-01-31:v3"
+
+    assert await cache.get(key, MonthlyReport) is None
+    report = MonthlyReport(year=2024, month=1, total_income=10.0)
+    await cache.set(key, report)
+    assert await cache.get(key, MonthlyReport) == report
+
+    stats = cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["shared_tier"] is False
+
+@pytest.mark.asyncio
+async def test_report_cache_new_version_misses():
+    """Bumping the data version makes old entries unreachable without touching them."""
+    cache = ReportCache(max_entries=10)
+    await cache.set(ReportCache.make_key(1, "yearly", 2024, version=0), MonthlyReport(year=2024, month=1))
+    assert await cache.get(ReportCache.make_key(1, "yearly", 2024, version=1), MonthlyReport) is None
+
+@pytest.mark.asyncio
+async def test_report_cache_lru_eviction():
+    """The in-process tier keeps at most max_entries, evicting the least recently used."""
+    cache = ReportCache(max_entries=2)
+    for key in ("a", "b"):
+        await cache.set(key, MonthlyReport(year=2024, month=1))
+    await cache.get("a", MonthlyReport) # "b" becomes least recently used
+    await cache.set("c", MonthlyReport(year=2024, month=2))
+    assert await cache.get("b", MonthlyReport) is None
+    assert await cache.get("a", MonthlyReport) is not None
+    assert cache.stats()["entries"] == 2
+
+@pytest.mark.asyncio
+async def test_report_cache_disabled():
+    """REPORT_CACHE_SIZE=0 disables the in-process tier."""
+    cache = ReportCache(max_entries=0)
+    await cache.set("a", MonthlyReport(year=2024, month=1))
+    assert await cache.get("a", MonthlyReport) is None
+
+@pytest.mark.asyncio
+async def test_health_reports_cache_metrics(client):
+    """GET /health exposes the report cache's hit/miss counters and hit ratio."""
+    from core.cache import report_cache
+
+    key = ReportCache.make_key(1, "monthly", "2024-01-01", "2024-01-31", version=1)
+    assert await report_cache.get(key, MonthlyReport) is None
+    await report_cache.set(key, MonthlyReport(year=2024, month=1))
+    assert await report_cache.get(key, MonthlyReport) is not None
+    assert await report_cache.get(key, MonthlyReport) is not None
+
+    response = client.get("/health")
+    assert response.status_code == 200
+    cache_stats = response.json()["report_cache"]
+    assert (cache_stats["local_hits"], cache_stats["misses"], cache_stats["entries"]) == (2, 1, 1)
+    assert cache_stats["hit_ratio"] == pytest.approx(2 / 3)
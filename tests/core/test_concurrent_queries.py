@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import literal, literal_column, table
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import select
+
+import core.db
+from core.config import settings
+from core.db import exec_concurrently
+
+pytestmark = pytest.mark.skipif(not settings.USE_ASYNC_DB, reason="Concurrent queries need async mode")
+
+# --- Fixtures ---
+
+@pytest.fixture
+def tracked_sessions(monkeypatch):
+    """Replaces the per-query AsyncSession with one that records how many queries overlap."""
+    stats = {"active": 0, "peak": 0, "opened": 0}
+
+    class TrackedSession(core.db.AsyncSession):
+        async def exec(self, statement, *args, **kwargs):
+            stats["opened"] += 1
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+            try:
+                await asyncio.sleep(0.01) # Let the other queries start
+                return await super().exec(statement, *args, **kwargs)
+            finally:
+                stats["active"] -= 1
+
+    monkeypatch.setattr(core.db, "AsyncSession", TrackedSession)
+    monkeypatch.setattr(core.db, "_SERIAL_DIALECTS", set()) # Treat the file-backed SQLite DB like a server DB
+    return stats
+
+@pytest_asyncio.fixture
+async def file_session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'concurrent.db'}", poolclass=NullPool)
+    async with core.db.AsyncSession(engine) as session:
+        yield session
+    await engine.dispose()
+
+# --- Tests ---
+
+@pytest.mark.asyncio
+async def test_results_keep_statement_order_and_respect_limit(file_session, tracked_sessions):
+    statements = [select(literal(value)) for value in range(5)]
+    results = await exec_concurrently(file_session, statements, limit=2)
+    assert results == [[0], [1], [2], [3], [4]]
+    assert tracked_sessions["opened"] == 5 # One session per statement
+    assert tracked_sessions["peak"] == 2
+
+@pytest.mark.asyncio
+async def test_failure_cancels_siblings_and_surfaces_db_error(file_session, tracked_sessions):
+    statements = [select(literal(1)), select(literal_column("x")).select_from(table("missing_table")), select(literal(3))]
+    with pytest.raises(Exception) as exc_info:
+        await exec_concurrently(file_session, statements, limit=3)
+    assert not isinstance(exc_info.value, ExceptionGroup)
+    assert "missing_table" in str(exc_info.value)
+    assert tracked_sessions["active"] == 0
+
+@pytest.mark.asyncio
+async def test_sqlite_runs_sequentially_on_the_request_session(session, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("No extra sessions expected for SQLite")
+    monkeypatch.setattr(core.db, "AsyncSession", fail)
+    results = await exec_concurrently(session, [select(literal(1)), select(literal(2))])
+    assert results == [[1], [2]]
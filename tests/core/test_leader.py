@@ -0,0 +1,137 @@
+import time
+
+import pytest
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, create_engine
+
+from core.leader import LeaderElection
+from models import SchedulerLease
+
+# --- Fixtures ---
+
+@pytest.fixture
+def lease_engine(tmp_path):
+    """A file-backed SQLite DB shared by several 'processes' (LeaderElection instances)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'leader.db'}", poolclass=NullPool)
+    SQLModel.metadata.create_all(engine, tables=[SchedulerLease.__table__])
+    yield engine
+    engine.dispose()
+
+# --- Tests (lease-based election) ---
+
+def test_only_one_process_leads(lease_engine):
+    """Of several processes heartbeating against the same lease, exactly one is the leader."""
+    processes = [LeaderElection("jobs", engine=lease_engine, ttl_seconds=30) for _ in range(4)]
+    assert [process.heartbeat() for process in processes] == [True, False, False, False]
+    # Renewing keeps the same leader
+    assert [process.heartbeat() for process in processes] == [True, False, False, False]
+    assert processes[0].current_leader()["holder"] == processes[0].holder_id
+
+def test_expired_lease_fails_over(lease_engine):
+    """When the leader stops heartbeating, the next process to heartbeat after the TTL takes over."""
+    leader = LeaderElection("jobs", engine=lease_engine, ttl_seconds=1)
+    follower = LeaderElection("jobs", engine=lease_engine, ttl_seconds=1)
+    assert leader.heartbeat() and not follower.heartbeat()
+
+    time.sleep(1.1) # The leader "dies": no more heartbeats
+    assert leader.current_leader() is None
+    assert follower.heartbeat()
+    assert follower.current_leader()["holder"] == follower.holder_id
+    # The old leader learns it lost the lease on its next heartbeat
+    assert not leader.heartbeat()
+
+def test_release_hands_over_immediately(lease_engine):
+    """A leader shutting down gives up its lease instead of letting others wait for it to expire."""
+    leader = LeaderElection("jobs", engine=lease_engine, ttl_seconds=30)
+    follower = LeaderElection("jobs", engine=lease_engine, ttl_seconds=30)
+    assert leader.heartbeat() and not follower.heartbeat()
+
+    leader.release()
+    assert not leader.is_leader
+    assert follower.heartbeat()
+
+def test_separate_elections_are_independent(lease_engine):
+    first = LeaderElection("jobs", engine=lease_engine)
+    second = LeaderElection("other", engine=lease_engine)
+    assert first.heartbeat() and second.heartbeat()
+
+@pytest.mark.asyncio
+async def test_health_reports_leader(lease_engine, monkeypatch):
+    """/health shows this process' election state and the current leader."""
+    import core.leader
+    from core import create_app
+    from core.config import settings
+
+    election = LeaderElection("scheduler", engine=lease_engine)
+    monkeypatch.setattr(core.leader, "scheduler_leader", election)
+    monkeypatch.setattr(settings, "SERVERLESS", False)
+    monkeypatch.setattr(settings, "SCHEDULER_LEADER_ELECTION", True)
+    health = next(route.endpoint for route in create_app().routes if getattr(route, "path", None) == "/health")
+
+    assert (await health())["scheduler"]["leader"] is None
+    await election.confirm()
+    response = await health()
+    assert response["status"] == "ok"
+    assert response["scheduler"]["is_leader"] is True
+    assert response["scheduler"]["leader"]["holder"] == election.holder_id == response["scheduler"]["this_process"]
+
+# --- Tests (advisory lock) ---
+
+@pytest.fixture
+def advisory_lock_engine(tmp_path, monkeypatch):
+    """
+    A pooled SQLite engine with PostgreSQL's session-level advisory lock functions emulated:
+    a lock belongs to the DBAPI connection that took it and is only released when that
+    connection is actually closed (returning it to the pool keeps it).
+    """
+    from sqlalchemy import event
+    from sqlalchemy.pool import QueuePool
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'leader.db'}", poolclass=QueuePool)
+    locks: dict[int, object] = {}
+
+    @event.listens_for(engine, "connect")
+    def add_lock_functions(dbapi_connection, connection_record):
+        def try_lock(key):
+            if locks.get(key, dbapi_connection) is not dbapi_connection:
+                return False
+            locks[key] = dbapi_connection
+            return True
+
+        def unlock(key):
+            return locks.pop(key, None) is not None
+
+        dbapi_connection.create_function("pg_try_advisory_lock", 1, try_lock)
+        dbapi_connection.create_function("pg_advisory_unlock", 1, unlock)
+
+    @event.listens_for(engine, "close")
+    def release_session_locks(dbapi_connection, connection_record):
+        for key in [key for key, holder in locks.items() if holder is dbapi_connection]:
+            del locks[key]
+
+    SQLModel.metadata.create_all(engine, tables=[SchedulerLease.__table__])
+    monkeypatch.setattr(LeaderElection, "_uses_advisory_lock", lambda self: True)
+    engine.advisory_locks = locks
+    yield engine
+    engine.dispose()
+
+def test_failed_heartbeat_releases_advisory_lock(advisory_lock_engine):
+    """If the heartbeat fails after taking the lock, the lock doesn't stay behind on a pooled connection."""
+    leader = LeaderElection("jobs", engine=advisory_lock_engine)
+
+    locked_at_failure = []
+
+    def lease_write_fails(take_over):
+        locked_at_failure.append(bool(advisory_lock_engine.advisory_locks))
+        raise RuntimeError("lost connection")
+
+    leader._renew_lease = lease_write_fails
+    assert not leader.heartbeat()
+    assert locked_at_failure == [True]
+    assert advisory_lock_engine.advisory_locks == {}
+
+    follower = LeaderElection("jobs", engine=advisory_lock_engine)
+    assert follower.heartbeat()
+    assert advisory_lock_engine.advisory_locks != {}
+    follower.release()
+    assert advisory_lock_engine.advisory_locks == {}
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+
+import pytest
+from sqlalchemy.pool import NullPool
+from sqlmodel import create_engine
+
+import core # noqa: F401 (loads the app modules in dependency order)
+import core.db
+from core import scheduler as scheduler_module
+from core.config import settings
+
+# --- Tests ---
+
+@pytest.mark.asyncio
+async def test_missed_run_is_caught_up_after_restart(tmp_path, monkeypatch):
+    """With the database job store, a run that fell due while the app was down executes once on the next start."""
+    job_engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", poolclass=NullPool)
+    monkeypatch.setattr(core.db, "get_sync_engine", lambda: job_engine)
+    monkeypatch.setattr(settings, "SCHEDULER_JOB_STORE", "sqlalchemy")
+    monkeypatch.setattr(settings, "SCHEDULER_LEADER_ELECTION", False)
+    runs = []
+
+    async def fake_generation() -> int:
+        runs.append(datetime.now(timezone.utc))
+        return 3
+
+    async def fake_record_job_run(job_id, job, *args, **kwargs):
+        return await job(*args)
+
+    monkeypatch.setattr(scheduler_module, "generate_due_for_new_local_days", fake_generation)
+    monkeypatch.setattr(scheduler_module, "record_job_run", fake_record_job_run)
+    scheduler = scheduler_module.scheduler
+
+    # First start: the jobs are written to the job store
+    await scheduler_module.start_scheduler()
+    scheduler.pause()
+    # Pretend the hourly run came while the app was down: it is a few minutes overdue
+    scheduler.modify_job(scheduler_module.RECURRING_JOB_ID, next_run_time=datetime.now(timezone.utc) - timedelta(minutes=5))
+    await scheduler_module.shutdown_scheduler()
+    assert runs == []
+
+    try:
+        # Restart: the stored job (and its overdue run) is kept rather than rescheduled
+        await scheduler_module.start_scheduler()
+        for _ in range(50):
+            if runs:
+                break
+            await asyncio.sleep(0.05)
+        assert len(runs) == 1
+        assert scheduler.get_job(scheduler_module.RECURRING_JOB_ID).next_run_time > datetime.now(timezone.utc)
+    finally:
+        await scheduler_module.shutdown_scheduler()
+        job_engine.dispose()
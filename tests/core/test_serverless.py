@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# --- Helpers ---
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# Upper bound for importing the app in serverless mode. Generous enough for slow CI
+# machines, but catches regressions like eager engine/scheduler setup.
+COLD_START_BUDGET_SECONDS = 5.0
+
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import manage
+elapsed = time.perf_counter() - start
+import core.db
+print(json.dumps({
+    "elapsed": elapsed,
+    "sync_engine_created": core.db._sync_engine is not None,
+    "async_engine_created": core.db._async_engine is not None,
+    "apscheduler_imported": "apscheduler" in sys.modules,
+    "numpy_imported": "numpy" in sys.modules,
+}))
+"""
+
+LIFESPAN_SCRIPT = """
+import asyncio, json, sys
+import manage
+from core.db import get_sync_engine
+
+async def run_lifespan():
+    async with manage.app.router.lifespan_context(manage.app):
+        pass
+
+asyncio.run(run_lifespan())
+print(json.dumps({
+    "apscheduler_imported": "apscheduler" in sys.modules,
+    "poolclass": type(get_sync_engine().pool).__name__,
+}))
+"""
+
+def _run_serverless(script: str, tmp_path: Path) -> tuple[dict, str]:
+    """Runs a script in a fresh interpreter with SERVERLESS enabled, returns (last JSON line, stdout)."""
+    env = dict(os.environ)
+    env["SERVERLESS"] = "1"
+    env["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_path / 'serverless.db'}"
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.strip().splitlines()
+    return json.loads(lines[-1]), result.stdout
+
+# --- Tests ---
+
+def test_serverless_cold_start(tmp_path: Path):
+    """Importing the app in serverless mode is fast and does no DB/scheduler setup or NumPy import."""
+    data, stdout = _run_serverless(COLD_START_SCRIPT, tmp_path)
+    assert data["sync_engine_created"] is False
+    assert data["async_engine_created"] is False
+    assert data["apscheduler_imported"] is False
+    assert data["numpy_imported"] is False # Only the analytics/forecast code paths load it
+    assert "--- Configuration ---" not in stdout
+    assert data["elapsed"] < COLD_START_BUDGET_SECONDS
+
+def test_serverless_lifespan_skips_scheduler_and_uses_null_pool(tmp_path: Path):
+    """Lifespan does not start APScheduler and engines don't keep a connection pool."""
+    data, _ = _run_serverless(LIFESPAN_SCRIPT, tmp_path)
+    assert data["apscheduler_imported"] is False
+    assert data["poolclass"] == "NullPool"
@@ -199,3 +199,44 @@ async def test_update_user_password_unauthenticated(client: TestClient): # Mark
     pw_change_data = {"current_password": "any", "new_password": "any"}
     response = client.put("/auth/users/me/password", json=pw_change_data) # REMOVE await
     assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_update_timezone(client: TestClient, session: DbSession, monkeypatch):
+    """Users set an IANA time zone (default UTC); unknown names are rejected, anonymous requests refused."""
+    from contextlib import asynccontextmanager, contextmanager
+    from middlewares import auth as auth_middleware
+    from core.limiter import limiter
+
+    # The auth middleware loads the user through its own session scopes: point them at the test database
+    @asynccontextmanager
+    async def test_async_scope():
+        yield session
+
+    @contextmanager
+    def test_sync_scope():
+        yield session
+
+    monkeypatch.setattr(auth_middleware, "async_session_scope", test_async_scope)
+    monkeypatch.setattr(auth_middleware, "sync_session_scope", test_sync_scope)
+    limiter.reset() # Earlier tests may have used up this client's login attempts for the minute
+
+    email = "timezone@example.com"
+    password = "passwordtz"
+    reg_response = client.post("/auth/register", json={"email": email, "password": password})
+    assert reg_response.status_code == 201
+    assert reg_response.json()["timezone"] == "UTC"
+    token_response = client.post("/auth/token", data={"username": email, "password": password})
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+
+    response = client.put("/auth/users/me/timezone", json={"timezone": "Asia/Jakarta"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["timezone"] == "Asia/Jakarta"
+    if settings.USE_ASYNC_DB:
+        user_in_db = await session.get(User, response.json()["id"]) # type: ignore [union-attr]
+    else:
+        user_in_db = session.get(User, response.json()["id"]) # type: ignore [union-attr]
+    assert user_in_db.timezone == "Asia/Jakarta"
+
+    invalid = client.put("/auth/users/me/timezone", json={"timezone": "Mars/Olympus_Mons"}, headers=headers)
+    assert invalid.status_code == 422
+    assert client.put("/auth/users/me/timezone", json={"timezone": "Europe/Berlin"}).status_code == 401
@@ -288,3 +288,107 @@ async def test_delete_budget_wrong_user(client: TestClient, user1_bud_headers: d
 
     resp_delete = client.delete(f"/budgets/{budget_id}", headers=user2_bud_headers) # REMOVE await
     assert resp_delete.status_code == 404
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_rollup", [True, False])
+async def test_budget_progress_single_query(session: DbSession, monkeypatch, use_rollup: bool):
+    """Overall and per-category budgets get spent/remaining/percent from one aggregate query."""
+    from models import User, Transaction
+    from routers.budgets import read_budget_progress
+    from services.report_rollup_service import rebuild_monthly_rollups
+
+    async def add_all_and_commit(*objects):
+        session.add_all(objects)
+        if settings.USE_ASYNC_DB:
+            await session.commit() # type: ignore [union-attr]
+            for obj in objects:
+                await session.refresh(obj) # type: ignore [union-attr]
+        else:
+            session.commit() # type: ignore [union-attr]
+            for obj in objects:
+                session.refresh(obj) # type: ignore [union-attr]
+
+    monkeypatch.setattr(settings, "REPORTS_USE_ROLLUP", use_rollup)
+    owner = User(email="progress_bud@example.com", hashed_password="x")
+    await add_all_and_commit(owner)
+    food = Category(name="Food_P", type=CategoryType.EXPENSE, owner_id=owner.id)
+    fun = Category(name="Fun_P", type=CategoryType.EXPENSE, owner_id=owner.id)
+    salary = Category(name="Salary_P", type=CategoryType.INCOME, owner_id=owner.id)
+    await add_all_and_commit(food, fun, salary)
+    await add_all_and_commit(
+        Budget(year=2024, month=3, amount=1000, owner_id=owner.id), # Overall
+        Budget(year=2024, month=3, amount=200, category_id=food.id, owner_id=owner.id),
+        Budget(year=2024, month=3, amount=50, category_id=fun.id, owner_id=owner.id),
+        Budget(year=2024, month=4, amount=999, category_id=food.id, owner_id=owner.id), # Other month
+        Transaction(amount=150, type=CategoryType.EXPENSE, date=date(2024, 3, 3), category_id=food.id, owner_id=owner.id),
+        Transaction(amount=80, type=CategoryType.EXPENSE, date=date(2024, 3, 31), category_id=fun.id, owner_id=owner.id),
+        Transaction(amount=5000, type=CategoryType.INCOME, date=date(2024, 3, 1), category_id=salary.id, owner_id=owner.id),
+        Transaction(amount=70, type=CategoryType.EXPENSE, date=date(2024, 4, 1), category_id=food.id, owner_id=owner.id),
+    )
+    await rebuild_monthly_rollups(session)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+        user = await session.get(User, owner.id) # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+        user = session.get(User, owner.id) # type: ignore [union-attr]
+
+    progress = await read_budget_progress(session=session, year=2024, month=3, current_user=user)
+    by_name = {p.category_name: p for p in progress}
+    assert set(by_name) == {None, "Food_P", "Fun_P"}
+    assert (by_name[None].spent, by_name[None].remaining, by_name[None].percent_used) == (230.0, 770.0, 23.0)
+    assert (by_name["Food_P"].spent, by_name["Food_P"].percent_used) == (150.0, 75.0)
+    assert (by_name["Fun_P"].spent, by_name["Fun_P"].remaining, by_name["Fun_P"].percent_used) == (80.0, -30.0, 160.0)
+
+    assert await read_budget_progress(session=session, year=2024, month=5, current_user=user) == []
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_rollup", [True, False])
+async def test_budget_progress_counts_subcategory_spend(session: DbSession, monkeypatch, use_rollup: bool):
+    """A category budget covers the spend of its whole subtree; categories without closure rows count their own spend."""
+    from models import User, Transaction
+    from routers.budgets import read_budget_progress
+    from services.category_tree_service import attach_category
+    from services.report_rollup_service import rebuild_monthly_rollups
+
+    async def commit():
+        if settings.USE_ASYNC_DB:
+            await session.commit() # type: ignore [union-attr]
+        else:
+            session.commit() # type: ignore [union-attr]
+
+    monkeypatch.setattr(settings, "REPORTS_USE_ROLLUP", use_rollup)
+    owner = User(email="progress_tree@example.com", hashed_password="x")
+    session.add(owner)
+    await commit()
+    food = Category(name="Food_T", type=CategoryType.EXPENSE, owner_id=owner.id)
+    groceries = Category(name="Groceries_T", type=CategoryType.EXPENSE, owner_id=owner.id)
+    organic = Category(name="Organic_T", type=CategoryType.EXPENSE, owner_id=owner.id)
+    legacy = Category(name="Legacy_T", type=CategoryType.EXPENSE, owner_id=owner.id) # No closure rows
+    session.add_all([food, groceries, organic, legacy])
+    await commit()
+    await attach_category(session, food)
+    await attach_category(session, groceries, food)
+    await attach_category(session, organic, groceries)
+    session.add_all([
+        Budget(year=2024, month=3, amount=1000, owner_id=owner.id), # Overall
+        Budget(year=2024, month=3, amount=300, category_id=food.id, owner_id=owner.id),
+        Budget(year=2024, month=3, amount=100, category_id=groceries.id, owner_id=owner.id),
+        Budget(year=2024, month=3, amount=10, category_id=legacy.id, owner_id=owner.id),
+        Transaction(amount=20, type=CategoryType.EXPENSE, date=date(2024, 3, 2), category_id=food.id, owner_id=owner.id),
+        Transaction(amount=50, type=CategoryType.EXPENSE, date=date(2024, 3, 5), category_id=groceries.id, owner_id=owner.id),
+        Transaction(amount=30, type=CategoryType.EXPENSE, date=date(2024, 3, 9), category_id=organic.id, owner_id=owner.id),
+        Transaction(amount=5, type=CategoryType.EXPENSE, date=date(2024, 3, 9), category_id=legacy.id, owner_id=owner.id),
+        Transaction(amount=400, type=CategoryType.EXPENSE, date=date(2024, 4, 1), category_id=organic.id, owner_id=owner.id), # Other month
+    ])
+    await commit()
+    await rebuild_monthly_rollups(session)
+    await commit()
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, owner.id) # type: ignore [union-attr]
+    else:
+        user = session.get(User, owner.id) # type: ignore [union-attr]
+
+    progress = await read_budget_progress(session=session, year=2024, month=3, current_user=user)
+    spent = {p.category_name: p.spent for p in progress}
+    assert spent == {None: 105.0, "Food_T": 100.0, "Groceries_T": 80.0, "Legacy_T": 5.0}
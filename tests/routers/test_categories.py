@@ -234,3 +234,77 @@ async def test_delete_category_wrong_user(client: TestClient, user1_headers: dic
     # User 2 tries to delete
     response_delete = client.delete(f"/categories/{created_cat_id}", headers=user2_headers) # REMOVE await
     assert response_delete.status_code == 404 # Should not find it for user 2
+
+# --- Category Tree (endpoint functions called directly with the test session) ---
+
+@pytest.mark.asyncio
+async def test_category_tree_create_move_and_delete(session: DbSession):
+    """Subcategories get depths and closure rows; moves keep the closure table consistent."""
+    from fastapi import HTTPException
+    from models import User, CategoryClosure
+    from dto import CategoryBase
+    from routers.categories import create_category, update_category, delete_category, read_category_by_id
+
+    user = User(email="tree_cat@example.com", hashed_password="x")
+    session.add(user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+    async def create(name: str, parent_id=None, category_type=CategoryType.EXPENSE) -> Category:
+        return await create_category(
+            session=session, current_user=user, category_in=CategoryBase(name=name, type=category_type, parent_id=parent_id)
+        )
+
+    async def move(category: Category, parent_id) -> Category:
+        return await update_category(
+            session=session, current_user=user, category_id=category.id,
+            category_in=CategoryBase(name=category.name, type=category.type, parent_id=parent_id),
+        )
+
+    async def closure() -> set:
+        statement = select(CategoryClosure.ancestor_id, CategoryClosure.descendant_id, CategoryClosure.distance, CategoryClosure.ancestor_depth)
+        if settings.USE_ASYNC_DB:
+            return set((await session.exec(statement)).all()) # type: ignore [union-attr]
+        return set(session.exec(statement).all()) # type: ignore [union-attr]
+
+    food = await create("Food_Tree")
+    restaurants = await create("Restaurants_Tree", food.id)
+    lunch = await create("Lunch_Tree", restaurants.id)
+    transport = await create("Transport_Tree")
+    assert (food.depth, restaurants.depth, lunch.depth) == (0, 1, 2)
+
+    f, r, l, t = food.id, restaurants.id, lunch.id, transport.id
+    assert await closure() == {
+        (f, f, 0, 0), (r, r, 0, 1), (l, l, 0, 2), (t, t, 0, 0),
+        (f, r, 1, 0), (f, l, 2, 0), (r, l, 1, 1),
+    }
+
+    # A child must share the parent's type
+    with pytest.raises(HTTPException) as excinfo:
+        await create("Bonus_Tree", f, CategoryType.INCOME)
+    assert excinfo.value.status_code == 400
+    # No cycles
+    with pytest.raises(HTTPException) as excinfo:
+        await move(food, l)
+    assert excinfo.value.status_code == 400
+    # Parents can't be deleted while they have children
+    with pytest.raises(HTTPException) as excinfo:
+        await delete_category(session=session, current_user=user, category_id=r)
+    assert excinfo.value.status_code == 400
+
+    # Move the Restaurants subtree below Transport
+    assert (await move(restaurants, t)).depth == 1
+    assert await closure() == {
+        (f, f, 0, 0), (r, r, 0, 1), (l, l, 0, 2), (t, t, 0, 0),
+        (t, r, 1, 0), (t, l, 2, 0), (r, l, 1, 1),
+    }
+
+    # Move it to the top level: the whole subtree shifts up
+    assert (await move(restaurants, None)).depth == 0
+    assert (await read_category_by_id(session=session, current_user=user, category_id=l)).depth == 1
+    assert await closure() == {(f, f, 0, 0), (r, r, 0, 0), (l, l, 0, 1), (t, t, 0, 0), (r, l, 1, 0)}
+
+    await delete_category(session=session, current_user=user, category_id=l)
+    assert await closure() == {(f, f, 0, 0), (r, r, 0, 0), (t, t, 0, 0)}
@@ -1,7 +1,7 @@
 import pytest
 import pytest_asyncio # Import asyncio marker
 from fastapi.testclient import TestClient
-from sqlmodel import Session # Keep sync Session for type hint if needed
+from sqlmodel import Session, select, func # Keep sync Session for type hint if needed
 from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
 from typing import Union # For type hint
 from datetime import date, timedelta
@@ -244,3 +244,535 @@ async def test_get_custom_range_report_missing_params(client: TestClient, user1_
     today = date.today()
     response = client.get(f"/reports/custom?start_date={today}", headers=user1_rep_headers) # REMOVE await
     assert response.status_code == 422 # Unprocessable Entity
+
+# --- Report Aggregation Helper Tests ---
+# These call the report helpers directly with the test session (no HTTP layer).
+
+async def _add_all_and_commit(session: DbSession, *objects) -> None:
+    """Adds objects to the test session and commits (sync or async)."""
+    session.add_all(objects)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+@pytest_asyncio.fixture(scope="function")
+async def report_owner(session: DbSession) -> dict:
+    """Creates a user with categories and transactions directly in the test DB."""
+    from models import User
+    owner = User(email="agg_rep@example.com", hashed_password="x")
+    other = User(email="agg_rep_other@example.com", hashed_password="x")
+    await _add_all_and_commit(session, owner, other)
+    salary = Category(name="Salary_A", type=CategoryType.INCOME, owner_id=owner.id)
+    food = Category(name="Food_A", type=CategoryType.EXPENSE, owner_id=owner.id)
+    rent = Category(name="Rent_A", type=CategoryType.EXPENSE, owner_id=owner.id)
+    other_cat = Category(name="Other_A", type=CategoryType.EXPENSE, owner_id=other.id)
+    await _add_all_and_commit(session, salary, food, rent, other_cat)
+    await _add_all_and_commit(
+        session,
+        Transaction(amount=3000, type=CategoryType.INCOME, date=date(2024, 3, 1), category_id=salary.id, owner_id=owner.id),
+        Transaction(amount=40, type=CategoryType.EXPENSE, date=date(2024, 3, 5), category_id=food.id, owner_id=owner.id),
+        Transaction(amount=60, type=CategoryType.EXPENSE, date=date(2024, 3, 31), category_id=food.id, owner_id=owner.id),
+        Transaction(amount=1200, type=CategoryType.EXPENSE, date=date(2024, 3, 2), category_id=rent.id, owner_id=owner.id),
+        Transaction(amount=999, type=CategoryType.EXPENSE, date=date(2024, 4, 1), category_id=rent.id, owner_id=owner.id), # Outside range
+        Transaction(amount=500, type=CategoryType.EXPENSE, date=date(2024, 3, 10), category_id=other_cat.id, owner_id=other.id), # Other user
+    )
+    # Rows were inserted directly, so build the monthly rollup the reports read from
+    from services.report_rollup_service import rebuild_monthly_rollups
+    await rebuild_monthly_rollups(session)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    return {"owner_id": owner.id, "salary_id": salary.id, "food_id": food.id, "rent_id": rent.id}
+
+@pytest.mark.asyncio
+async def test_generate_report_data_single_pass(session: DbSession, report_owner: dict):
+    """Totals and both breakdowns come from the single aggregate query."""
+    from services.report_service import generate_report_data
+    total_income, total_expense, income_by_category, expense_by_category = await generate_report_data(
+        session, report_owner["owner_id"], date(2024, 3, 1), date(2024, 3, 31)
+    )
+    assert total_income == 3000.0
+    assert total_expense == 40.0 + 60.0 + 1200.0
+    assert [(c.category_id, c.total_amount) for c in income_by_category] == [(report_owner["salary_id"], 3000.0)]
+    # Sorted by amount, largest first
+    assert [(c.category_name, c.total_amount) for c in expense_by_category] == [("Rent_A", 1200.0), ("Food_A", 100.0)]
+
+@pytest.mark.asyncio
+async def test_generate_report_data_empty_range(session: DbSession, report_owner: dict):
+    """A range without transactions yields zero totals and empty breakdowns."""
+    from services.report_service import generate_report_data
+    result = await generate_report_data(session, report_owner["owner_id"], date(2023, 1, 1), date(2023, 12, 31))
+    assert result == (0.0, 0.0, [], [])
+
+@pytest.mark.asyncio
+async def test_generate_report_data_partial_month_edges(session: DbSession, report_owner: dict):
+    """Custom ranges combine rollup months with raw rows for the partial-month edges."""
+    from services.report_service import generate_report_data
+    # Mar 2 - Apr 1: no whole month, only raw rows
+    _, total_expense, _, _ = await generate_report_data(session, report_owner["owner_id"], date(2024, 3, 2), date(2024, 4, 1))
+    assert total_expense == 40.0 + 60.0 + 1200.0 + 999.0
+    # Feb 15 - Apr 1: whole March from the rollup plus the Apr 1 edge
+    total_income, total_expense, _, expense_by_category = await generate_report_data(
+        session, report_owner["owner_id"], date(2024, 2, 15), date(2024, 4, 1)
+    )
+    assert total_income == 3000.0
+    assert total_expense == 40.0 + 60.0 + 1200.0 + 999.0
+    assert expense_by_category[0].category_name == "Rent_A"
+    assert expense_by_category[0].total_amount == 1200.0 + 999.0
+
+@pytest.mark.asyncio
+async def test_monthly_report_cache_invalidated_by_data_version(session: DbSession, report_owner: dict):
+    """Repeated report requests hit the cache until a transaction write bumps the data version."""
+    from core.cache import report_cache
+    from dto import TransactionBase
+    from models import User
+    from routers.reports import get_monthly_report
+    from routers.transactions import create_transaction
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    first = await get_monthly_report(session=session, year=2024, month=3, current_user=user)
+    second = await get_monthly_report(session=session, year=2024, month=3, current_user=user)
+    assert second.total_expense == first.total_expense == 1300.0
+    assert report_cache.stats()["local_hits"] == 1
+
+    await create_transaction(
+        session=session, current_user=user,
+        transaction_in=TransactionBase(amount=200.0, date=date(2024, 3, 15), category_id=report_owner["food_id"])
+    )
+    third = await get_monthly_report(session=session, year=2024, month=3, current_user=user)
+    assert third.total_expense == 1500.0
+    assert report_cache.stats()["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_timeseries_report_weekly_buckets(session: DbSession, report_owner: dict):
+    """Weekly buckets are gap-filled, clipped to the range and sum to the range totals."""
+    from models import User
+    from dto import TimeBucket
+    from routers.reports import get_timeseries_report
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    report = await get_timeseries_report(
+        session=session, start_date=date(2024, 3, 1), end_date=date(2024, 4, 7),
+        bucket=TimeBucket.WEEK, by_category=True, current_user=user
+    )
+    # 2024-03-01 is a Friday: first bucket is clipped, Apr 1-7 is the last full ISO week
+    assert len(report.points) == 6
+    assert report.points[0].period_start == date(2024, 3, 1)
+    assert report.points[0].period_end == date(2024, 3, 3)
+    assert report.points[-1].period_start == date(2024, 4, 1)
+    assert report.points[-1].period_end == date(2024, 4, 7)
+    assert report.points[0].total_income == 3000.0
+    assert report.points[0].total_expense == 1200.0
+    assert report.points[2].total_expense == 0.0 # Mar 11-17 has no transactions
+    assert sum(point.total_expense for point in report.points) == 40.0 + 60.0 + 1200.0 + 999.0
+    assert [(c.category_name, c.total_amount) for c in report.points[-1].expense_by_category] == [("Rent_A", 999.0)]
+
+@pytest.mark.asyncio
+async def test_timeseries_report_quarter_and_bucket_limit(session: DbSession, report_owner: dict):
+    """Quarter buckets fold months together; ranges with too many buckets are rejected."""
+    from fastapi import HTTPException
+    from models import User
+    from dto import TimeBucket
+    from routers.reports import get_timeseries_report
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    report = await get_timeseries_report(
+        session=session, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30),
+        bucket=TimeBucket.QUARTER, by_category=False, current_user=user
+    )
+    assert [(p.period_start, p.total_expense) for p in report.points] == [
+        (date(2024, 1, 1), 40.0 + 60.0 + 1200.0),
+        (date(2024, 4, 1), 999.0),
+    ]
+    assert report.points[0].expense_by_category is None
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_timeseries_report(
+            session=session, start_date=date(2000, 1, 1), end_date=date(2024, 12, 31),
+            bucket=TimeBucket.DAY, by_category=False, current_user=user
+        )
+    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_comparison_report_month_over_month(session: DbSession, report_owner: dict):
+    """Two months compared in one pass: totals, deltas and appeared/disappeared categories."""
+    from fastapi import HTTPException
+    from models import User
+    from routers.reports import get_comparison_report
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    report = await get_comparison_report(session=session, periods=["2024-03", "2024-04"], current_user=user)
+    march, april = report.periods
+    assert (march.start_date, march.end_date) == (date(2024, 3, 1), date(2024, 3, 31))
+    assert (march.total_income, march.total_expense) == (3000.0, 40.0 + 60.0 + 1200.0)
+    assert (april.total_income, april.total_expense) == (0.0, 999.0)
+
+    by_name = {c.category_name: c for c in report.categories}
+    assert by_name["Rent_A"].amounts == [1200.0, 999.0]
+    assert by_name["Rent_A"].deltas == [-201.0]
+    assert by_name["Rent_A"].percent_changes == [pytest.approx(-16.75)]
+    assert by_name["Food_A"].percent_changes == [-100.0]
+    assert "Other_A" not in by_name # Other user's category
+    assert sorted(c.category_name for c in report.disappeared_categories) == ["Food_A", "Salary_A"]
+    assert report.appeared_categories == []
+
+    # A custom range and a year can be mixed; a zero baseline has no percentage
+    report = await get_comparison_report(session=session, periods=["2023", "2024-03-01..2024-03-04"], current_user=user)
+    assert report.periods[1].total_expense == 1200.0
+    assert [c.category_name for c in report.appeared_categories] == ["Salary_A", "Rent_A"]
+    assert all(c.percent_changes == [None] for c in report.categories)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_comparison_report(session=session, periods=["2024-13", "2024-04"], current_user=user)
+    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_analytics_report_and_snapshot_backed_reports(session: DbSession, report_owner: dict, monkeypatch):
+    """The analytics endpoint and snapshot-served reports agree with the SQL aggregates."""
+    from models import User
+    from routers.reports import get_analytics_report
+    from services.report_service import generate_report_data
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    report = await get_analytics_report(
+        session=session, start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), window=7, current_user=user
+    )
+    assert (report.total_income, report.total_expense) == (3000.0, 1300.0)
+    assert [(s.category_name, s.total_amount) for s in report.expense_shares] == [("Rent_A", 1200.0), ("Food_A", 100.0)]
+    assert report.income_shares[0].share == 1.0
+    assert sum(report.weekday_expense) == 1300.0
+    assert len(report.rolling_expense_average) == 31
+    assert report.rolling_expense_average[1] == pytest.approx(1200.0 / 7) # Mar 2
+
+    sql_result = await generate_report_data(session, report_owner["owner_id"], date(2024, 2, 15), date(2024, 4, 1))
+    monkeypatch.setattr(settings, "REPORTS_USE_ANALYTICS_SNAPSHOT", True)
+    snapshot_result = await generate_report_data(session, report_owner["owner_id"], date(2024, 2, 15), date(2024, 4, 1))
+    assert snapshot_result == sql_result
+
+@pytest.mark.asyncio
+async def test_forecast_report_from_rules_and_history(session: DbSession, report_owner: dict):
+    """Recurring rules are expanded in memory and combined with the historical average of other categories."""
+    from models import User, RecurringTransaction, RecurrenceFrequency
+    from routers.reports import get_forecast_report
+
+    owner_id = report_owner["owner_id"]
+    await _add_all_and_commit(
+        session,
+        # Last generated on Mar 31, so the next occurrences are Apr 30 and May 30 (chained month steps)
+        RecurringTransaction(
+            description="Rent", amount=1200, start_date=date(2024, 1, 31), last_created_date=date(2024, 3, 31),
+            frequency=RecurrenceFrequency.MONTHLY, category_id=report_owner["rent_id"], owner_id=owner_id
+        ),
+        RecurringTransaction(
+            description="Paused", amount=50, start_date=date(2024, 1, 1), frequency=RecurrenceFrequency.DAILY,
+            category_id=report_owner["food_id"], owner_id=owner_id, is_active=False
+        ),
+    )
+    transaction_count_statement = select(func.count(Transaction.id))
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, owner_id) # type: ignore [union-attr]
+        transactions_before = (await session.exec(transaction_count_statement)).one() # type: ignore [union-attr]
+    else:
+        user = session.get(User, owner_id) # type: ignore [union-attr]
+        transactions_before = session.exec(transaction_count_statement).one() # type: ignore [union-attr]
+
+    report = await get_forecast_report(session=session, months=2, history_months=1, as_of=date(2024, 4, 15), current_user=user)
+
+    assert report.starting_balance == 3000.0 - (40.0 + 60.0 + 1200.0 + 999.0)
+    april, may = report.months
+    assert (april.period_start, april.period_end) == (date(2024, 4, 16), date(2024, 4, 30))
+    assert (april.recurring_expense, may.recurring_expense) == (1200.0, 1200.0)
+    # March history without Rent (covered by the rule): 3000 income, 100 expense; April is half covered
+    assert (april.estimated_income, april.estimated_expense) == (1500.0, 50.0)
+    assert (may.estimated_income, may.estimated_expense) == (3000.0, 100.0)
+    assert april.projected_balance == report.starting_balance + 1500.0 - 50.0 - 1200.0
+    assert may.projected_balance == april.projected_balance + 3000.0 - 100.0 - 1200.0
+
+    if settings.USE_ASYNC_DB:
+        transactions_after = (await session.exec(transaction_count_statement)).one() # type: ignore [union-attr]
+    else:
+        transactions_after = session.exec(transaction_count_statement).one() # type: ignore [union-attr]
+    assert transactions_after == transactions_before # Nothing materialized
+
+@pytest.mark.asyncio
+async def test_batch_report_matches_custom_reports(session: DbSession, report_owner: dict):
+    """Batch results come back in request order and equal the individual /custom reports."""
+    from fastapi import HTTPException
+    from models import User
+    from dto import BatchReportRequest, ReportRange
+    from routers.reports import get_batch_report, get_custom_range_report
+    from core.cache import report_cache
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    ranges = [
+        ReportRange(start_date=date(2024, 4, 1), end_date=date(2024, 4, 30), label="this_month"),
+        ReportRange(start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), label="last_month"),
+        ReportRange(start_date=date(2024, 1, 1), end_date=date(2024, 4, 15), label="ytd"),
+        ReportRange(start_date=date(2024, 3, 2), end_date=date(2024, 3, 31), label="last_30_days"),
+        ReportRange(start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), label="duplicate"),
+    ]
+    items = await get_batch_report(session=session, batch_in=BatchReportRequest(ranges=ranges), current_user=user)
+    assert [item.label for item in items] == [r.label for r in ranges]
+    assert [item.total_expense for item in items] == [999.0, 1300.0, 2299.0, 1300.0, 1300.0]
+    assert items[3].total_income == 0.0
+
+    # The batch populated the /custom cache entries, which hold the same reports
+    report_cache.clear()
+    for item, report_range in zip(items, ranges):
+        custom = await get_custom_range_report(
+            session=session, start_date=report_range.start_date, end_date=report_range.end_date, current_user=user
+        )
+        assert item.model_dump(exclude={"label"}) == custom.model_dump()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_batch_report(
+            session=session,
+            batch_in=BatchReportRequest(ranges=[ReportRange(start_date=date(2024, 5, 1), end_date=date(2024, 4, 1))]),
+            current_user=user
+        )
+    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_rollup", [True, False])
+async def test_running_balance_and_ledger(session: DbSession, report_owner: dict, monkeypatch, use_rollup: bool):
+    """Window-function balances continue from the opening balance, with or without rollup checkpoints."""
+    from models import User
+    from routers.reports import get_balance_report, get_ledger_report
+
+    monkeypatch.setattr(settings, "REPORTS_USE_ROLLUP", use_rollup)
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    # Opening balance from March (whole month before the range) only
+    april = await get_balance_report(session=session, start_date=date(2024, 4, 1), end_date=date(2024, 4, 30), current_user=user)
+    assert april.opening_balance == 3000.0 - 1300.0
+    assert [(p.date, p.expense, p.balance) for p in april.points] == [(date(2024, 4, 1), 999.0, 701.0)]
+    assert april.closing_balance == 701.0
+
+    # Opening balance from raw rows earlier in the same month
+    march = await get_balance_report(session=session, start_date=date(2024, 3, 2), end_date=date(2024, 3, 31), current_user=user)
+    assert march.opening_balance == 3000.0
+    assert [(p.date, p.balance) for p in march.points] == [
+        (date(2024, 3, 2), 1800.0), (date(2024, 3, 5), 1760.0), (date(2024, 3, 31), 1700.0)
+    ]
+
+    # A ledger page keeps the balances of the whole range
+    ledger = await get_ledger_report(
+        session=session, start_date=date(2024, 3, 1), end_date=date(2024, 4, 30), skip=2, limit=2, current_user=user
+    )
+    assert ledger.opening_balance == 0.0
+    assert [(e.date, e.amount, e.balance) for e in ledger.entries] == [
+        (date(2024, 3, 5), 40.0, 1760.0), (date(2024, 3, 31), 60.0, 1700.0)
+    ]
+
+@pytest.mark.asyncio
+async def test_statistics_report_from_sketches(session: DbSession, report_owner: dict):
+    """Per-category quantiles and histograms come from the monthly amount sketches."""
+    from models import User
+    from routers.reports import get_statistics_report
+
+    if settings.USE_ASYNC_DB:
+        user = await session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+    else:
+        user = session.get(User, report_owner["owner_id"]) # type: ignore [union-attr]
+
+    report = await get_statistics_report(
+        session=session, year=2024, month=None, category_id=None, quantiles=[0.0, 0.5, 1.0], histogram_bins=5, current_user=user
+    )
+    by_name = {c.category_name: c for c in report.categories}
+    assert set(by_name) == {"Salary_A", "Food_A", "Rent_A"}
+    rent = by_name["Rent_A"] # 1200 in March, 999 in April
+    assert rent.count == 2
+    assert [q.value for q in rent.quantiles] == [
+        pytest.approx(999.0, rel=report.relative_accuracy),
+        pytest.approx(999.0, rel=report.relative_accuracy),
+        pytest.approx(1200.0, rel=report.relative_accuracy),
+    ]
+    assert sum(b.count for b in rent.histogram) == 2
+
+    march_food = await get_statistics_report(
+        session=session, year=2024, month=3, category_id=report_owner["food_id"], quantiles=[0.5], histogram_bins=5, current_user=user
+    )
+    assert [c.category_name for c in march_food.categories] == ["Food_A"]
+    assert march_food.categories[0].quantiles[0].value == pytest.approx(40.0, rel=march_food.relative_accuracy)
+
+@pytest.mark.asyncio
+async def test_report_snapshots_precomputed_and_served(session: DbSession, report_owner: dict, monkeypatch):
+    """The snapshot job stores last month's and the yearly report; endpoints serve them while the data version matches."""
+    from contextlib import asynccontextmanager, contextmanager
+    from models import User, ReportSnapshot
+    from routers.reports import get_monthly_report
+    from services import report_snapshot_service
+    from services.data_version_service import bump_data_version
+
+    # Point the job's own session scopes at the test session
+    @asynccontextmanager
+    async def test_async_scope():
+        yield session
+        await session.commit() # type: ignore [union-attr]
+
+    @contextmanager
+    def test_sync_scope():
+        yield session
+        session.commit() # type: ignore [union-attr]
+
+    monkeypatch.setattr(report_snapshot_service, "async_session_scope", test_async_scope)
+    monkeypatch.setattr(report_snapshot_service, "sync_session_scope", test_sync_scope)
+
+    # Both seeded users added transactions just now
+    written = await report_snapshot_service.precompute_report_snapshots(as_of=date(2024, 4, 15), chunk_size=1, concurrency=1)
+    assert written == 2
+
+    owner_id = report_owner["owner_id"]
+    if settings.USE_ASYNC_DB:
+        monthly = await session.get(ReportSnapshot, (owner_id, "monthly", "2024-03")) # type: ignore [union-attr]
+        yearly = await session.get(ReportSnapshot, (owner_id, "yearly", "2024")) # type: ignore [union-attr]
+    else:
+        monthly = session.get(ReportSnapshot, (owner_id, "monthly", "2024-03")) # type: ignore [union-attr]
+        yearly = session.get(ReportSnapshot, (owner_id, "yearly", "2024")) # type: ignore [union-attr]
+    assert monthly.payload["total_expense"] == 1300.0
+    assert yearly.payload["total_expense"] == 1300.0 + 999.0
+
+    # Mark the snapshot so we can tell it was served instead of recomputed
+    monthly.payload = {**monthly.payload, "total_income": 12345.0}
+    session.add(monthly)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+        user = await session.get(User, owner_id) # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+        user = session.get(User, owner_id) # type: ignore [union-attr]
+    served = await get_monthly_report(session=session, year=2024, month=3, current_user=user)
+    assert served.total_income == 12345.0
+
+    # Any write moves the data version past the snapshot
+    await bump_data_version(session, owner_id)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    recomputed = await get_monthly_report(session=session, year=2024, month=3, current_user=user)
+    assert recomputed.total_income == 3000.0
+
+@pytest.mark.asyncio
+async def test_report_snapshot_failure_is_isolated_per_user(session: DbSession, report_owner: dict, monkeypatch):
+    """A user whose reports fail to build doesn't roll back the snapshots of the other users in the chunk."""
+    from contextlib import asynccontextmanager, contextmanager
+    from models import ReportSnapshot
+    from services import report_snapshot_service
+
+    @asynccontextmanager
+    async def test_async_scope():
+        try:
+            yield session
+            await session.commit() # type: ignore [union-attr]
+        except Exception:
+            await session.rollback() # type: ignore [union-attr]
+            raise
+
+    @contextmanager
+    def test_sync_scope():
+        try:
+            yield session
+            session.commit() # type: ignore [union-attr]
+        except Exception:
+            session.rollback() # type: ignore [union-attr]
+            raise
+
+    monkeypatch.setattr(report_snapshot_service, "async_session_scope", test_async_scope)
+    monkeypatch.setattr(report_snapshot_service, "sync_session_scope", test_sync_scope)
+
+    owner_id = report_owner["owner_id"]
+    build_yearly_report = report_snapshot_service.build_yearly_report
+
+    async def failing_for_others(session, user_id, year, level=None):
+        if user_id != owner_id:
+            raise RuntimeError("bad data")
+        return await build_yearly_report(session, user_id, year, level)
+
+    monkeypatch.setattr(report_snapshot_service, "build_yearly_report", failing_for_others)
+    written = await report_snapshot_service.precompute_report_snapshots(as_of=date(2024, 4, 15), concurrency=1)
+    assert written == 1
+
+    statement = select(ReportSnapshot.owner_id).distinct()
+    owners = (await session.exec(statement)).all() if settings.USE_ASYNC_DB else session.exec(statement).all()
+    assert list(owners) == [owner_id]
+
+# --- Category Tree Roll-up ---
+
+@pytest.mark.asyncio
+async def test_reports_roll_up_category_tree(session: DbSession, report_owner: dict):
+    """With `level`, subcategories are aggregated into their ancestor at that depth."""
+    from models import User
+    from dto import CategoryBase
+    from routers.categories import create_category
+    from routers.reports import get_monthly_report, get_custom_range_report
+
+    owner = await session.get(User, report_owner["owner_id"]) if settings.USE_ASYNC_DB else session.get(User, report_owner["owner_id"])
+    # Housing > Rent_A (existing, created before the tree) and Housing > Utilities > Power
+    housing = await create_category(session=session, current_user=owner, category_in=CategoryBase(name="Housing", type=CategoryType.EXPENSE))
+    utilities = await create_category(session=session, current_user=owner, category_in=CategoryBase(name="Utilities", type=CategoryType.EXPENSE, parent_id=housing.id))
+    power = await create_category(session=session, current_user=owner, category_in=CategoryBase(name="Power", type=CategoryType.EXPENSE, parent_id=utilities.id))
+    from routers.categories import update_category
+    await update_category(
+        session=session, current_user=owner, category_id=report_owner["rent_id"],
+        category_in=CategoryBase(name="Rent_A", type=CategoryType.EXPENSE, parent_id=housing.id),
+    )
+    await _add_all_and_commit(
+        session,
+        Transaction(amount=80, type=CategoryType.EXPENSE, date=date(2024, 3, 15), category_id=power.id, owner_id=owner.id),
+        Transaction(amount=5, type=CategoryType.EXPENSE, date=date(2024, 3, 16), category_id=housing.id, owner_id=owner.id),
+    )
+    from services.report_rollup_service import rebuild_monthly_rollups
+    await rebuild_monthly_rollups(session)
+    from services.data_version_service import bump_data_version
+    await bump_data_version(session, owner.id)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+    def breakdown(report):
+        return [(c.category_name, c.total_amount) for c in report.expense_by_category]
+
+    leaf = await get_monthly_report(session=session, current_user=owner, year=2024, month=3, level=None)
+    assert breakdown(leaf) == [("Rent_A", 1200.0), ("Food_A", 100.0), ("Power", 80.0), ("Housing", 5.0)]
+
+    top = await get_monthly_report(session=session, current_user=owner, year=2024, month=3, level=0)
+    assert breakdown(top) == [("Housing", 1285.0), ("Food_A", 100.0)]
+    assert top.total_expense == leaf.total_expense
+
+    middle = await get_monthly_report(session=session, current_user=owner, year=2024, month=3, level=1)
+    assert breakdown(middle) == [("Rent_A", 1200.0), ("Food_A", 100.0), ("Utilities", 80.0), ("Housing", 5.0)]
+
+    # Custom ranges mix rollup months and raw edges; both are rolled up the same way
+    custom = await get_custom_range_report(session=session, current_user=owner, start_date=date(2024, 3, 1), end_date=date(2024, 4, 1), level=0)
+    assert breakdown(custom) == [("Housing", 1285.0 + 999.0), ("Food_A", 100.0)]
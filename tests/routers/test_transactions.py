@@ -268,3 +268,241 @@ async def test_delete_transaction_wrong_user( # Mark async
     # User 2 tries to delete
     resp_delete = client.delete(f"/transactions/{trans_id}", headers=user2_trans_headers) # REMOVE await
     assert resp_delete.status_code == 404 # Not found for user 2
+
+# --- Monthly Rollup Maintenance (endpoint functions called directly with the test session) ---
+
+@pytest.mark.asyncio
+async def test_transaction_writes_maintain_monthly_rollup(session: DbSession):
+    """Create/update/delete keep monthly_category_rollup in step with the raw rows."""
+    from models import User, MonthlyCategoryRollup
+    from dto import TransactionBase
+    from routers.transactions import create_transaction, update_transaction, delete_transaction
+
+    user = User(email="rollup_trans@example.com", hashed_password="x")
+    session.add(user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    food = Category(name="Food_RT", type=CategoryType.EXPENSE, owner_id=user.id)
+    salary = Category(name="Salary_RT", type=CategoryType.INCOME, owner_id=user.id)
+    session.add_all([food, salary])
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    user_id, food_id, salary_id = user.id, food.id, salary.id
+
+    async def rollup_rows() -> dict:
+        statement = select(MonthlyCategoryRollup).where(MonthlyCategoryRollup.owner_id == user_id).execution_options(populate_existing=True)
+        if settings.USE_ASYNC_DB:
+            rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+        else:
+            rows = session.exec(statement).all() # type: ignore [union-attr]
+        return {(r.year, r.month, r.category_id, CategoryType(r.type)): (r.total_amount, r.transaction_count) for r in rows}
+
+    tx = await create_transaction(
+        session=session, current_user=user,
+        transaction_in=TransactionBase(amount=25.0, date=date(2024, 7, 10), category_id=food.id)
+    )
+    await create_transaction(
+        session=session, current_user=user,
+        transaction_in=TransactionBase(amount=15.0, date=date(2024, 7, 11), category_id=food.id)
+    )
+    assert await rollup_rows() == {(2024, 7, food_id, CategoryType.EXPENSE): (40.0, 2)}
+
+    # Move the first one to another month and category (type changes too)
+    await update_transaction(
+        session=session, current_user=user, transaction_id=tx.id,
+        transaction_in=TransactionBase(amount=30.0, date=date(2024, 8, 1), category_id=salary_id)
+    )
+    assert await rollup_rows() == {
+        (2024, 7, food_id, CategoryType.EXPENSE): (15.0, 1),
+        (2024, 8, salary_id, CategoryType.INCOME): (30.0, 1),
+    }
+
+    await delete_transaction(session=session, current_user=user, transaction_id=tx.id)
+    assert await rollup_rows() == {(2024, 7, food_id, CategoryType.EXPENSE): (15.0, 1)}
+
+# --- Spending Anomaly Detection ---
+
+@pytest.mark.asyncio
+async def test_unusual_expense_creates_notification(session: DbSession):
+    """An expense far above the category's running mean is flagged; stats follow updates and deletes."""
+    from models import User, Notification, NotificationType, CategorySpendingStats
+    from dto import TransactionBase
+    from routers.transactions import create_transaction, update_transaction, delete_transaction
+    from services.anomaly_service import rebuild_spending_stats
+
+    user = User(email="anomaly_trans@example.com", hashed_password="x")
+    session.add(user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    food = Category(name="Restaurants", type=CategoryType.EXPENSE, owner_id=user.id)
+    session.add(food)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    user_id, food_id = user.id, food.id
+
+    async def fetch_all(statement):
+        statement = statement.execution_options(populate_existing=True)
+        if settings.USE_ASYNC_DB:
+            return (await session.exec(statement)).all() # type: ignore [union-attr]
+        return session.exec(statement).all() # type: ignore [union-attr]
+
+    async def create(amount: float) -> Transaction:
+        return await create_transaction(
+            session=session, current_user=user,
+            transaction_in=TransactionBase(amount=amount, date=date(2024, 7, 10), category_id=food_id)
+        )
+
+    for amount in (20.0, 25.0, 22.0, 18.0):
+        await create(amount)
+    # Only four samples so far: not enough history to judge
+    await create(200.0)
+    assert await fetch_all(select(Notification).where(Notification.user_id == user_id)) == []
+
+    await create(21.0) # Normal
+    unusual = await create(400.0)
+    notifications = await fetch_all(select(Notification).where(Notification.user_id == user_id))
+    assert len(notifications) == 1
+    assert notifications[0].type == NotificationType.SPENDING_ANOMALY
+    assert notifications[0].related_entity_id == unusual.id
+    assert "Restaurants" in notifications[0].message
+
+    # After an update and a delete the running stats still match a rebuild from raw rows
+    await update_transaction(
+        session=session, current_user=user, transaction_id=unusual.id,
+        transaction_in=TransactionBase(amount=24.0, date=date(2024, 7, 10), category_id=food_id)
+    )
+    first = (await fetch_all(select(Transaction).where(Transaction.owner_id == user_id).order_by(Transaction.id)))[0]
+    await delete_transaction(session=session, current_user=user, transaction_id=first.id)
+    incremental = (await fetch_all(select(CategorySpendingStats).where(CategorySpendingStats.owner_id == user_id)))[0]
+    incremental = (incremental.count, incremental.mean, incremental.m2)
+
+    await rebuild_spending_stats(session, user_id)
+    rebuilt = (await fetch_all(select(CategorySpendingStats).where(CategorySpendingStats.owner_id == user_id)))[0]
+    assert incremental[0] == rebuilt.count == 6
+    assert incremental[1] == pytest.approx(rebuilt.mean)
+    assert incremental[2] == pytest.approx(rebuilt.m2)
+
+@pytest.mark.asyncio
+async def test_anomaly_statistics_follow_edits_and_category_deletes(session: DbSession):
+    """Edits that keep amount and category don't flag again; emptied statistics rows go, and so do a deleted category's."""
+    from models import User, Notification, CategorySpendingStats
+    from dto import TransactionBase
+    from routers.transactions import create_transaction, update_transaction, delete_transaction
+    from routers.categories import delete_category
+
+    async def commit():
+        if settings.USE_ASYNC_DB:
+            await session.commit() # type: ignore [union-attr]
+        else:
+            session.commit() # type: ignore [union-attr]
+
+    async def fetch_all(statement):
+        statement = statement.execution_options(populate_existing=True)
+        if settings.USE_ASYNC_DB:
+            return (await session.exec(statement)).all() # type: ignore [union-attr]
+        return session.exec(statement).all() # type: ignore [union-attr]
+
+    user = User(email="anomaly_edit@example.com", hashed_password="x")
+    session.add(user)
+    await commit()
+    food = Category(name="Groceries_AE", type=CategoryType.EXPENSE, owner_id=user.id)
+    travel = Category(name="Travel_AE", type=CategoryType.EXPENSE, owner_id=user.id)
+    session.add_all([food, travel])
+    await commit()
+    user_id, food_id, travel_id = user.id, food.id, travel.id
+
+    for amount in (20.0, 25.0, 22.0, 18.0, 21.0):
+        await create_transaction(
+            session=session, current_user=user,
+            transaction_in=TransactionBase(amount=amount, date=date(2024, 7, 10), category_id=food_id)
+        )
+    unusual = await create_transaction(
+        session=session, current_user=user,
+        transaction_in=TransactionBase(amount=400.0, date=date(2024, 7, 10), category_id=food_id)
+    )
+    assert len(await fetch_all(select(Notification).where(Notification.user_id == user_id))) == 1
+
+    # Same amount and category: a new description and date don't notify again or touch the statistics
+    await update_transaction(
+        session=session, current_user=user, transaction_id=unusual.id,
+        transaction_in=TransactionBase(amount=400.0, date=date(2024, 7, 12), description="Party", category_id=food_id)
+    )
+    assert len(await fetch_all(select(Notification).where(Notification.user_id == user_id))) == 1
+    stats = await fetch_all(select(CategorySpendingStats).where(CategorySpendingStats.category_id == food_id))
+    assert [row.count for row in stats] == [6]
+
+    # The category's last transaction removed: its statistics row is dropped
+    trip = await create_transaction(
+        session=session, current_user=user,
+        transaction_in=TransactionBase(amount=300.0, date=date(2024, 7, 10), category_id=travel_id)
+    )
+    await delete_transaction(session=session, current_user=user, transaction_id=trip.id)
+    assert await fetch_all(select(CategorySpendingStats).where(CategorySpendingStats.category_id == travel_id)) == []
+
+    # Deleting a category removes statistics rows still referencing it
+    session.add(CategorySpendingStats(owner_id=user_id, category_id=travel_id))
+    await commit()
+    await delete_category(session=session, category_id=travel_id, current_user=user)
+    assert await fetch_all(select(CategorySpendingStats).where(CategorySpendingStats.category_id == travel_id)) == []
+
+@pytest.mark.asyncio
+async def test_concurrent_first_expense_in_a_category(session: DbSession):
+    """Another writer creating the statistics row after this one found it missing does not fail the write."""
+    from sqlalchemy import event
+    from models import User, CategorySpendingStats
+    from dto import TransactionBase
+    from routers.transactions import create_transaction
+
+    user = User(email="anomaly_race@example.com", hashed_password="x")
+    session.add(user)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    food = Category(name="Food_AR", type=CategoryType.EXPENSE, owner_id=user.id)
+    session.add(food)
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+    user_id, food_id = user.id, food.id
+    engine = session.bind.sync_engine if settings.USE_ASYNC_DB else session.bind
+    fired: list = []
+
+    def competing_first_write(conn, cursor, statement, parameters, context, executemany):
+        # Right after this writer's first look at the statistics: if the row is still missing,
+        # the other writer inserts (and commits) it, as it could between a SELECT and an INSERT
+        if fired or not statement.lstrip().upper().startswith("SELECT") or "category_spending_stats" not in statement:
+            return
+        fired.append(statement)
+        other = conn.connection.cursor()
+        other.execute(
+            "INSERT OR IGNORE INTO category_spending_stats (owner_id, category_id, count, mean, m2) VALUES (?, ?, 1, 7.0, 0.0)",
+            (user_id, food_id),
+        )
+        other.close()
+
+    event.listen(engine, "after_cursor_execute", competing_first_write)
+    try:
+        await create_transaction(
+            session=session, current_user=user,
+            transaction_in=TransactionBase(amount=30.0, date=date(2024, 7, 10), category_id=food_id)
+        )
+    finally:
+        event.remove(engine, "after_cursor_execute", competing_first_write)
+    assert fired
+
+    statement = select(CategorySpendingStats).where(CategorySpendingStats.category_id == food_id).execution_options(populate_existing=True)
+    if settings.USE_ASYNC_DB:
+        stats = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        stats = session.exec(statement).all() # type: ignore [union-attr]
+    assert [(row.count, row.mean) for row in stats] == [(1, 30.0)]
@@ -0,0 +1 @@
+# Makes 'services' test subdirectory a Python package
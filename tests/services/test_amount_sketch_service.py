@@ -0,0 +1,146 @@
+import json
+import math
+import random
+
+import pytest
+import pytest_asyncio # Import asyncio marker
+from sqlalchemy import event
+from sqlmodel import Session, select # Keep sync Session for type hint if needed
+from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
+from typing import Union # For type hint
+from datetime import date
+
+from models import Transaction, Category, User, CategoryAmountSketch # Import models
+from models.category_model import CategoryType # Import enum from correct location
+from core.config import settings # Import settings
+from services.amount_sketch_service import AmountSketch, RELATIVE_ACCURACY
+from services.report_rollup_service import RollupDelta, apply_rollup_delta, rebuild_monthly_rollups
+
+# Type hint for the session fixture result
+DbSession = Union[Session, AsyncSession]
+
+# --- Helpers & Fixtures ---
+
+async def _commit(session: DbSession) -> None:
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+async def _sketch_rows(session: DbSession) -> dict:
+    """Returns {(owner, year, month, category): (count, bins)}."""
+    statement = select(CategoryAmountSketch).execution_options(populate_existing=True)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+    return {(r.owner_id, r.year, r.month, r.category_id): (r.count, r.bins) for r in rows}
+
+@pytest_asyncio.fixture(scope="function")
+async def sketch_owner(session: DbSession) -> dict:
+    owner = User(email="sketch@example.com", hashed_password="x")
+    session.add(owner)
+    await _commit(session)
+    food = Category(name="Food_Sketch", type=CategoryType.EXPENSE, owner_id=owner.id)
+    session.add(food)
+    await _commit(session)
+    return {"owner_id": owner.id, "food_id": food.id}
+
+# --- Tests ---
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    amounts = sorted(rng.lognormvariate(3, 1.2) for _ in range(5000))
+    sketch = AmountSketch()
+    for amount in amounts:
+        sketch.add(amount)
+    assert sketch.count == len(amounts)
+    assert len(sketch.bins) < 1000 # Compact regardless of the number of amounts
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        exact = amounts[math.floor(q * (len(amounts) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact
+    assert sum(count for _, _, count in sketch.histogram(10)) == len(amounts)
+    assert len(sketch.histogram(10)) <= 10
+
+def test_removal_and_merge_are_exact():
+    first, second = AmountSketch(), AmountSketch()
+    for amount in (5, 12.5, 12.5, 300):
+        first.add(amount)
+    second.add(40)
+    first.merge(second)
+    first.add(12.5, -1)
+    first.add(300, -1)
+
+    expected = AmountSketch()
+    for amount in (5, 12.5, 40):
+        expected.add(amount)
+    assert first.bins == expected.bins
+    assert AmountSketch().quantile(0.5) is None
+
+@pytest.mark.asyncio
+async def test_sketches_follow_transaction_writes_and_rebuild(session: DbSession, sketch_owner: dict):
+    """Write-path deltas keep the stored sketches identical to a rebuild from raw rows."""
+    owner_id, food_id = sketch_owner["owner_id"], sketch_owner["food_id"]
+    transactions = [
+        Transaction(amount=amount, type=CategoryType.EXPENSE, date=date(2024, 5, day), category_id=food_id, owner_id=owner_id)
+        for day, amount in ((1, 10.0), (2, 20.0), (3, 30.0), (4, 400.0))
+    ]
+    delta = RollupDelta()
+    for transaction in transactions:
+        session.add(transaction)
+        delta.add_transaction(transaction)
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+
+    # Remove one transaction again
+    delta = RollupDelta()
+    delta.add_transaction(transactions[-1], sign=-1)
+    if settings.USE_ASYNC_DB:
+        await session.delete(transactions[-1]) # type: ignore [union-attr]
+    else:
+        session.delete(transactions[-1]) # type: ignore [union-attr]
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+
+    incremental = await _sketch_rows(session)
+    count, bins = incremental[(owner_id, 2024, 5, food_id)]
+    assert count == 3
+    assert AmountSketch.from_stored(bins).quantile(0.5) == pytest.approx(20.0, rel=RELATIVE_ACCURACY)
+
+    await rebuild_monthly_rollups(session)
+    await _commit(session)
+    assert (await _sketch_rows(session)) == incremental
+
+@pytest.mark.asyncio
+async def test_concurrent_first_write_to_a_sketch(session: DbSession, sketch_owner: dict):
+    """Another writer creating the row after this one found it missing does not fail the write."""
+    owner_id, food_id = sketch_owner["owner_id"], sketch_owner["food_id"]
+    engine = session.bind.sync_engine if settings.USE_ASYNC_DB else session.bind
+    fired: list = []
+
+    def competing_first_write(conn, cursor, statement, parameters, context, executemany):
+        # Right after this writer's first look at the sketch table: if the row is still missing,
+        # the other writer inserts (and commits) it, as it could between a SELECT and an INSERT
+        if fired or not statement.lstrip().upper().startswith("SELECT") or "category_amount_sketch" not in statement:
+            return
+        fired.append(statement)
+        other = conn.connection.cursor()
+        other.execute(
+            "INSERT OR IGNORE INTO category_amount_sketch (owner_id, year, month, category_id, count, bins) VALUES (?, ?, 5, ?, 1, ?)",
+            (owner_id, 2024, food_id, json.dumps(AmountSketch({AmountSketch.bin_index(7.0): 1}).to_stored())),
+        )
+        other.close()
+
+    event.listen(engine, "after_cursor_execute", competing_first_write)
+    try:
+        delta = RollupDelta()
+        delta.sketches.add((owner_id, 2024, 5, food_id), 30.0, 1)
+        await apply_rollup_delta(session, delta)
+        await _commit(session)
+    finally:
+        event.remove(engine, "after_cursor_execute", competing_first_write)
+    assert fired
+
+    count, bins = (await _sketch_rows(session))[(owner_id, 2024, 5, food_id)]
+    assert count == 1
+    assert AmountSketch.from_stored(bins).quantile(0.5) == pytest.approx(30.0, rel=RELATIVE_ACCURACY)
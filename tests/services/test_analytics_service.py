@@ -0,0 +1,68 @@
+import pytest
+from datetime import date, timedelta
+
+from models.category_model import CategoryType # Import enum from correct location
+from services.analytics_service import TransactionSnapshot, SnapshotCache
+
+# --- Helpers & Fixtures ---
+
+ROWS = [
+    # (date, amount, category_id, type), ordered by date
+    (date(2024, 3, 1), 3000.0, 1, CategoryType.INCOME), # Friday
+    (date(2024, 3, 2), 1200.0, 3, CategoryType.EXPENSE), # Saturday
+    (date(2024, 3, 4), 40.0, 2, CategoryType.EXPENSE), # Monday
+    (date(2024, 3, 4), 10.0, 2, CategoryType.EXPENSE),
+    (date(2024, 3, 11), 60.0, 2, CategoryType.EXPENSE), # Monday
+    (date(2024, 4, 1), 999.0, 3, CategoryType.EXPENSE),
+    (date(2024, 4, 2), 25.0, 9, CategoryType.EXPENSE), # Deleted category
+]
+NAMES = {1: "Salary", 2: "Food", 3: "Rent"}
+
+@pytest.fixture
+def snapshot() -> TransactionSnapshot:
+    return TransactionSnapshot.from_rows(version=1, rows=ROWS, category_names=NAMES)
+
+# --- Tests ---
+
+def test_totals_and_category_rows_match_row_scan(snapshot: TransactionSnapshot):
+    start, end = date(2024, 3, 2), date(2024, 4, 1)
+    in_range = [row for row in ROWS if start <= row[0] <= end]
+    assert snapshot.totals(start, end) == (
+        sum(row[1] for row in in_range if row[3] == CategoryType.INCOME),
+        sum(row[1] for row in in_range if row[3] == CategoryType.EXPENSE),
+    )
+    assert sorted(snapshot.category_rows(start, end)) == [(2, "Food", 0.0, 110.0), (3, "Rent", 0.0, 2199.0)]
+    assert snapshot.category_rows(date(2025, 1, 1), date(2025, 12, 31)) == []
+    # Orphaned rows keep their amounts but have no name
+    assert (9, None, 0.0, 25.0) in snapshot.category_rows(date(2024, 4, 1), date(2024, 4, 30))
+
+def test_category_shares(snapshot: TransactionSnapshot):
+    shares = snapshot.category_shares(date(2024, 3, 1), date(2024, 3, 31), CategoryType.EXPENSE)
+    assert [(category_id, amount) for category_id, _, amount, _ in shares] == [(3, 1200.0), (2, 110.0)]
+    assert sum(share for *_, share in shares) == pytest.approx(1.0)
+    assert snapshot.category_shares(date(2024, 3, 2), date(2024, 3, 31), CategoryType.INCOME) == []
+
+def test_daily_weekday_and_rolling(snapshot: TransactionSnapshot):
+    daily = snapshot.daily_totals(date(2024, 3, 1), date(2024, 3, 5), CategoryType.EXPENSE)
+    assert daily.tolist() == [0.0, 1200.0, 0.0, 50.0, 0.0]
+
+    weekdays = snapshot.weekday_totals(date(2024, 3, 1), date(2024, 3, 31), CategoryType.EXPENSE)
+    assert weekdays.tolist() == [110.0, 0.0, 0.0, 0.0, 0.0, 1200.0, 0.0] # Monday first
+
+    # The window reaches back before the range start
+    rolling = snapshot.rolling_average(date(2024, 3, 3), date(2024, 3, 5), CategoryType.EXPENSE, window=3)
+    expected = []
+    for offset in range(3):
+        day = date(2024, 3, 3) + timedelta(days=offset)
+        expected.append(sum(row[1] for row in ROWS if row[3] == CategoryType.EXPENSE and day - timedelta(days=2) <= row[0] <= day) / 3)
+    assert rolling.tolist() == pytest.approx(expected)
+
+def test_snapshot_cache_checks_version():
+    cache = SnapshotCache(max_entries=1)
+    first = TransactionSnapshot.from_rows(version=1, rows=ROWS, category_names=NAMES)
+    cache.set(7, first)
+    assert cache.get(7, version=1) is first
+    assert cache.get(7, version=2) is None # Stale after a write bumped the version
+    cache.set(8, TransactionSnapshot.from_rows(version=1, rows=[], category_names={}))
+    assert cache.get(7, version=1) is None # Evicted (LRU)
+    assert len(cache.get(8, version=1)) == 0
@@ -0,0 +1,45 @@
+import pytest
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from models import RecurrenceFrequency
+from services.recurring_transaction_service import get_next_due_date
+from services.forecast_service import expand_occurrences, bucket_by_month
+
+# --- Helpers ---
+
+def _step_through(start_date, last_created_date, frequency, until, end_date=None):
+    """Reference: the occurrences generate_due_transactions() would create, one get_next_due_date() at a time."""
+    occurrences = []
+    next_due = get_next_due_date(start_date, last_created_date, frequency)
+    while next_due <= until and (end_date is None or next_due <= end_date):
+        occurrences.append(next_due)
+        next_due = get_next_due_date(start_date, next_due, frequency)
+    return occurrences
+
+# --- Tests ---
+
+def test_monthly_expansion_keeps_clipped_day():
+    occurrences = expand_occurrences(date(2024, 1, 31), None, RecurrenceFrequency.MONTHLY, date(2024, 5, 31))
+    assert [d.item() for d in occurrences] == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 29), date(2024, 4, 29), date(2024, 5, 29)
+    ]
+
+@pytest.mark.parametrize("frequency", list(RecurrenceFrequency))
+def test_expansion_matches_get_next_due_date(frequency):
+    rng = random.Random(42)
+    for _ in range(200):
+        start_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))
+        last_created_date = None
+        for _ in range(rng.randint(0, 3)):
+            last_created_date = get_next_due_date(start_date, last_created_date, frequency)
+        until = start_date + timedelta(days=rng.randint(-10, 1200))
+        end_date = start_date + timedelta(days=rng.randint(0, 1500)) if rng.random() < 0.3 else None
+        expanded = expand_occurrences(start_date, last_created_date, frequency, until, end_date)
+        assert [d.item() for d in expanded] == _step_through(start_date, last_created_date, frequency, until, end_date)
+
+def test_bucket_by_month():
+    occurrences = np.array(["2024-03-31", "2024-04-01", "2024-04-30", "2024-06-15", "2024-07-01"], dtype="datetime64[D]")
+    assert bucket_by_month(occurrences, date(2024, 4, 1), 3).tolist() == [2, 0, 1]
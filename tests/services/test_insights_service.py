@@ -0,0 +1,79 @@
+import pytest
+from datetime import date
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from models import User, Category, CategoryType, Transaction, SpendingInsight
+from services.insights_service import cohort_label, run_insights_pipeline
+
+# --- Fixtures ---
+
+@pytest.fixture
+def insights_db(tmp_path):
+    """File-backed SQLite database (worker processes open their own connections to it)."""
+    database_url = f"sqlite:///{tmp_path / 'insights.db'}"
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(12):
+            # 11 opted-in users; the last one hasn't opted in
+            user = User(email=f"user{i}@example.com", hashed_password="x", share_anonymized_insights=i < 11)
+            session.add(user)
+            session.flush()
+            groceries = Category(name=" Groceries " if i % 2 else "groceries", type=CategoryType.EXPENSE, owner_id=user.id)
+            rent = Category(name="Rent", type=CategoryType.EXPENSE, owner_id=user.id)
+            session.add_all([groceries, rent])
+            session.flush()
+            session.add_all([
+                Transaction(amount=100, type=CategoryType.EXPENSE, date=date(2024, 3, 5), category_id=groceries.id, owner_id=user.id),
+                Transaction(amount=50, type=CategoryType.EXPENSE, date=date(2024, 3, 20), category_id=groceries.id, owner_id=user.id),
+                Transaction(amount=100, type=CategoryType.EXPENSE, date=date(2024, 4, 5), category_id=groceries.id, owner_id=user.id),
+            ])
+            if i < 3:
+                # Only three users pay rent: below k, never published
+                session.add(Transaction(amount=900, type=CategoryType.EXPENSE, date=date(2024, 3, 1), category_id=rent.id, owner_id=user.id))
+        session.commit()
+    yield database_url, engine
+    engine.dispose()
+
+# --- Tests ---
+
+def test_cohort_label():
+    bounds = [500, 1000]
+    assert cohort_label(120, bounds) == "<500"
+    assert cohort_label(500, bounds) == "500-1000"
+    assert cohort_label(2000, bounds) == "1000+"
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_pipeline_aggregates_opted_in_users_with_k_anonymity(insights_db, workers):
+    database_url, engine = insights_db
+    written = run_insights_pipeline(
+        date(2024, 3, 1), date(2024, 3, 31), workers=workers, chunk_size=4, min_cohort_size=5, database_url=database_url
+    )
+    with Session(engine) as session:
+        rows = session.exec(select(SpendingInsight)).all()
+    assert written == len(rows) == 1
+
+    insight = rows[0]
+    # Category names are normalized, the non-consenting user and the April rows are excluded
+    assert (insight.category_name, insight.year, insight.month, insight.type) == ("groceries", 2024, 3, CategoryType.EXPENSE)
+    # Rent payers (1050/month) fall in another cohort than the other 8 users (150/month)
+    assert insight.cohort == "<500"
+    assert insight.user_count == 8
+    assert insight.transaction_count == 16
+    assert insight.total_amount == pytest.approx(1200)
+    assert insight.average_per_user == pytest.approx(150)
+
+def test_pipeline_replaces_recomputed_months(insights_db):
+    database_url, engine = insights_db
+    run_insights_pipeline(date(2024, 3, 1), date(2024, 4, 30), workers=0, min_cohort_size=5, database_url=database_url)
+    with Session(engine) as session:
+        assert len(session.exec(select(SpendingInsight)).all()) == 2 # March and April groceries
+        for user in session.exec(select(User)).all():
+            user.share_anonymized_insights = False
+        session.commit()
+
+    # Nobody opted in any more: April is recomputed (and now empty), March is kept
+    run_insights_pipeline(date(2024, 4, 1), date(2024, 4, 30), workers=0, min_cohort_size=5, database_url=database_url)
+    with Session(engine) as session:
+        assert [row.month for row in session.exec(select(SpendingInsight)).all()] == [3]
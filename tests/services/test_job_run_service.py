@@ -0,0 +1,134 @@
+import pytest
+from contextlib import asynccontextmanager, contextmanager
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Union
+
+import core # noqa: F401 (loads the app modules in dependency order)
+from models import JobRun, JobRunStatus
+from core.config import settings
+from services import job_run_service
+from services.job_run_service import record_job_run, get_job_runs
+
+# Type hint for the session fixture result
+DbSession = Union[Session, AsyncSession]
+
+# --- Fixtures ---
+
+@pytest.fixture
+def scoped_to_test_session(session: DbSession, monkeypatch):
+    """Points the job run history's own session scopes at the test session."""
+    @asynccontextmanager
+    async def test_async_scope():
+        yield session
+        await session.commit() # type: ignore [union-attr]
+
+    @contextmanager
+    def test_sync_scope():
+        yield session
+        session.commit() # type: ignore [union-attr]
+
+    monkeypatch.setattr(job_run_service, "async_session_scope", test_async_scope)
+    monkeypatch.setattr(job_run_service, "sync_session_scope", test_sync_scope)
+
+# --- Tests ---
+
+@pytest.mark.asyncio
+async def test_record_job_run_success_and_failure(session: DbSession, scoped_to_test_session):
+    """Runs are recorded with their outcome: rows created on success, the error (re-raised) on failure."""
+    async def generate(count: int) -> int:
+        return count
+
+    async def crash() -> None:
+        raise RuntimeError("database unavailable")
+
+    assert await record_job_run("generate", generate, 12, host="worker-1") == 12
+    with pytest.raises(RuntimeError):
+        await record_job_run("generate", crash, trigger="manual")
+    await record_job_run("other", generate, 1)
+
+    failed, succeeded = await get_job_runs(session, job_id="generate")
+    assert (succeeded.status, succeeded.rows_created, succeeded.host, succeeded.trigger) == (JobRunStatus.SUCCEEDED, 12, "worker-1", "scheduled")
+    assert succeeded.finished_at >= succeeded.started_at
+    assert (failed.status, failed.rows_created, failed.trigger) == (JobRunStatus.FAILED, None, "manual")
+    assert failed.error == "RuntimeError: database unavailable"
+    assert len(await get_job_runs(session)) == 3
+
+@pytest.mark.asyncio
+async def test_generation_job_runs_in_worker_process(tmp_path, monkeypatch):
+    """A manual generation run goes through the real spawned worker pool and records its result."""
+    from datetime import date
+    import asyncio
+    from sqlmodel import SQLModel, create_engine
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from core import db as core_db
+    from models import User, Category, CategoryType, RecurringTransaction, RecurrenceFrequency
+    from services.recurring_transaction_service import submit_generation_job
+
+    # The worker is a fresh interpreter: it finds the database through the environment
+    db_file = tmp_path / "jobs.db"
+    database_url = f"sqlite+aiosqlite:///{db_file}" if settings.USE_ASYNC_DB else f"sqlite:///{db_file}"
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    monkeypatch.setenv("USE_ASYNC_DB", str(settings.USE_ASYNC_DB))
+    monkeypatch.setenv("DEBUG", "false")
+    monkeypatch.setattr(settings, "JOB_WORKERS", 1)
+    monkeypatch.setattr(settings, "SERVERLESS", False)
+
+    sync_engine = create_engine(f"sqlite:///{db_file}")
+    async_engine = create_async_engine(database_url) if settings.USE_ASYNC_DB else None
+    monkeypatch.setattr(core_db, "_sync_engine", sync_engine)
+    monkeypatch.setattr(core_db, "_async_engine", async_engine)
+    SQLModel.metadata.create_all(sync_engine)
+    with Session(sync_engine, expire_on_commit=False) as setup:
+        owner = User(email="worker_job@example.com", hashed_password="x")
+        setup.add(owner)
+        setup.commit()
+        category = Category(name="Coffee", type=CategoryType.EXPENSE, owner_id=owner.id)
+        setup.add(category)
+        setup.commit()
+        setup.add(RecurringTransaction(description="Coffee", amount=2, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=category.id, owner_id=owner.id))
+        setup.commit()
+
+    try:
+        # Two runs one after the other in the same (single) worker: each job runs in its own event loop
+        job_runs = []
+        for run_date in (date(2024, 3, 10), date(2024, 3, 12)):
+            job_run, created = await submit_generation_job(run_date)
+            assert created
+            await asyncio.wait_for(asyncio.gather(*list(job_run_service._background_jobs)), timeout=120)
+            job_runs.append(job_run)
+    finally:
+        job_run_service.shutdown_job_workers()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+    with Session(sync_engine) as check:
+        for job_run, rows_created in zip(job_runs, (10, 2)):
+            finished = check.get(JobRun, job_run.id)
+            assert (finished.status, finished.rows_created, finished.chunks_done, finished.dedup_key) == (JobRunStatus.SUCCEEDED, rows_created, 1, None), finished.error
+    sync_engine.dispose()
+
+async def _query_once() -> int:
+    """A job that checks a connection out of the async engine's pool."""
+    from sqlalchemy import text
+    from core.db import get_async_engine
+    async with get_async_engine().connect() as connection:
+        return (await connection.execute(text("SELECT 1"))).scalar_one()
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not settings.USE_ASYNC_DB, reason="Only async engines are tied to an event loop")
+async def test_worker_job_leaves_no_pooled_connections(tmp_path, monkeypatch):
+    """Each job in a worker runs in a new event loop, so it must not leave connections bound to its loop in the pool."""
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from core import db as core_db
+    from services.job_worker import run_job
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'worker.db'}")
+    monkeypatch.setattr(core_db, "_async_engine", engine)
+    try:
+        # asyncio.run needs a thread without a running loop, like the worker process
+        assert await asyncio.to_thread(run_job, f"{_query_once.__module__}:{_query_once.__qualname__}") == 1
+        assert engine.pool.checkedin() == 0
+    finally:
+        await engine.dispose()
@@ -0,0 +1,406 @@
+import pytest
+import pytest_asyncio # Import asyncio marker
+from contextlib import asynccontextmanager, contextmanager
+from sqlmodel import Session, select, func # Keep sync Session for type hint if needed
+from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
+from typing import Union # For type hint
+from collections import Counter
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from sqlalchemy.dialects import mysql
+
+import core # noqa: F401 (loads the app modules in dependency order)
+from models import (
+    User, Category, CategoryType, Transaction, RecurringTransaction, RecurrenceFrequency,
+    Notification, MonthlyCategoryRollup, CategorySpendingStats, JobRunStatus, ReportSnapshot,
+)
+from core.config import settings # Import settings
+from services import recurring_transaction_service, job_run_service, report_snapshot_service
+from services.report_rollup_service import rebuild_monthly_rollups
+
+# Type hint for the session fixture result
+DbSession = Union[Session, AsyncSession]
+
+# --- Helpers & Fixtures ---
+
+async def _commit(session: DbSession) -> None:
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+async def _all(session: DbSession, statement) -> list:
+    statement = statement.execution_options(populate_existing=True)
+    if settings.USE_ASYNC_DB:
+        return (await session.exec(statement)).all() # type: ignore [union-attr]
+    return session.exec(statement).all() # type: ignore [union-attr]
+
+@pytest.fixture
+def scoped_to_test_session(session: DbSession, monkeypatch):
+    """Points the generation job's (and its job run history's) own session scopes at the test session."""
+    @asynccontextmanager
+    async def test_async_scope():
+        try:
+            yield session
+            await session.commit() # type: ignore [union-attr]
+        except Exception:
+            await session.rollback() # type: ignore [union-attr]
+            raise
+
+    @contextmanager
+    def test_sync_scope():
+        try:
+            yield session
+            session.commit() # type: ignore [union-attr]
+        except Exception:
+            session.rollback() # type: ignore [union-attr]
+            raise
+
+    for module in (recurring_transaction_service, job_run_service, report_snapshot_service):
+        monkeypatch.setattr(module, "async_session_scope", test_async_scope)
+        monkeypatch.setattr(module, "sync_session_scope", test_sync_scope)
+
+# --- Tests ---
+
+@pytest.mark.asyncio
+async def test_generate_due_transactions_bulk(session: DbSession, scoped_to_test_session):
+    """A backlog of occurrences is written in bulk; rollups, stats and rules end up as with one-by-one generation."""
+    owner = User(email="recurring_bulk@example.com", hashed_password="x")
+    other = User(email="recurring_bulk_other@example.com", hashed_password="x")
+    session.add_all([owner, other])
+    await _commit(session)
+    rent = Category(name="Rent_RB", type=CategoryType.EXPENSE, owner_id=owner.id)
+    salary = Category(name="Salary_RB", type=CategoryType.INCOME, owner_id=owner.id)
+    foreign = Category(name="Foreign_RB", type=CategoryType.EXPENSE, owner_id=other.id)
+    session.add_all([rent, salary, foreign])
+    await _commit(session)
+
+    rules = [
+        # 31 daily occurrences in March, after some downtime
+        RecurringTransaction(description="Coffee", amount=3.5, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=rent.id, owner_id=owner.id),
+        # Already created up to Jan 31: Feb 29 and Mar 29 are due (month-end clipping)
+        RecurringTransaction(description="Salary", amount=2000, start_date=date(2023, 12, 31), last_created_date=date(2024, 1, 31), frequency=RecurrenceFrequency.MONTHLY, category_id=salary.id, owner_id=owner.id),
+        # Ends mid-March: 2 weekly occurrences
+        RecurringTransaction(description="Gym", amount=10, start_date=date(2024, 3, 1), end_date=date(2024, 3, 10), frequency=RecurrenceFrequency.WEEKLY, category_id=rent.id, owner_id=owner.id),
+        # Category of another user: skipped
+        RecurringTransaction(description="Invalid", amount=1, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=foreign.id, owner_id=owner.id),
+        # Inactive and not yet started: skipped
+        RecurringTransaction(description="Paused", amount=1, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=rent.id, owner_id=owner.id, is_active=False),
+        RecurringTransaction(description="Future", amount=1, start_date=date(2024, 4, 1), frequency=RecurrenceFrequency.DAILY, category_id=rent.id, owner_id=owner.id),
+    ]
+    session.add_all(rules)
+    await _commit(session)
+    rule_ids = [rule.id for rule in rules]
+
+    created = await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 3, 31))
+    assert created == 31 + 2 + 2
+
+    counts = dict(await _all(session, select(Transaction.description, func.count(Transaction.id)).group_by(Transaction.description)))
+    assert counts == {"Coffee": 31, "Salary": 2, "Gym": 2}
+    salary_dates = await _all(session, select(Transaction.date).where(Transaction.description == "Salary").order_by(Transaction.date))
+    assert salary_dates == [date(2024, 2, 29), date(2024, 3, 29)]
+    assert len(await _all(session, select(Notification).where(Notification.user_id == owner.id))) == created
+
+    states = {
+        rule.id: (rule.last_created_date, rule.next_due_date, rule.is_active)
+        for rule in await _all(session, select(RecurringTransaction))
+    }
+    assert [states[rule_id] for rule_id in rule_ids] == [
+        (date(2024, 3, 31), date(2024, 4, 1), True),
+        (date(2024, 3, 29), date(2024, 4, 29), True),
+        (date(2024, 3, 8), None, False), # Past its end date: deactivated
+        (None, None, True), # Invalid category: left as it was, retried on the next run
+        (None, None, False),
+        (None, date(2024, 4, 1), True), # next_due_date filled in, no longer scanned until due
+    ]
+
+    # Incrementally maintained tables match a rebuild from the raw rows
+    def snapshot(rollups, stats):
+        return (
+            sorted((r.owner_id, r.year, r.month, r.category_id, round(r.total_amount, 6), r.transaction_count) for r in rollups),
+            sorted((s.owner_id, s.category_id, s.count, round(s.mean, 6), round(s.m2, 6)) for s in stats),
+        )
+    incremental = snapshot(await _all(session, select(MonthlyCategoryRollup)), await _all(session, select(CategorySpendingStats)))
+    await rebuild_monthly_rollups(session)
+    rebuilt = snapshot(await _all(session, select(MonthlyCategoryRollup)), await _all(session, select(CategorySpendingStats)))
+    assert incremental == rebuilt
+
+    # Nothing is due on a second run for the same day
+    assert await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 3, 31)) == 0
+    # The next day only the daily rule and the newly started one are due
+    assert await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 4, 1)) == 2
+
+@pytest.mark.asyncio
+async def test_rule_endpoints_maintain_next_due_date(session: DbSession):
+    """Creating and updating a rule keeps next_due_date in step; an update that ends the rule deactivates it."""
+    from dto import RecurringTransactionCreate
+    from routers.recurring_transactions import create_recurring_transaction, update_recurring_transaction
+
+    owner = User(email="recurring_next_due@example.com", hashed_password="x")
+    session.add(owner)
+    await _commit(session)
+    rent = Category(name="Rent_ND", type=CategoryType.EXPENSE, owner_id=owner.id)
+    session.add(rent)
+    await _commit(session)
+
+    rule_in = RecurringTransactionCreate(
+        description="Rent", amount=900, start_date=date(2024, 1, 31), frequency=RecurrenceFrequency.MONTHLY, category_id=rent.id
+    )
+    rule = await create_recurring_transaction(session=session, recurring_tx_in=rule_in, current_user=owner)
+    assert (rule.next_due_date, rule.is_active) == (date(2024, 1, 31), True)
+
+    rule.last_created_date = date(2024, 2, 29)
+    updated = await update_recurring_transaction(
+        session=session, recurring_tx_id=rule.id, current_user=owner,
+        recurring_tx_in=rule_in.model_copy(update={"end_date": date(2024, 3, 31)}),
+    )
+    assert (updated.next_due_date, updated.is_active) == (date(2024, 3, 29), True)
+
+    updated = await update_recurring_transaction(
+        session=session, recurring_tx_id=rule.id, current_user=owner,
+        recurring_tx_in=rule_in.model_copy(update={"end_date": date(2024, 3, 15)}),
+    )
+    assert (updated.next_due_date, updated.is_active) == (None, False)
+
+@pytest.mark.asyncio
+async def test_generate_due_transactions_commits_and_retries_per_chunk(session: DbSession, scoped_to_test_session, monkeypatch):
+    """Owners are generated in chunks: a chunk that fails once is retried, one that keeps failing doesn't undo the others."""
+    owners = [User(email=f"recurring_chunk_{i}@example.com", hashed_password="x") for i in range(3)]
+    session.add_all(owners)
+    await _commit(session)
+    categories = [Category(name=f"Chunk_{i}", type=CategoryType.EXPENSE, owner_id=owner.id) for i, owner in enumerate(owners)]
+    session.add_all(categories)
+    await _commit(session)
+    session.add_all([
+        RecurringTransaction(description="Daily", amount=1, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=category.id, owner_id=owner.id)
+        for owner, category in zip(owners, categories)
+    ])
+    await _commit(session)
+    owner_ids = [owner.id for owner in owners]
+
+    generate_in_session = recurring_transaction_service._generate_due_in_session
+    attempts = Counter()
+
+    async def flaky_generate(session, run_date, owner_range=None, timezones=None):
+        attempts[owner_range] += 1
+        if owner_range == (owner_ids[1], owner_ids[1]) and attempts[owner_range] == 1:
+            raise RuntimeError("connection reset") # Transient: succeeds on retry
+        if owner_range == (owner_ids[2], owner_ids[2]):
+            raise RuntimeError("bad data") # Fails every attempt
+        return await generate_in_session(session, run_date, owner_range, timezones)
+
+    monkeypatch.setattr(recurring_transaction_service, "_generate_due_in_session", flaky_generate)
+    monkeypatch.setattr(settings, "RECURRING_CHUNK_RETRIES", 2)
+    monkeypatch.setattr(settings, "RECURRING_CHUNK_RETRY_DELAY_SECONDS", 0)
+    progress = []
+
+    with pytest.raises(RuntimeError, match="1 of 3 chunks"):
+        await recurring_transaction_service.generate_due_transactions(
+            run_date=date(2024, 3, 10), chunk_size=1, on_progress=lambda *state: progress.append(state)
+        )
+
+    assert [attempts[(owner_id, owner_id)] for owner_id in owner_ids] == [1, 2, 3]
+    assert [done for done, _, _ in progress] == [1, 2, 3] and {total for _, total, _ in progress} == {3}
+    assert progress[-1][2] == 20
+    counts = dict((await _all(session, select(Transaction.owner_id, func.count()).group_by(Transaction.owner_id))))
+    assert counts == {owner_ids[0]: 10, owner_ids[1]: 10}
+    # The failed chunk's rule is still due and is picked up by the next run
+    monkeypatch.setattr(recurring_transaction_service, "_generate_due_in_session", generate_in_session)
+    assert await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 3, 10)) == 10
+
+@pytest.mark.asyncio
+async def test_generate_due_transactions_is_idempotent(session: DbSession, scoped_to_test_session):
+    """A run that sees stale rule state (an overlapping or retried run) inserts nothing twice and counts nothing twice."""
+    owner = User(email="recurring_idempotent@example.com", hashed_password="x")
+    session.add(owner)
+    await _commit(session)
+    rent = Category(name="Rent_ID", type=CategoryType.EXPENSE, owner_id=owner.id)
+    session.add(rent)
+    await _commit(session)
+    rule = RecurringTransaction(description="Coffee", amount=3.5, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=rent.id, owner_id=owner.id)
+    session.add(rule)
+    await _commit(session)
+    rule_id = rule.id
+
+    assert await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 3, 10)) == 10
+
+    # Rewind the rule as if this run had read it before the first one committed
+    rule = (await _all(session, select(RecurringTransaction).where(RecurringTransaction.id == rule_id)))[0]
+    rule.last_created_date = None
+    rule.next_due_date = None
+    session.add(rule)
+    await _commit(session)
+
+    # Only the two new days are inserted and counted
+    assert await recurring_transaction_service.generate_due_transactions(run_date=date(2024, 3, 12)) == 2
+    occurrences = await _all(session, select(Transaction.occurrence_date).where(Transaction.recurring_rule_id == rule_id))
+    assert sorted(occurrences) == [date(2024, 3, day) for day in range(1, 13)]
+    notification_count = (await _all(session, select(func.count()).select_from(Notification).where(Notification.user_id == owner.id)))[0]
+    assert notification_count == 12
+    (rollup,) = await _all(session, select(MonthlyCategoryRollup))
+    assert (rollup.transaction_count, rollup.total_amount) == (12, 42.0)
+
+@pytest.mark.asyncio
+async def test_submit_generation_job_runs_once_per_date(session: DbSession, scoped_to_test_session, monkeypatch):
+    """A manual run is recorded as a job with progress; submitting the same date again while it runs returns that run."""
+    from fastapi import HTTPException
+    from routers.recurring_transactions import read_generation_job
+
+    owner = User(email="recurring_job@example.com", hashed_password="x")
+    session.add(owner)
+    await _commit(session)
+    rent = Category(name="Rent_JOB", type=CategoryType.EXPENSE, owner_id=owner.id)
+    session.add(rent)
+    await _commit(session)
+    session.add(RecurringTransaction(description="Coffee", amount=2, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=rent.id, owner_id=owner.id))
+    await _commit(session)
+    owner_id = owner.id
+
+    dispatched = []
+    monkeypatch.setattr(recurring_transaction_service, "run_in_background", lambda job, *args: dispatched.append((job, args)))
+
+    job_run, created = await recurring_transaction_service.submit_generation_job(date(2024, 3, 10), requested_by=owner_id)
+    duplicate, duplicate_created = await recurring_transaction_service.submit_generation_job(date(2024, 3, 10))
+    assert (created, duplicate_created, duplicate.id) == (True, False, job_run.id)
+    assert len(dispatched) == 1
+    owner = (await _all(session, select(User).where(User.id == owner_id)))[0] # Reloaded after the duplicate's rollback
+    running = await read_generation_job(session=session, job_run_id=job_run.id, current_user=owner)
+    assert (running.status, running.parameters, running.requested_by) == (JobRunStatus.RUNNING, {"run_date": "2024-03-10"}, owner_id)
+
+    job, args = dispatched[0]
+    await job(*args)
+    finished = await read_generation_job(session=session, job_run_id=job_run.id, current_user=owner)
+    assert (finished.status, finished.rows_created, finished.chunks_done, finished.chunk_count) == (JobRunStatus.SUCCEEDED, 10, 1, 1)
+    assert finished.duration_seconds is not None
+
+    # Once finished, the same date can be submitted again
+    unattributed, created = await recurring_transaction_service.submit_generation_job(date(2024, 3, 10))
+    assert created
+    with pytest.raises(HTTPException) as exc_info:
+        await read_generation_job(session=session, job_run_id=job_run.id + 100, current_user=owner)
+    assert exc_info.value.status_code == 404
+    # Runs are only visible to the user who triggered them
+    other = User(email="recurring_job_other@example.com", hashed_password="x")
+    session.add(other)
+    await _commit(session)
+    for run_id, user in ((job_run.id, other), (unattributed.id, owner)): # Someone else's run; one nobody requested
+        with pytest.raises(HTTPException) as exc_info:
+            await read_generation_job(session=session, job_run_id=run_id, current_user=user)
+        assert exc_info.value.status_code == 404
+
+@pytest.mark.asyncio
+async def test_insert_occurrences_ignores_duplicates_on_mysql():
+    """MySQL has no RETURNING: occurrences go in with INSERT IGNORE and a duplicate is left out of the result."""
+    class MySQLSession:
+        bind = SimpleNamespace(dialect=mysql.dialect())
+
+        def __init__(self):
+            self.sql: list = []
+            self.stored = {(1, date(2024, 3, 1))}
+
+        def _insert(self, statement, row):
+            self.sql.append(str(statement.compile(dialect=self.bind.dialect)))
+            pair = (row["recurring_rule_id"], row["occurrence_date"])
+            rowcount = 0 if pair in self.stored else 1
+            self.stored.add(pair)
+            return SimpleNamespace(rowcount=rowcount)
+
+        def execute(self, statement, row):
+            if settings.USE_ASYNC_DB:
+                async def run():
+                    return self._insert(statement, row)
+                return run()
+            return self._insert(statement, row)
+
+    session = MySQLSession()
+    rows = [
+        {"recurring_rule_id": 1, "occurrence_date": date(2024, 3, 1)},
+        {"recurring_rule_id": 1, "occurrence_date": date(2024, 4, 1)},
+        {"recurring_rule_id": 2, "occurrence_date": date(2024, 3, 1)},
+    ]
+    inserted = await recurring_transaction_service._insert_occurrences(session, rows)
+
+    assert inserted == [(1, date(2024, 4, 1)), (2, date(2024, 3, 1))]
+    assert len(session.sql) == 3 and all(sql.startswith("INSERT IGNORE INTO transaction") for sql in session.sql)
+
+def test_new_local_days_groups_zones_by_their_new_date():
+    """A zone is picked up in the hour its local date changes, including half-hour offsets and a DST jump over midnight."""
+    new_local_days = recurring_transaction_service.new_local_days
+    zones = ["UTC", "Asia/Tokyo", "Asia/Kolkata", "America/Havana", "Pacific/Kiritimati", "Pacific/Pago_Pago"]
+
+    assert new_local_days(zones, datetime(2024, 3, 10, 15, 0, tzinfo=timezone.utc)) == {date(2024, 3, 11): ["Asia/Tokyo"]}
+    assert new_local_days(zones, datetime(2024, 3, 10, 19, 0, tzinfo=timezone.utc)) == {date(2024, 3, 11): ["Asia/Kolkata"]}
+    assert new_local_days(zones, datetime(2024, 3, 11, 0, 0, tzinfo=timezone.utc)) == {date(2024, 3, 11): ["UTC"]}
+    # UTC+14 and UTC-11 start different days in the same hour
+    assert new_local_days(zones, datetime(2024, 3, 10, 10, 0, tzinfo=timezone.utc)) == {date(2024, 3, 11): ["Pacific/Kiritimati"]}
+    assert new_local_days(zones, datetime(2024, 3, 10, 11, 0, tzinfo=timezone.utc)) == {date(2024, 3, 10): ["Pacific/Pago_Pago"]}
+    # Havana skips from 23:59 to 01:00 on 2024-03-10: there is no local hour 0 that day
+    assert new_local_days(zones, datetime(2024, 3, 10, 5, 0, tzinfo=timezone.utc)) == {date(2024, 3, 10): ["America/Havana"]}
+    # Every zone starts exactly one day over 24 hourly runs
+    hourly = [new_local_days(zones, datetime(2024, 3, 10, hour, 0, tzinfo=timezone.utc)) for hour in range(24)]
+    assert sorted(zone for days in hourly for day_zones in days.values() for zone in day_zones) == sorted(zones)
+
+@pytest.mark.asyncio
+async def test_generate_due_for_new_local_days(session: DbSession, scoped_to_test_session):
+    """Hourly runs generate for the users whose local day started since the last run, up to their local date."""
+    tokyo = User(email="recurring_tz_tokyo@example.com", hashed_password="x", timezone="Asia/Tokyo")
+    london = User(email="recurring_tz_utc@example.com", hashed_password="x")
+    session.add_all([tokyo, london])
+    await _commit(session)
+    categories = [Category(name=f"Coffee_TZ_{owner.id}", type=CategoryType.EXPENSE, owner_id=owner.id) for owner in (tokyo, london)]
+    session.add_all(categories)
+    await _commit(session)
+    rules = [
+        RecurringTransaction(description="Coffee", amount=3, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=category.id, owner_id=category.owner_id)
+        for category in categories
+    ]
+    session.add_all(rules)
+    await _commit(session)
+    tokyo_rule_id, utc_rule_id = rules[0].id, rules[1].id
+
+    async def occurrences(rule_id: int) -> list:
+        return sorted(await _all(session, select(Transaction.occurrence_date).where(Transaction.recurring_rule_id == rule_id)))
+
+    # 15:00 UTC: midnight in Tokyo, where it is already March 11th
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 10, 15, 0, tzinfo=timezone.utc)) == 11
+    assert (await occurrences(tokyo_rule_id))[-1] == date(2024, 3, 11)
+    assert await occurrences(utc_rule_id) == []
+
+    # No zone with rules starts a day at 16:00 UTC
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 10, 16, 0, tzinfo=timezone.utc)) == 0
+
+    # Midnight UTC: only the UTC user, up to March 11th as well
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 11, 0, 0, tzinfo=timezone.utc)) == 11
+    assert await occurrences(utc_rule_id) == [date(2024, 3, day) for day in range(1, 12)]
+    assert len(await occurrences(tokyo_rule_id)) == 11
+
+    # The 15:00 to 17:00 runs are missed (e.g. downtime): the 18:00 run still covers Tokyo's midnight
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 11, 14, 0, tzinfo=timezone.utc)) == 0
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 11, 18, 0, tzinfo=timezone.utc)) == 1
+    assert (await occurrences(tokyo_rule_id))[-1] == date(2024, 3, 12)
+    assert len(await occurrences(utc_rule_id)) == 11
+
+@pytest.mark.asyncio
+async def test_generate_due_for_new_local_days_refreshes_stale_snapshots(session: DbSession, scoped_to_test_session):
+    """Snapshots made stale by generation after the nightly snapshot run are recomputed right away."""
+    from services.data_version_service import get_data_version
+
+    tokyo = User(email="recurring_tz_snapshot@example.com", hashed_password="x", timezone="Asia/Tokyo")
+    session.add(tokyo)
+    await _commit(session)
+    tokyo_id = tokyo.id
+    coffee = Category(name="Coffee_TZ_SNAP", type=CategoryType.EXPENSE, owner_id=tokyo_id)
+    session.add(coffee)
+    await _commit(session)
+    session.add(RecurringTransaction(description="Coffee", amount=3, start_date=date(2024, 3, 1), frequency=RecurrenceFrequency.DAILY, category_id=coffee.id, owner_id=tokyo_id))
+    await _commit(session)
+    # The nightly run took a snapshot before the user's local midnight
+    await report_snapshot_service.snapshot_users([tokyo_id], date(2024, 3, 10))
+
+    assert await recurring_transaction_service.generate_due_for_new_local_days(datetime(2024, 3, 10, 15, 0, tzinfo=timezone.utc)) == 11
+    data_version = await get_data_version(session, tokyo_id)
+    snapshots = await _all(session, select(ReportSnapshot).where(ReportSnapshot.owner_id == tokyo_id))
+    assert {(snapshot.kind, snapshot.period) for snapshot in snapshots} == {("monthly", "2024-02"), ("yearly", "2024")}
+    assert all(snapshot.data_version == data_version for snapshot in snapshots)
+    yearly = next(snapshot for snapshot in snapshots if snapshot.kind == "yearly")
+    assert yearly.payload["total_expense"] == 33.0
@@ -0,0 +1,103 @@
+import pytest
+import pytest_asyncio # Import asyncio marker
+from sqlmodel import Session, select # Keep sync Session for type hint if needed
+from sqlmodel.ext.asyncio.session import AsyncSession # Import AsyncSession
+from typing import Union # For type hint
+from datetime import date
+
+from models import Transaction, Category, User, MonthlyCategoryRollup # Import models
+from models.category_model import CategoryType # Import enum from correct location
+from core.config import settings # Import settings
+from services.report_rollup_service import RollupDelta, apply_rollup_delta, rebuild_monthly_rollups
+
+# Type hint for the session fixture result
+DbSession = Union[Session, AsyncSession]
+
+# --- Helpers & Fixtures ---
+
+async def _commit(session: DbSession) -> None:
+    if settings.USE_ASYNC_DB:
+        await session.commit() # type: ignore [union-attr]
+    else:
+        session.commit() # type: ignore [union-attr]
+
+async def _rollup_rows(session: DbSession) -> dict:
+    """Returns {(owner, year, month, category, type): (total_amount, transaction_count)}."""
+    # Rows are changed by Core statements, so refresh any already-loaded instances
+    statement = select(MonthlyCategoryRollup).execution_options(populate_existing=True)
+    if settings.USE_ASYNC_DB:
+        rows = (await session.exec(statement)).all() # type: ignore [union-attr]
+    else:
+        rows = session.exec(statement).all() # type: ignore [union-attr]
+    return {
+        (r.owner_id, r.year, r.month, r.category_id, CategoryType(r.type)): (round(r.total_amount, 6), r.transaction_count)
+        for r in rows
+    }
+
+@pytest_asyncio.fixture(scope="function")
+async def rollup_owner(session: DbSession) -> dict:
+    owner = User(email="rollup@example.com", hashed_password="x")
+    session.add(owner)
+    await _commit(session)
+    food = Category(name="Food_Roll", type=CategoryType.EXPENSE, owner_id=owner.id)
+    salary = Category(name="Salary_Roll", type=CategoryType.INCOME, owner_id=owner.id)
+    session.add_all([food, salary])
+    await _commit(session)
+    return {"owner_id": owner.id, "food_id": food.id, "salary_id": salary.id}
+
+# --- Tests ---
+
+@pytest.mark.asyncio
+async def test_apply_rollup_delta_add_update_remove(session: DbSession, rollup_owner: dict):
+    """Incremental deltas upsert rows, accumulate sums and drop emptied rows."""
+    owner_id, food_id = rollup_owner["owner_id"], rollup_owner["food_id"]
+    key = (owner_id, 2024, 5, food_id, CategoryType.EXPENSE)
+
+    delta = RollupDelta()
+    delta.add(owner_id, date(2024, 5, 3), food_id, CategoryType.EXPENSE, 12.5)
+    delta.add(owner_id, date(2024, 5, 20), food_id, CategoryType.EXPENSE, 7.5)
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+    assert (await _rollup_rows(session)) == {key: (20.0, 2)}
+
+    # Moving one transaction to June is a -1 in May and a +1 in June
+    delta = RollupDelta()
+    delta.add(owner_id, date(2024, 5, 20), food_id, CategoryType.EXPENSE, -7.5, -1)
+    delta.add(owner_id, date(2024, 6, 1), food_id, CategoryType.EXPENSE, 7.5)
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+    assert (await _rollup_rows(session)) == {
+        key: (12.5, 1),
+        (owner_id, 2024, 6, food_id, CategoryType.EXPENSE): (7.5, 1),
+    }
+
+    # Removing the last May transaction deletes the row
+    delta = RollupDelta()
+    delta.add(owner_id, date(2024, 5, 3), food_id, CategoryType.EXPENSE, -12.5, -1)
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+    assert key not in (await _rollup_rows(session))
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental_maintenance(session: DbSession, rollup_owner: dict):
+    """A rebuild from raw transactions produces the same rows as incremental updates."""
+    owner_id = rollup_owner["owner_id"]
+    transactions = [
+        Transaction(amount=100, type=CategoryType.INCOME, date=date(2024, 1, 31), category_id=rollup_owner["salary_id"], owner_id=owner_id),
+        Transaction(amount=20, type=CategoryType.EXPENSE, date=date(2024, 1, 1), category_id=rollup_owner["food_id"], owner_id=owner_id),
+        Transaction(amount=30, type=CategoryType.EXPENSE, date=date(2024, 2, 29), category_id=rollup_owner["food_id"], owner_id=owner_id),
+        Transaction(amount=5, type=CategoryType.EXPENSE, date=date(2024, 2, 1), category_id=rollup_owner["food_id"], owner_id=owner_id),
+    ]
+    delta = RollupDelta()
+    for transaction in transactions:
+        session.add(transaction)
+        delta.add_transaction(transaction)
+    await apply_rollup_delta(session, delta)
+    await _commit(session)
+    incremental = await _rollup_rows(session)
+
+    written = await rebuild_monthly_rollups(session)
+    await _commit(session)
+    assert written == 3
+    assert (await _rollup_rows(session)) == incremental
+    assert incremental[(owner_id, 2024, 2, rollup_owner["food_id"], CategoryType.EXPENSE)] == (35.0, 2)